@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User, Notification , Group
+from .pagination import EstimatedCountPaginator
 
 #  User Admin
 class UserAdmin(BaseUserAdmin):
@@ -42,8 +43,18 @@ class UserAdmin(BaseUserAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'destinataire', 'message', 'created_at')
     list_filter = ('created_at',)
+    # ``destinataire`` chargé par jointure, pas une requête par ligne
+    list_select_related = ('destinataire',)
+    # Recherche sur ``message`` : index trigramme sous PostgreSQL (migration
+    # 0009) ; nom d'utilisateur « contient », via la jointure
     search_fields = ('destinataire__username', 'message')
     ordering = ('-created_at',)
+    # Pas de second ``COUNT(*)`` sur toute la table lors d'une recherche,
+    # total estimé sur la liste complète (voir ``EstimatedCountPaginator``)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    # Pas de liste déroulante de tous les utilisateurs dans le formulaire
+    raw_id_fields = ('destinataire',)
 
 # Enregistrement
 admin.site.register(User, UserAdmin)
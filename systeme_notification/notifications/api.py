@@ -1,24 +1,159 @@
-from rest_framework import viewsets
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Notification
-from .serializers import NotificationSerializer
+from .conditional import conditional
+from .models import EvacuationDispatch, Notification
+from .pagination import KeysetPagination
+from .search import has_terms, search as search_messages
+from .renderers import FastJSONRenderer, MessagePackRenderer
+from .serializers import NotificationSerializer, NotificationValuesSerializer
 from .core import Epidemie, Incendie, Innondation, Securite
+from .tasks import PublishError
 
 # ViewSet pour les notifications
 class NotificationViewSet(viewsets.ModelViewSet):
+    """
+    API REST des notifications, paginée par curseur sur ``(created_at, id)``.
+
+    Filtres disponibles en liste : ``destinataire`` (id), ``priority``,
+    ``since`` et ``until`` (bornes ISO 8601 sur ``created_at``, ``until``
+    exclue). ``GET .../search/?q=...`` recherche dans les messages, avec
+    les mêmes filtres, résultats classés par pertinence (``score``).
+    ``POST .../<id>/read/`` et ``POST .../read-all/`` marquent les
+    notifications comme lues et mettent à jour les compteurs.
+
+    La liste est sérialisée sans ``ModelSerializer`` (voir
+    ``NotificationValuesSerializer``), en JSON ou en MessagePack
+    (``Accept: application/msgpack`` ou ``?format=msgpack``). Elle répond
+    ``304`` aux requêtes conditionnelles tant qu'aucune notification n'a
+    changé (voir ``notifications.conditional``).
+    """
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer, MessagePackRenderer]
+
+    @conditional(lambda request: ('notifications',))
+    def list(self, request, *args, **kwargs):
+        fast = NotificationValuesSerializer()
+        self.paginator.row_key = fast.row_key
+        page = self.paginate_queryset(fast.select(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(fast.to_representation(page))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'search'):
+            return queryset
+        params = self.request.query_params
+        if 'destinataire' in params:
+            try:
+                queryset = queryset.filter(destinataire_id=int(params['destinataire']))
+            except ValueError:
+                raise ValidationError({'destinataire': "Identifiant invalide"})
+        if 'priority' in params:
+            queryset = queryset.filter(priority=params['priority'])
+        if 'since' in params:
+            queryset = queryset.filter(created_at__gte=self._parse_datetime('since'))
+        if 'until' in params:
+            queryset = queryset.filter(created_at__lt=self._parse_datetime('until'))
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        paginator = self.paginator
+        text = request.query_params.get('q', '').strip()
+        if not has_terms(text):
+            raise ValidationError({'q': "Texte à rechercher attendu"})
+        try:
+            rows, next_cursor = search_messages(
+                self.get_queryset(),
+                text,
+                cursor=request.query_params.get(paginator.cursor_query_param),
+                limit=paginator.get_page_size(request),
+            )
+        except ValueError as exc:
+            # La requête est valide : seul le curseur peut être rejeté
+            raise NotFound(str(exc))
+        results = self.get_serializer(rows, many=True).data
+        for row, data in zip(rows, results):
+            data['score'] = row.score
+        next_link = None
+        if next_cursor:
+            next_link = replace_query_param(request.build_absolute_uri(), paginator.cursor_query_param, next_cursor)
+        return Response({'next': next_link, 'results': results})
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        if not request.user.is_authenticated:
+            return Response({'detail': 'Authentification requise'}, status=status.HTTP_401_UNAUTHORIZED)
+        notification = self.get_object()
+        # Seul le destinataire marque sa notification ; 404 plutôt que 403
+        # pour ne pas révéler les notifications des autres
+        if notification.destinataire_id != request.user.pk:
+            raise NotFound()
+        Notification.objects.mark_read(request.user, ids=[notification.pk])
+        notification.refresh_from_db(fields=['read_at'])
+        return Response({'id': notification.pk, 'read_at': notification.read_at})
+
+    @action(detail=False, methods=['post'], url_path='read-all')
+    def read_all(self, request):
+        if not request.user.is_authenticated:
+            return Response({'detail': 'Authentification requise'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({'marked': Notification.objects.mark_read(request.user)})
+
+    def _parse_datetime(self, param):
+        try:
+            value = parse_datetime(self.request.query_params[param])
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({param: "Date ISO 8601 attendue"})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
 
 # APIViews pour les urgences
+def evacuation_accepted(request, dispatch, label):
+    """Réponse ``202 Accepted`` renvoyée dès que l'évacuation est planifiée."""
+    return Response(
+        {
+            "status": f"Évacuation {label} déclenchée",
+            "dispatch_id": str(dispatch.pk),
+            "status_url": request.build_absolute_uri(
+                reverse('evacuation_dispatch_status', args=[dispatch.pk])
+            ),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+def evacuate(request, urgence, label):
+    """Planifie l'évacuation de ``urgence`` ; ``503`` si le broker refuse les tâches."""
+    try:
+        dispatch = urgence.evacuer_async()
+    except PublishError:
+        return Response(
+            {"detail": f"Évacuation {label} non planifiée : service de tâches indisponible"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return evacuation_accepted(request, dispatch, label)
+
+
 class EpidemieAPIView(APIView):
     def get(self, request):
         return Response({"message": "Évacuation Épidémie prête à être déclenchée"})
 
     def post(self, request):
         e = Epidemie()
-        e.evacuer()
-        return Response({"status": "Évacuation Épidémie déclenchée"})
+        return evacuate(request, e, "Épidémie")
 
 
 class IncendieAPIView(APIView):
@@ -27,8 +162,7 @@ class IncendieAPIView(APIView):
 
     def post(self, request):
         i = Incendie()
-        i.evacuer()
-        return Response({"status": "Évacuation Incendie déclenchée"})
+        return evacuate(request, i, "Incendie")
 
 
 class InnondationAPIView(APIView):
@@ -37,8 +171,7 @@ class InnondationAPIView(APIView):
 
     def post(self, request):
         n = Innondation()
-        n.evacuer()
-        return Response({"status": "Évacuation Innondation déclenchée"})
+        return evacuate(request, n, "Innondation")
 
 
 class SecuriteAPIView(APIView):
@@ -47,5 +180,27 @@ class SecuriteAPIView(APIView):
 
     def post(self, request):
         s = Securite()
-        s.evacuer()
-        return Response({"status": "Évacuation Sécurité déclenchée"})
+        return evacuate(request, s, "Sécurité")
+
+
+class EvacuationDispatchAPIView(APIView):
+    """Avancement d'une évacuation planifiée, canal par canal."""
+
+    def get(self, request, pk):
+        dispatch = get_object_or_404(EvacuationDispatch.objects.prefetch_related('channels'), pk=pk)
+        return Response({
+            "dispatch_id": str(dispatch.pk),
+            "urgence": dispatch.urgence,
+            "status": dispatch.status,
+            "created_at": dispatch.created_at,
+            "finished_at": dispatch.finished_at,
+            "channels": {
+                delivery.channel: {
+                    "status": delivery.status,
+                    "result": delivery.result,
+                    "error": delivery.error,
+                    "finished_at": delivery.finished_at,
+                }
+                for delivery in dispatch.channels.all()
+            },
+        })
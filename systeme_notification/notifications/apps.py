@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        # Connexion des récepteurs de signaux (publication temps réel,
+        # invalidation du cache, annuaire des destinataires, segments) et
+        # enregistrement des urgences, y compris dans un worker Celery
+        # qui n'importe jamais les vues
+        from . import audience, caching, core, directory, realtime  # noqa: F401
@@ -0,0 +1,359 @@
+"""
+Segmentation de l'audience des diffusions.
+
+Une diffusion ciblée désigne ses destinataires par une expression de
+segments, par exemple ::
+
+    active & (group:"Bâtiment A" | group:B) & priority >= haute
+
+Segments disponibles :
+
+- ``all`` : tous les utilisateurs ; ``active`` : ``is_active`` ;
+- ``group:<nom>`` : membres d'un ``Group`` (nom entre guillemets s'il
+  contient des espaces ou des opérateurs) ;
+- ``priority:<niveau>`` ou ``priority <op> <niveau>`` avec ``op`` parmi
+  ``=``, ``>=``, ``>``, ``<=``, ``<`` (``urgente`` est le niveau le plus
+  élevé) ;
+- ``window`` : utilisateurs actifs dont la fenêtre de disponibilité est
+  ouverte maintenant.
+
+Opérateurs : ``&`` (``and``), ``|`` (``or``), ``!`` (``not``) et parenthèses.
+
+``AudienceIndex`` garde pour chaque segment un bitmap des identifiants
+d'utilisateurs : un entier Python dont le bit ``n`` vaut 1 si l'utilisateur
+``n`` appartient au segment. Intersection, union et complément sont alors
+des opérations sur entiers exécutées en C, sans jointure SQL : pour 200 000
+utilisateurs, un bitmap pèse 25 Ko. Seul ``window``, qui dépend de l'heure,
+est calculé à la demande depuis l'annuaire des destinataires
+(``notifications.directory``).
+
+La fraîcheur suit le protocole de l'annuaire : après validation de la
+transaction, chaque changement de ``User`` ou de ``User.groups`` incrémente
+un numéro de version partagé et est appliqué aux bitmaps du processus s'ils
+étaient à la version précédente ; sinon, et dans les autres processus, les
+bitmaps sont rechargés (trois requêtes ``values_list``).
+"""
+
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .directory import directory
+from .models import PRIORITIES, User
+
+
+VERSION_KEY = f'{caching.KEY_PREFIX}:audience:version'
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<op>[()&|!])
+      | (?P<compare>priority\s*(?:>=|<=|>|<|=)\s*[^\s()&|!]+)
+      | (?P<segment>\w+:(?:"[^"]*"|[^\s()&|!"]+))
+      | (?P<word>\w+)
+    )
+''', re.VERBOSE | re.IGNORECASE)
+
+COMPARE_RE = re.compile(r'priority\s*(>=|<=|>|<|=)\s*(\S+)', re.IGNORECASE)
+
+WORD_OPERATORS = {'and': '&', 'or': '|', 'not': '!'}
+
+# Positions des bits à 1 de chaque octet, pour ``members``
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def bitmap(ids: Iterable[int]) -> int:
+    """Bitmap des identifiants ``ids``."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def members(value: int) -> List[int]:
+    """Identifiants (croissants) des bits à 1 de ``value``."""
+    ids: List[int] = []
+    extend = ids.extend
+    for position, byte in enumerate(value.to_bytes((value.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = position << 3
+            extend([base + bit for bit in _BYTE_BITS[byte]])
+    return ids
+
+
+def priority_levels(operator: str, level: str) -> tuple:
+    """Niveaux de priorité désignés par ``priority <operator> <level>``."""
+    if level not in PRIORITIES:
+        raise ValueError(f"Priorité inconnue : {level}")
+    index = PRIORITIES.index(level)
+    # ``PRIORITIES`` va du plus urgent au moins urgent
+    return {
+        '=': PRIORITIES[index:index + 1],
+        '>=': PRIORITIES[:index + 1],
+        '>': PRIORITIES[:index],
+        '<=': PRIORITIES[index:],
+        '<': PRIORITIES[index + 1:],
+    }[operator]
+
+
+def tokenize(expression: str) -> List[tuple]:
+    """Découpe une expression en jetons ``(type, valeur)`` ; lève ``ValueError``."""
+    expression = expression.strip()
+    tokens, position = [], 0
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if match is None:
+            raise ValueError(f"Expression de segment invalide près de {expression[position:]!r}")
+        kind, value = match.lastgroup, match.group(match.lastgroup)
+        if kind == 'word':
+            value = value.lower()
+            if value in WORD_OPERATORS:
+                kind, value = 'op', WORD_OPERATORS[value]
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Analyse descendante, évaluée au fil de l'eau ::
+
+        union        := intersection ('|' intersection)*
+        intersection := facteur ('&' facteur)*
+        facteur      := '!' facteur | '(' union ')' | segment
+    """
+
+    def __init__(self, tokens: List[tuple], segment: Callable[[str, str], int], universe: int) -> None:
+        self.tokens, self.position = tokens, 0
+        self.segment, self.universe = segment, universe
+
+    def peek(self) -> tuple:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self) -> tuple:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self) -> int:
+        if not self.tokens:
+            raise ValueError("Expression de segment vide")
+        value = self.union()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Élément inattendu : {self.peek()[1]!r}")
+        return value
+
+    def union(self) -> int:
+        value = self.intersection()
+        while self.peek() == ('op', '|'):
+            self.take()
+            value |= self.intersection()
+        return value
+
+    def intersection(self) -> int:
+        value = self.factor()
+        while self.peek() == ('op', '&'):
+            self.take()
+            value &= self.factor()
+        return value
+
+    def factor(self) -> int:
+        kind, value = self.take()
+        if (kind, value) == ('op', '!'):
+            return self.universe & ~self.factor()
+        if (kind, value) == ('op', '('):
+            result = self.union()
+            if self.take() != ('op', ')'):
+                raise ValueError("Parenthèse fermante manquante")
+            return result
+        if kind in ('segment', 'compare', 'word'):
+            return self.segment(kind, value)
+        if kind is None:
+            raise ValueError("Expression de segment incomplète")
+        raise ValueError(f"Élément inattendu : {value!r}")
+
+
+# ---------------------------
+# Modifications des bitmaps
+# ---------------------------
+
+def _set_user(segments: Dict[str, int], pk: int, priority: str, active: bool) -> None:
+    bit = 1 << pk
+    for key in ['active', *(f'priority:{level}' for level in PRIORITIES)]:
+        segments[key] = segments.get(key, 0) & ~bit
+    segments['all'] = segments.get('all', 0) | bit
+    if active:
+        segments['active'] |= bit
+    if priority in PRIORITIES:
+        segments[f'priority:{priority}'] |= bit
+
+
+def _drop_user(segments: Dict[str, int], pk: int, prefix: str = '') -> None:
+    bit = 1 << pk
+    for key in segments:
+        if key.startswith(prefix):
+            segments[key] &= ~bit
+
+
+def _set_memberships(segments: Dict[str, int], user_ids: Iterable[int], group_ids: Iterable[int], added: bool) -> None:
+    bits = bitmap(user_ids)
+    for group_id in group_ids:
+        key = f'group:{group_id}'
+        segments[key] = segments.get(key, 0) | bits if added else segments.get(key, 0) & ~bits
+
+
+def _clear_group(segments: Dict[str, int], group_id: int) -> None:
+    segments[f'group:{group_id}'] = 0
+
+
+class AudienceIndex:
+    """Bitmaps des segments d'utilisateurs (voir le module)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.version = None
+        self._segments: Dict[str, int] = {}
+        self._groups: Dict[str, int] = {}
+
+    def load(self, version: int | None = None) -> None:
+        """Recharge tous les bitmaps depuis la base."""
+        ids = defaultdict(list)
+        for pk, priority, active in User.objects.values_list('pk', 'priority_db', 'is_active').iterator(chunk_size=10_000):
+            ids['all'].append(pk)
+            if active:
+                ids['active'].append(pk)
+            if priority in PRIORITIES:
+                ids[f'priority:{priority}'].append(pk)
+        memberships = User.groups.through.objects.values_list('user_id', 'group_id')
+        for user_id, group_id in memberships.iterator(chunk_size=10_000):
+            ids[f'group:{group_id}'].append(user_id)
+        groups = dict(Group.objects.values_list('name', 'pk'))
+        segments = {key: bitmap(values) for key, values in ids.items()}
+        with self._lock:
+            self._segments, self._groups, self.version = segments, groups, version
+
+    def apply(self, change: Callable[[Dict[str, int]], None], version: int) -> None:
+        """
+        Applique un changement validé portant le numéro ``version`` ; ignoré
+        si l'index n'était pas à ``version - 1`` (il sera rechargé).
+        """
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                change(self._segments)
+                self.version = version
+
+    @staticmethod
+    def invalidate() -> int:
+        """Incrémente le numéro de version : chaque processus rechargera l'index."""
+        return caching.next_sequence(VERSION_KEY)
+
+    def ensure_current(self) -> None:
+        """Recharge l'index si le numéro de version a changé depuis le dernier chargement."""
+        version = caching.sequence(VERSION_KEY)
+        if version != self.version:
+            self.load(version)
+
+    # ---------------------------
+    # Résolution
+    # ---------------------------
+
+    def _segment(self, kind: str, text: str, window: int) -> int:
+        segments = self._segments
+        if kind == 'compare':
+            operator, level = COMPARE_RE.fullmatch(text).groups()
+            result = 0
+            for priority in priority_levels(operator, level.lower()):
+                result |= segments.get(f'priority:{priority}', 0)
+            return result
+        if kind == 'segment':
+            name, value = text.split(':', 1)
+            value = value.strip('"')
+            name = name.lower()
+            if name == 'priority':
+                return self._segment('compare', f'priority={value}', window)
+            if name == 'group':
+                if value not in self._groups:
+                    raise ValueError(f"Groupe inconnu : {value}")
+                return segments.get(f'group:{self._groups[value]}', 0)
+            raise ValueError(f"Segment inconnu : {name}")
+        if text in ('all', 'active'):
+            return segments.get(text, 0)
+        if text == 'window':
+            return window
+        raise ValueError(f"Segment inconnu : {text}")
+
+    def bitmap(self, expression: str, moment=None) -> int:
+        """Bitmap de l'audience décrite par ``expression`` ; lève ``ValueError``."""
+        tokens = tokenize(expression)
+        window = 0
+        if ('word', 'window') in tokens:
+            window = bitmap(directory.available_ids(moment or timezone.now()))
+        self.ensure_current()
+        with self._lock:
+            universe = self._segments.get('all', 0)
+            parser = _Parser(tokens, lambda kind, text: self._segment(kind, text, window), universe)
+            return parser.parse() & universe
+
+    def count(self, expression: str, moment=None) -> int:
+        """Taille de l'audience, sans énumérer les identifiants."""
+        return self.bitmap(expression, moment).bit_count()
+
+    def ids(self, expression: str, moment=None) -> List[int]:
+        """Identifiants croissants de l'audience."""
+        return members(self.bitmap(expression, moment))
+
+
+audience = AudienceIndex()
+
+
+# Champs de ``User`` lus par l'index
+FIELDS = {'priority_db', 'is_active'}
+
+
+def _schedule(change: Callable[[Dict[str, int]], None]) -> None:
+    transaction.on_commit(lambda: audience.apply(change, AudienceIndex.invalidate()))
+
+
+@receiver(post_save, sender=User, dispatch_uid='audience_user_saved')
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not FIELDS & set(update_fields):
+        return
+    pk, priority, active = instance.pk, instance.priority_db, instance.is_active
+    _schedule(lambda segments: _set_user(segments, pk, priority, active))
+
+
+@receiver(post_delete, sender=User, dispatch_uid='audience_user_deleted')
+def user_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    _schedule(lambda segments: _drop_user(segments, pk))
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='audience_groups_changed')
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    pk = instance.pk
+    if action == 'post_clear':
+        # ``pk_set`` vaut None : c'est ``instance`` qui perd tous ses liens
+        _schedule(lambda segments: _clear_group(segments, pk) if reverse else _drop_user(segments, pk, 'group:'))
+        return
+    user_ids, group_ids = (set(pk_set), [pk]) if reverse else ([pk], set(pk_set))
+    added = action == 'post_add'
+    _schedule(lambda segments: _set_memberships(segments, user_ids, group_ids, added))
+
+
+@receiver([post_save, post_delete], sender=Group, dispatch_uid='audience_group_changed')
+def group_changed(sender, **kwargs):
+    # Création, renommage ou suppression (liens supprimés en cascade, sans
+    # signal ``m2m_changed``) : rechargement complet, les groupes changent peu
+    transaction.on_commit(AudienceIndex.invalidate)
@@ -0,0 +1,7 @@
+"""
+Outils de mesure des performances du système de notifications.
+
+Ces modules ne sont jamais importés par l'application elle-même : ils sont
+utilisés par les commandes de gestion ``bench_*`` sur une base dédiée
+aux mesures, car ils y insèrent des volumes importants de données.
+"""
@@ -0,0 +1,43 @@
+"""
+Débit du moteur de diffusion (``notifications.delivery``) sur les
+passerelles factices.
+
+Les passerelles simulent un temps de réponse fixe par appel (``latency``) ;
+on compare l'envoi un par un, séquentiel, à l'envoi par lots en parallèle.
+Les adresses sont synthétiques : aucune base de données n'est nécessaire.
+"""
+
+import time
+from typing import Dict, Iterable
+
+from ..delivery import DeliveryEngine
+
+
+def measure_throughput(recipients: int, channels: Iterable[str] = ('sms', 'push'), workers: int = 4,
+                       batch_size: int | None = None, latency: float = 0.005) -> Dict:
+    """Envoie un message à ``recipients`` adresses par canal ; retourne le débit obtenu."""
+    options = {name: {'latency': latency} for name in channels}
+    engine = DeliveryEngine(channels, workers=workers, batch_size=batch_size, options=options)
+    addresses = {name: [f'+33{i:09d}' for i in range(recipients)] for name in channels}
+    start = time.perf_counter()
+    try:
+        report = engine.send(addresses, {'subject': 'Bench', 'message': 'Test de débit'})
+    finally:
+        engine.close()
+    elapsed = time.perf_counter() - start
+    sent = sum(result['sent'] for result in report.values())
+    return {
+        'recipients': recipients,
+        'workers': workers,
+        'batches': sum(result['batches'] for result in report.values()),
+        'seconds': round(elapsed, 3),
+        'sends_per_second': round(sent / elapsed) if elapsed else None,
+    }
+
+
+def compare(recipients: int, workers: int = 4, latency: float = 0.005) -> Dict[str, Dict]:
+    """Compare l'envoi unitaire séquentiel à l'envoi par lots en parallèle."""
+    return {
+        'unitaire': measure_throughput(recipients, workers=1, batch_size=1, latency=latency),
+        'par_lots': measure_throughput(recipients, workers=workers, latency=latency),
+    }
@@ -0,0 +1,51 @@
+"""
+Débit de ``PriorityDispatcher`` sur un arriéré synthétique.
+
+Les éléments reçoivent une priorité et un début de fenêtre aléatoires
+(dans les ``hours`` prochaines heures) ; on mesure le chargement en masse,
+la planification unitaire et la distribution de tout l'arriéré.
+"""
+
+import random
+import time
+from datetime import timedelta
+from typing import Dict
+
+from django.utils import timezone
+
+from ..dispatcher import PriorityDispatcher
+from ..models import PRIORITIES
+
+
+def measure(items: int, hours: int = 8, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    now = timezone.now()
+    backlog = [
+        (i, rng.choice(PRIORITIES), now + timedelta(seconds=rng.randrange(-3600, hours * 3600)))
+        for i in range(items)
+    ]
+
+    bulk = PriorityDispatcher()
+    start = time.perf_counter()
+    bulk.schedule_many(backlog, now=now)
+    bulk_seconds = time.perf_counter() - start
+    depth = bulk.stats()
+
+    single = PriorityDispatcher()
+    start = time.perf_counter()
+    for item, priority, not_before in backlog:
+        single.schedule(item, priority, not_before, now=now)
+    schedule_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    drained = bulk.drain(lambda item, priority: None, now=now + timedelta(hours=hours))
+    drain_seconds = time.perf_counter() - start
+
+    return {
+        'items': items,
+        'ready': depth['ready'],
+        'waiting': depth['waiting'],
+        'bulk_load_per_second': round(items / bulk_seconds),
+        'schedule_per_second': round(items / schedule_seconds),
+        'dispatch_per_second': round(drained / drain_seconds),
+    }
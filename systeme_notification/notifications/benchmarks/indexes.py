@@ -0,0 +1,86 @@
+"""
+Comparaison des requêtes fréquentes avec et sans les index de ``Notification``.
+
+Chaque requête est exécutée plusieurs fois ; on conserve son plan
+d'exécution (``QuerySet.explain``) et la médiane de ses temps. Les index
+déclarés dans ``Notification.Meta.indexes`` (et l'index BRIN sous
+PostgreSQL) sont ensuite supprimés, les mesures refaites, puis les index
+recréés.
+"""
+
+import statistics
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List
+
+from django.db import connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from ..models import Notification
+
+
+BRIN_INDEX = 'notif_created_brin'
+
+
+def hot_queries(user_id: int) -> Dict[str, Callable]:
+    """Requêtes des tableaux de bord et de l'admin, sous forme de fabriques de querysets."""
+    now = timezone.now()
+    return {
+        'user_feed': lambda: Notification.objects.filter(destinataire_id=user_id).order_by('-created_at')[:20],
+        'window_24h': lambda: Notification.objects.filter(created_at__gte=now - timedelta(hours=24)),
+        'priority_window': lambda: Notification.objects.filter(
+            priority='haute', created_at__gte=now - timedelta(days=7)
+        ),
+        'admin_list': lambda: Notification.objects.order_by('-created_at')[:100],
+        'stats_grouped': lambda: Notification.objects.order_by().values('priority').annotate(
+            count=Count('id'), notifs_24h=Count('id', filter=Q(created_at__gte=now - timedelta(hours=24)))
+        ),
+    }
+
+
+def measure(queries: Dict[str, Callable], repeat: int = 5) -> Dict[str, Dict]:
+    """Retourne, pour chaque requête, son plan et sa latence médiane en millisecondes."""
+    results = {}
+    for name, build in queries.items():
+        timings: List[float] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(build())
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'plan': build().explain(),
+        }
+    return results
+
+
+def compare(user_id: int, repeat: int = 5, using: str = 'default') -> Dict[str, Dict]:
+    """Mesure les requêtes avec les index, sans les index, puis recrée les index."""
+    queries = hot_queries(user_id)
+    after = measure(queries, repeat)
+    indexes = Notification._meta.indexes
+    table = Notification._meta.db_table
+    postgresql = connections[using].vendor == 'postgresql'
+    with connections[using].schema_editor() as editor:
+        for index in indexes:
+            editor.remove_index(Notification, index)
+        if postgresql:
+            editor.execute(f'DROP INDEX IF EXISTS {BRIN_INDEX}')
+    try:
+        before = measure(queries, repeat)
+    finally:
+        with connections[using].schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Notification, index)
+            if postgresql:
+                editor.execute(f'CREATE INDEX IF NOT EXISTS {BRIN_INDEX} ON {table} USING brin (created_at)')
+    return {
+        name: {
+            'before_ms': before[name]['median_ms'],
+            'after_ms': after[name]['median_ms'],
+            'plan_before': before[name]['plan'],
+            'plan_after': after[name]['plan'],
+        }
+        for name in queries
+    }
@@ -0,0 +1,89 @@
+"""
+Génération rapide de données pour les mesures de performance.
+
+Les utilisateurs sont créés par ``bulk_create`` avec un mot de passe
+inutilisable (aucun hachage) ; les notifications sont insérées par
+``executemany`` afin de pouvoir répartir ``created_at`` dans le passé,
+ce que ``auto_now_add`` interdirait via l'ORM.
+"""
+
+import random
+from datetime import timedelta
+from typing import List
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models import PRIORITIES, Notification, User
+
+
+def seed_users(count: int, prefix: str = 'bench', batch_size: int = 1000,
+               using: str = 'default', seed: int = 0) -> List[int]:
+    """Crée ``count`` utilisateurs et retourne leurs identifiants."""
+    rng = random.Random(seed)
+    unusable = make_password(None)
+    now = timezone.now()
+    start = User.objects.using(using).count()
+    for offset in range(0, count, batch_size):
+        User.objects.using(using).bulk_create(
+            [
+                User(
+                    username=f'{prefix}{start + i}',
+                    password=unusable,
+                    priority_db=rng.choice(PRIORITIES),
+                    time_window_start=now,
+                    time_window_end=now + timedelta(hours=8),
+                )
+                for i in range(offset, min(offset + batch_size, count))
+            ],
+        )
+    return list(
+        User.objects.using(using)
+        .filter(username__startswith=prefix)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+def seed_notifications(count: int, user_ids: List[int], days: int = 90, batch_size: int = 5000,
+                       using: str = 'default', seed: int = 0) -> int:
+    """
+    Insère ``count`` notifications réparties sur les ``days`` derniers jours.
+
+    Les lignes sont générées par lots et écrites avec ``executemany``,
+    chaque lot dans sa propre transaction. Retourne le nombre de lignes.
+    """
+    if not user_ids:
+        raise ValueError("Au moins un utilisateur est nécessaire")
+    rng = random.Random(seed)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    meta = Notification._meta
+    columns = ', '.join(
+        qn(meta.get_field(name).column)
+        for name in ('message', 'destinataire', 'priority', 'time_window_start', 'time_window_end', 'created_at')
+    )
+    sql = f"INSERT INTO {qn(meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s, %s, %s)"
+    adapt = connection.ops.adapt_datetimefield_value
+    now = timezone.now()
+    span = days * 24 * 3600
+
+    written = 0
+    while written < count:
+        size = min(batch_size, count - written)
+        rows = [
+            (
+                f'Notification de test {written + i}',
+                rng.choice(user_ids),
+                rng.choice(PRIORITIES),
+                None,
+                None,
+                adapt(now - timedelta(seconds=rng.randrange(span))),
+            )
+            for i in range(size)
+        ]
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        written += size
+    return written
@@ -0,0 +1,57 @@
+"""
+Débit de sérialisation de la liste des notifications.
+
+Compare, sur les mêmes lignes, ``NotificationSerializer`` (``ModelSerializer``
+sur des instances) suivi du rendu JSON de DRF, au chemin rapide
+``NotificationValuesSerializer`` (tuples de ``values_list``) suivi des
+rendus ``FastJSONRenderer`` et ``MessagePackRenderer``. Le temps mesuré
+comprend la lecture en base, la sérialisation et le rendu.
+"""
+
+import time
+from typing import Callable, Dict
+
+from rest_framework.renderers import JSONRenderer
+
+from ..models import Notification
+from ..renderers import FastJSONRenderer, MessagePackRenderer, orjson
+from ..serializers import NotificationSerializer, NotificationValuesSerializer
+
+
+def _model_serializer(queryset, renderer):
+    return renderer.render(NotificationSerializer(list(queryset), many=True).data)
+
+
+def _values_serializer(queryset, renderer):
+    fast = NotificationValuesSerializer()
+    return renderer.render(fast.to_representation(fast.select(queryset)))
+
+
+def measure(run: Callable[[], bytes], rows: int, repeat: int) -> Dict:
+    """Meilleur temps sur ``repeat`` exécutions ; retourne le débit et la taille produite."""
+    best, size = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(run())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'rows': rows,
+        'seconds': round(best, 4),
+        'rows_per_second': round(rows / best) if best else None,
+        'bytes': size,
+    }
+
+
+def compare(rows: int = 5000, repeat: int = 3) -> Dict[str, Dict]:
+    """Mesure chaque combinaison sérialiseur / rendu sur les ``rows`` notifications les plus récentes."""
+    queryset = Notification.objects.order_by('-created_at', '-id')[:rows]
+    rows = queryset.count()
+    variants = {
+        'model_serializer+json': lambda: _model_serializer(queryset, JSONRenderer()),
+        'values+json': lambda: _values_serializer(queryset, JSONRenderer()),
+        'values+msgpack': lambda: _values_serializer(queryset, MessagePackRenderer()),
+    }
+    if orjson is not None:
+        variants['values+orjson'] = lambda: _values_serializer(queryset, FastJSONRenderer())
+    return {name: measure(run, rows, repeat) for name, run in variants.items()}
@@ -0,0 +1,174 @@
+"""
+Suite de mesures des chemins critiques en situation d'incident.
+
+Chaque scénario est exécuté ``repeat`` fois ; on relève la latence
+(percentiles 50 / 95 / 99 et maximum, en millisecondes) et le nombre de
+requêtes SQL par exécution, puis, lors d'une exécution à part (``tracemalloc``
+ralentit fortement le code mesuré), le pic de mémoire Python. Les vues sont
+appelées par le client de test de Django, cache vidé avant chaque
+exécution : on mesure le calcul, pas la lecture du cache.
+
+La mesure ne laisse aucune trace : elle s'exécute dans une transaction
+annulée à la fin (administrateur de mesure, diffusions) et avec un cache
+local dédié, sans vider le cache partagé (disjoncteurs, jetons de version).
+Seul ``seed`` écrit réellement dans la base.
+
+``compare`` confronte deux séries de résultats (JSON de ``bench``) et
+signale les scénarios ralentis au-delà d'un facteur donné.
+"""
+
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import caching
+
+from ..core import Incendie
+from ..fanout import BroadcastFanOut
+from ..models import Notification, NotificationCounter, NotificationRollup, User
+from ..tasks import dispatch_evacuation
+from .seed import seed_notifications, seed_users
+
+
+ADMIN_USERNAME = 'bench_admin'
+
+# Cache local utilisé pendant la mesure, à la place du cache partagé
+BENCH_CACHE = 'notifications-bench'
+
+# En dessous de cet écart absolu (ms), un ralentissement relatif est du bruit
+MIN_SLOWDOWN_MS = 0.5
+
+
+def seed(users: int, notifications: int) -> None:
+    """Crée les données de mesure, puis recalcule compteurs et agrégats."""
+    user_ids = seed_users(users)
+    seed_notifications(notifications, user_ids)
+    # ``seed_notifications`` écrit en SQL direct : rien n'a été maintenu
+    NotificationCounter.rebuild()
+    NotificationRollup.rebuild()
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+@contextmanager
+def isolated() -> Iterator[None]:
+    """Cache local dédié et transaction annulée à la sortie (voir le module)."""
+    caches = {**settings.CACHES, BENCH_CACHE: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': BENCH_CACHE,
+    }}
+    notifications_cache = {**getattr(settings, 'NOTIFICATIONS_CACHE', {}), 'alias': BENCH_CACHE}
+    with override_settings(CACHES=caches, NOTIFICATIONS_CACHE=notifications_cache), transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(run: Callable[[], object], repeat: int) -> Dict:
+    """Exécute ``run`` ``repeat`` fois et retourne latences, requêtes et pic mémoire."""
+    timings, queries = [], []
+    clear = caching.get_cache().clear
+    for _ in range(repeat):
+        clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+    clear()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'runs': repeat,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def _client(user) -> Client:
+    # Hors tests, ``ALLOWED_HOSTS`` vide n'accepte que localhost (DEBUG)
+    allowed = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')]
+    client = Client(SERVER_NAME=allowed[-1] if allowed else 'localhost')
+    client.force_login(user)
+    return client
+
+
+def _get(client: Client, url: str) -> None:
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} : {response.status_code}")
+
+
+def _dispatch_evacuation() -> None:
+    # Coût côté requête : les tâches Celery ne partent qu'au commit, annulé ici
+    with transaction.atomic():
+        dispatch_evacuation(Incendie())
+        transaction.set_rollback(True)
+
+
+def _broadcast() -> None:
+    # Annulée à chaque exécution : les suivantes mesurent le même volume
+    with transaction.atomic():
+        BroadcastFanOut().start("Mesure de diffusion", priority='haute')
+        transaction.set_rollback(True)
+
+
+def scenarios() -> Dict[str, Callable[[], None]]:
+    """Scénarios mesurés, indexés par nom."""
+    user = User.objects.filter(is_superuser=False).order_by('pk').first()
+    if user is None:
+        raise ValueError("Base vide : lancez d'abord le remplissage (--seed)")
+    admin = User.objects.filter(username=ADMIN_USERNAME).first() or User.objects.create_superuser(
+        ADMIN_USERNAME, 'bench@campus.local', None
+    )
+    user_client, admin_client = _client(user), _client(admin)
+    return {
+        'broadcast_fanout': _broadcast,
+        'user_dashboard': lambda: _get(user_client, reverse('user_dashboard')),
+        'admin_dashboard': lambda: _get(admin_client, reverse('admin_dashboard')),
+        'stats_api': lambda: _get(admin_client, reverse('stats_api')),
+        'notification_list': lambda: _get(user_client, reverse('notification-list')),
+        'evacuation_dispatch': _dispatch_evacuation,
+    }
+
+
+def run_suite(repeat: int = 20, only: List[str] | None = None) -> Dict[str, Dict]:
+    """Mesure chaque scénario (ou ceux de ``only``), sans rien conserver (voir ``isolated``)."""
+    with isolated():
+        selected = scenarios()
+        if only:
+            selected = {name: run for name, run in selected.items() if name in only}
+        return {name: measure(run, repeat) for name, run in selected.items()}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], max_slowdown: float) -> List[str]:
+    """
+    Retourne la description des scénarios dont la latence médiane dépasse
+    ``max_slowdown`` fois celle de ``baseline``.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        before, after = reference['p50_ms'], result['p50_ms']
+        if after > before * max_slowdown and after - before > MIN_SLOWDOWN_MS:
+            regressions.append(f"{name} : {before} ms → {after} ms (×{after / before:.2f})")
+    return regressions
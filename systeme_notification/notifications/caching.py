@@ -0,0 +1,211 @@
+"""
+Cache des statistiques et des tableaux de bord.
+
+Les valeurs calculées (``stats_api``, ``admin_dashboard``, contexte de
+``user_dashboard``) sont rangées dans le cache Django sous une clé qui
+contient un **jeton de version** :
+
+- ``stats`` : changé à chaque écriture de notification ou d'utilisateur ;
+- ``feed`` : changé à chaque diffusion (toutes les boîtes de réception) ;
+- ``user:<id>`` : changé à chaque écriture concernant cet utilisateur ;
+- ``notifications`` : changé à chaque écriture de notification, lectures
+  comprises (liste de l'API).
+
+Invalider revient donc à changer un jeton (une écriture de cache), sans
+parcourir ni supprimer les entrées : les anciennes expirent d'elles-mêmes.
+Chaque jeton porte l'instant de sa création (``changed_at``), ce qui en
+fait aussi un validateur HTTP (voir ``notifications.conditional``).
+Les jetons sont changés par les récepteurs de signaux de ce module
+(``post_save``, ``post_delete``, ``notifications_broadcast``,
+``notifications_read``), immédiatement puis à nouveau après validation
+de la transaction, pour qu'un calcul concurrent lancé avant le commit ne
+reste pas en cache.
+
+Contre les avalanches de recalcul (des centaines d'administrateurs qui
+rafraîchissent pendant un incident), ``get_or_compute`` ne laisse qu'un
+seul processus recalculer une clé manquante (verrou ``cache.add``) ; les
+autres servent la dernière valeur connue ou attendent brièvement. La
+durée de vie est majorée d'un aléa (``jitter``) pour que les clés
+n'expirent pas toutes en même temps.
+"""
+
+import random
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Notification, User
+from .signals import notifications_broadcast, notifications_read
+
+
+DEFAULTS = {
+    'alias': 'default',
+    'timeout': 60,
+    'jitter': 0.1,
+    'lock_timeout': 10,
+    'wait': 2.0,
+}
+
+KEY_PREFIX = 'notifications'
+
+# Durée de vie de la dernière valeur connue, en multiple de ``timeout``
+STALE_FACTOR = 10
+
+
+def get_settings() -> Dict:
+    """Réglages par défaut, surchargés par ``NOTIFICATIONS_CACHE``."""
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_settings()['alias']]
+
+
+def _version_key(scope: str) -> str:
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def _new_token() -> str:
+    # Instant de création (µs, hexadécimal) puis partie aléatoire
+    return f'{time.time_ns() // 1000:x}-{uuid.uuid4().hex[:16]}'
+
+
+def versions(*scopes: str) -> str:
+    """Jetons courants des portées ``scopes``, concaténés (crée ceux qui manquent)."""
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    tokens = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_token(), timeout=None)
+            found[key] = cache.get(key)
+        tokens.append(found[key])
+    return '.'.join(tokens)
+
+
+def changed_at(token: str) -> datetime:
+    """Instant du dernier changement des portées d'un jeton de ``versions``."""
+    stamps = []
+    for part in token.split('.'):
+        try:
+            stamps.append(int(part.split('-', 1)[0], 16))
+        except ValueError:
+            # Jeton d'un autre format : changement inconnu, considéré récent
+            stamps.append(time.time_ns() // 1000)
+    return datetime.fromtimestamp(max(stamps) / 1e6, tz=dt_timezone.utc)
+
+
+def bump(*scopes: str) -> None:
+    """Invalide les valeurs dépendant de ``scopes``, maintenant et après le commit."""
+    def change():
+        get_cache().set_many({_version_key(scope): _new_token() for scope in scopes}, timeout=None)
+    change()
+    transaction.on_commit(change)
+
+
+def sequence(key: str) -> int:
+    """
+    Valeur courante du compteur partagé ``key`` (créé s'il manque).
+
+    Un compteur recréé après éviction part d'une valeur aléatoire, pour
+    qu'un processus ne confonde pas l'ancienne série avec la nouvelle.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, random.getrandbits(48), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def next_sequence(key: str) -> int:
+    """Incrémente atomiquement le compteur partagé ``key`` et retourne sa nouvelle valeur."""
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        sequence(key)
+        return cache.incr(key)
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], timeout: int | None = None) -> Any:
+    """
+    Retourne la valeur en cache de ``key`` ou la calcule par ``compute``.
+
+    Un seul appelant calcule une clé absente ; pendant ce temps, les autres
+    reçoivent la dernière valeur calculée (quelle que soit sa version) ou,
+    à défaut, attendent jusqu'à ``wait`` secondes avant de calculer eux-mêmes.
+    """
+    config = get_settings()
+    cache = get_cache()
+    name, _, _ = key.rpartition('@')
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=config['lock_timeout']):
+        stale = cache.get(f'{name}:stale')
+        if stale is not None:
+            return stale
+        deadline = time.monotonic() + config['wait']
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return compute()
+
+    try:
+        value = compute()
+        timeout = config['timeout'] if timeout is None else timeout
+        cache.set(key, value, timeout=round(timeout * (1 + random.uniform(0, config['jitter']))))
+        # La dernière valeur connue survit à l'invalidation, le temps d'un recalcul
+        cache.set(f'{name}:stale', value, timeout=timeout * STALE_FACTOR)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def cached(name: str, compute: Callable[[], Any], *scopes: str, timeout: int | None = None) -> Any:
+    """``get_or_compute`` sur la clé ``name`` versionnée par les portées ``scopes``."""
+    return get_or_compute(f'{KEY_PREFIX}:{name}@{versions(*scopes)}', compute, timeout)
+
+
+# ---------------------------
+# Invalidation
+# ---------------------------
+
+@receiver(post_save, sender=Notification, dispatch_uid='cache_notification_saved')
+@receiver(post_delete, sender=Notification, dispatch_uid='cache_notification_deleted')
+def notification_changed(sender, instance, **kwargs):
+    scopes = ['stats', 'notifications']
+    if instance.destinataire_id is not None:
+        scopes.append(f'user:{instance.destinataire_id}')
+    bump(*scopes)
+
+
+@receiver(notifications_broadcast, dispatch_uid='cache_notifications_broadcast')
+def notifications_broadcasted(sender, **kwargs):
+    bump('stats', 'feed', 'notifications')
+
+
+@receiver(notifications_read, dispatch_uid='cache_notifications_read')
+def notifications_marked_read(sender, user_id, **kwargs):
+    bump(f'user:{user_id}', 'notifications')
+
+
+@receiver(post_save, sender=User, dispatch_uid='cache_user_saved')
+@receiver(post_delete, sender=User, dispatch_uid='cache_user_deleted')
+def user_changed(sender, instance, created=True, **kwargs):
+    # Seuls l'ajout et la suppression changent les statistiques (``total_users``)
+    if created:
+        bump('stats', f'user:{instance.pk}')
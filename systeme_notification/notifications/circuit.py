@@ -0,0 +1,220 @@
+"""
+Disjoncteur (circuit breaker) à états pour les canaux des urgences.
+
+Un disjoncteur protège un appel (par exemple ``Incendie.speaker``) :
+
+- **fermé** : les appels passent ; leurs résultats alimentent une fenêtre
+  glissante des ``window_size`` derniers appels. Dès que la fenêtre
+  contient au moins ``minimum_calls`` appels et que le taux d'échecs ou
+  d'appels lents (plus de ``slow_call_duration`` secondes) atteint son
+  seuil, le disjoncteur s'ouvre ;
+- **ouvert** : les appels échouent immédiatement (``CircuitOpenError``),
+  sans solliciter le canal défaillant, pendant ``open_timeout`` secondes ;
+- **semi-ouvert** : à l'issue du délai, un seul appel d'essai est autorisé
+  (tous workers confondus) ; son succès referme le disjoncteur, son échec
+  le rouvre.
+
+L'état est conservé dans le cache Django (alias ``cache_alias``) : avec un
+cache partagé (Redis), tous les workers gunicorn voient le même
+disjoncteur. Chaque lecture-modification-écriture de l'état a lieu sous
+un verrou court (``cache.add``), pour que des workers concurrents ne
+s'écrasent pas leurs résultats et que le seuil d'échecs soit bien atteint. Les changements d'état sont notifiés aux fonctions
+enregistrées par ``add_transition_listener``.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Valeur numérique de l'état, exposée dans les mesures Prometheus
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DEFAULTS = {
+    'failure_rate_threshold': 0.5,
+    'slow_call_rate_threshold': 0.5,
+    'slow_call_duration': 2.0,
+    'window_size': 20,
+    'minimum_calls': 5,
+    'open_timeout': 30.0,
+    'cache_alias': 'default',
+}
+
+# Durée de vie du verrou d'état (s) : un worker tué ne bloque pas les autres plus longtemps
+LOCK_TIMEOUT = 5
+
+
+class CircuitOpenError(Exception):
+    """Levée lorsqu'un appel est refusé par un disjoncteur ouvert."""
+
+
+_listeners: List[Callable[[str, str, str], None]] = []
+_transitions: Counter = Counter()
+_states: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def add_transition_listener(listener: Callable[[str, str, str], None]) -> None:
+    """Enregistre ``listener(nom, ancien_état, nouvel_état)``, appelé à chaque transition."""
+    _listeners.append(listener)
+
+
+def remove_transition_listener(listener: Callable[[str, str, str], None]) -> None:
+    _listeners.remove(listener)
+
+
+def _record_transition(name: str, old: str, new: str) -> None:
+    # Mesure par défaut : compteur de transitions et dernier état connu
+    with _lock:
+        _transitions[(name, new)] += 1
+        _states[name] = new
+    logger.warning("Disjoncteur %s : %s → %s", name, old, new)
+
+
+add_transition_listener(_record_transition)
+
+
+def get_settings() -> Dict:
+    """Réglages par défaut, surchargés par ``NOTIFICATIONS_CIRCUIT_BREAKER``."""
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS_CIRCUIT_BREAKER', {})}
+
+
+class CircuitBreaker:
+    """Disjoncteur nommé dont l'état est partagé via le cache Django."""
+
+    def __init__(self, name: str, **options) -> None:
+        self.name = name
+        self.options = options
+
+    def __getattr__(self, option):
+        # Options résolues à l'appel : les réglages peuvent changer (tests)
+        config = get_settings()
+        if option in config:
+            return self.options.get(option, config[option])
+        raise AttributeError(option)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def key(self) -> str:
+        return f'circuit:{self.name}'
+
+    def _load(self) -> Dict:
+        return self.cache.get(self.key) or {'state': CLOSED, 'opened_at': None, 'outcomes': []}
+
+    def _save(self, data: Dict) -> None:
+        self.cache.set(self.key, data, timeout=None)
+
+    @contextmanager
+    def _locked(self):
+        """Verrou partagé autour d'une mise à jour de l'état (voir le module)."""
+        lock = f'{self.key}:lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        acquired = self.cache.add(lock, 1, timeout=LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.001)
+            acquired = self.cache.add(lock, 1, timeout=LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if acquired:
+                self.cache.delete(lock)
+
+    def _transition(self, data: Dict, new_state: str) -> None:
+        old_state = data['state']
+        data['state'] = new_state
+        if new_state == OPEN:
+            data['opened_at'] = time.time()
+        if new_state in (OPEN, CLOSED):
+            data['outcomes'] = []
+        for listener in list(_listeners):
+            listener(self.name, old_state, new_state)
+
+    @property
+    def state(self) -> str:
+        return self._load()['state']
+
+    def allow_request(self) -> bool:
+        """Indique si un appel peut passer ; réserve l'appel d'essai en semi-ouvert."""
+        data = self._load()
+        if data['state'] == CLOSED:
+            return True
+        if data['state'] == OPEN:
+            if time.time() - data['opened_at'] < self.open_timeout:
+                return False
+            with self._locked():
+                data = self._load()
+                if data['state'] == OPEN:
+                    self._transition(data, HALF_OPEN)
+                    self._save(data)
+        # Un seul appel d'essai à la fois : ``add`` est atomique dans le cache
+        return self.cache.add(f'{self.key}:probe', 1, timeout=self.open_timeout)
+
+    def record(self, failed: bool, duration: float) -> None:
+        """Enregistre le résultat d'un appel et met à jour l'état."""
+        slow = duration >= self.slow_call_duration
+        with self._locked():
+            data = self._load()
+            if data['state'] == HALF_OPEN:
+                self._transition(data, OPEN if failed or slow else CLOSED)
+                self.cache.delete(f'{self.key}:probe')
+            elif data['state'] == CLOSED:
+                outcomes = (data['outcomes'] + [(failed, slow)])[-self.window_size:]
+                data['outcomes'] = outcomes
+                if len(outcomes) >= self.minimum_calls:
+                    failure_rate = sum(f for f, _ in outcomes) / len(outcomes)
+                    slow_rate = sum(s for _, s in outcomes) / len(outcomes)
+                    if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                        self._transition(data, OPEN)
+            self._save(data)
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Exécute ``func`` sous la protection du disjoncteur."""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Disjoncteur {self.name} ouvert")
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(True, time.perf_counter() - start)
+            raise
+        self.record(False, time.perf_counter() - start)
+        return result
+
+    def reset(self) -> None:
+        """Referme le disjoncteur et vide sa fenêtre."""
+        self.cache.delete_many([self.key, f'{self.key}:probe', f'{self.key}:lock'])
+
+
+def render_prometheus() -> str:
+    """État et transitions des disjoncteurs connus de ce processus, au format Prometheus."""
+    with _lock:
+        states = dict(_states)
+        transitions = dict(_transitions)
+    lines = [
+        "# HELP notifications_circuit_state État du disjoncteur (0 fermé, 1 semi-ouvert, 2 ouvert).",
+        '# TYPE notifications_circuit_state gauge',
+    ]
+    for name, state in sorted(states.items()):
+        lines.append(f'notifications_circuit_state{{circuit="{name}"}} {STATE_VALUES[state]}')
+    lines += [
+        '# HELP notifications_circuit_transitions_total Transitions par disjoncteur et état atteint.',
+        '# TYPE notifications_circuit_transitions_total counter',
+    ]
+    for (name, state), count in sorted(transitions.items()):
+        lines.append(f'notifications_circuit_transitions_total{{circuit="{name}",state="{state}"}} {count}')
+    return '\n'.join(lines) + '\n'
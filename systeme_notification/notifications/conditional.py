@@ -0,0 +1,91 @@
+"""
+Requêtes HTTP conditionnelles (``ETag`` / ``Last-Modified`` / ``304``).
+
+Les validateurs sont dérivés des jetons de version de
+``notifications.caching`` : l'``ETag`` est une empreinte des jetons des
+portées dont dépend la réponse (et de ce qui la distingue : URL complète,
+format demandé, utilisateur…), ``Last-Modified`` l'instant du dernier
+changement de ces portées. Vérifier qu'une réponse est à jour coûte donc
+une lecture de cache, sans requête SQL ni sérialisation ; le client qui
+renvoie ``If-None-Match`` ou ``If-Modified-Since`` reçoit un
+``304 Not Modified`` vide.
+
+Une réponse qui dépend aussi de l'heure (compteurs sur 24 heures, 7 jours)
+passe une période : les validateurs changent au début de chaque période,
+même si aucune portée n'a changé.
+"""
+
+import hashlib
+import time
+from functools import wraps
+from typing import Callable, Iterable, Tuple
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .caching import changed_at, versions
+
+
+def validators(scopes: Iterable[str], *parts, period: int | None = None) -> Tuple[str, int]:
+    """
+    ``(ETag, Last-Modified en secondes)`` des portées ``scopes`` et des
+    ``parts`` ; avec ``period`` (secondes), ils changent aussi au début de
+    chaque période.
+    """
+    token = versions(*scopes)
+    last_modified = int(changed_at(token).timestamp())
+    if period:
+        bucket = int(time.time()) // period * period
+        parts = (*parts, bucket)
+        last_modified = max(last_modified, bucket)
+    digest = hashlib.blake2b('|'.join([token, *map(str, parts)]).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"', last_modified
+
+
+def conditional(scopes: Callable, vary: Callable | None = None, period: Callable[[], int] | None = None):
+    """
+    Décorateur de vue : répond ``304`` si la ressource n'a pas changé.
+
+    ``scopes(request)`` donne les portées dont dépend la réponse et
+    ``vary(request)`` (facultatif) ce qui la distingue en plus de l'URL
+    complète et de l'en-tête ``Accept``. ``period()`` (facultatif) donne la
+    durée en secondes au-delà de laquelle la réponse est périmée même sans
+    changement des portées. Les réponses ``200`` reçoivent
+    ``ETag``, ``Last-Modified`` et ``Cache-Control: private, no-cache`` (le
+    client garde la réponse mais la revalide à chaque fois).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Vue fonction ``(request, …)`` ou méthode ``(self, request, …)``
+            request = args[0] if hasattr(args[0], 'META') else args[1]
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            etag, last_modified = validators(
+                scopes(request),
+                request.get_full_path(),
+                request.META.get('HTTP_ACCEPT', ''),
+                *(vary(request) if vary else ()),
+                period=period() if period else None,
+            )
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(*args, **kwargs)
+                if response.status_code == 200:
+                    response.headers.setdefault('ETag', etag)
+                    response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Cookie'))
+            return response
+        return wrapper
+    return decorator
+
+
+def user_scopes(request):
+    """Portées des réponses propres à l'utilisateur connecté."""
+    return ('feed', f'user:{request.user.pk}')
+
+
+def session_vary(request):
+    # Le gabarit contient le jeton CSRF, propre au secret de session
+    return (request.user.pk, request.META.get('CSRF_COOKIE', ''))
@@ -0,0 +1,30 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import CAMPUS_GROUP, user_group
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Flux WebSocket des notifications de l'utilisateur connecté.
+
+    Le client reçoit en JSON ses notifications individuelles et les
+    diffusions à tout le campus, dès leur validation en base. Les
+    connexions anonymes sont refusées.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.groups_joined = [user_group(user.pk), CAMPUS_GROUP]
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'groups_joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def notification_message(self, event):
+        await self.send_json(event['payload'])
@@ -5,8 +5,12 @@ from .decorators import (
     AddCircuitBreaker,
     message
 )
+import logging
+
 from .descriptors import TimeWindowDescriptor
 
+logger = logging.getLogger(__name__)
+
 # Mixins pour fonctionnalités transverses
 class AlarmMixin:
     @message
@@ -21,16 +25,43 @@ class SpeakerMixin:
 class NotificationMixin:
     @message
     def send_notifications(self, message, destinataire=None):
+        # Import différé : ``core`` ne dépend pas des modèles au chargement
+        from .delivery import deliver
+
+        # Destinataires résolus par l'annuaire en mémoire, sans requête SQL
+        users = [destinataire.pk] if destinataire else None
+        report = deliver(users, {'subject': type(self).__name__, 'message': message})
         notif = f"Notification envoyée : {message}"
-        print(notif)
+        logger.info("%s (%s)", notif, report)
         return notif
 
 # Classe de base pour les urgences
 class Urgence:
     time_window = TimeWindowDescriptor()
 
+    # Canaux déclenchés par une évacuation (méthodes des mixins)
+    channels = ('set_alarm', 'speaker', 'send_notifications')
+    # Consigne diffusée par ``send_notifications``
+    consigne = "Évacuez les lieux"
+
     def evacuer(self):
-        print("Évacuation générique...")
+        logger.info("Évacuation générique...")
+
+    def run_channel(self, channel):
+        """Déclenche un seul canal de l'évacuation et retourne son résultat."""
+        if channel not in self.channels:
+            raise ValueError(f"Canal inconnu pour {type(self).__name__} : {channel}")
+        if channel == 'send_notifications':
+            return self.send_notifications(self.consigne)
+        return getattr(self, channel)()
+
+    def evacuer_async(self):
+        """
+        Planifie l'évacuation en tâches Celery, une par canal, exécutées en
+        parallèle. Retourne immédiatement l'``EvacuationDispatch`` à suivre.
+        """
+        from .tasks import dispatch_evacuation
+        return dispatch_evacuation(self)
 
 # Exemple de sous-classe Epidemie avec tous les décorateurs appliqués
 @AddPerformanceTracking()
@@ -39,16 +70,17 @@ class Urgence:
 @AddCircuitBreaker()
 class Epidemie(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
     required_fields = ['nom']
+    consigne = "Portez un masque"
 
     def __init__(self, nom="Epidemie"):
         self.nom = nom
 
     @message
     def evacuer(self):
-        print(f"Évacuation à cause de {self.nom}")
+        logger.info("Évacuation à cause de %s", self.nom)
         self.set_alarm()
         self.speaker()
-        self.send_notifications("Portez un masque")
+        self.send_notifications(self.consigne)
 
 # Autres urgences possibles
 @AddPerformanceTracking()
@@ -57,16 +89,17 @@ class Epidemie(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
 @AddCircuitBreaker()
 class Incendie(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
     required_fields = ['nom']
+    consigne = "Evacuez immédiatement"
 
     def __init__(self, nom="Incendie"):
         self.nom = nom
 
     @message
     def evacuer(self):
-        print(f"Évacuation à cause de {self.nom}")
+        logger.info("Évacuation à cause de %s", self.nom)
         self.set_alarm()
         self.speaker()
-        self.send_notifications("Evacuez immédiatement")
+        self.send_notifications(self.consigne)
 
 @AddPerformanceTracking()
 @AutoConfigurationValidation()
@@ -74,16 +107,17 @@ class Incendie(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
 @AddCircuitBreaker()
 class Innondation(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
     required_fields = ['nom']
+    consigne = "Montez à l'étage"
 
     def __init__(self, nom="Innondation"):
         self.nom = nom
 
     @message
     def evacuer(self):
-        print(f"Évacuation à cause de {self.nom}")
+        logger.info("Évacuation à cause de %s", self.nom)
         self.set_alarm()
         self.speaker()
-        self.send_notifications("Montez à l'étage")
+        self.send_notifications(self.consigne)
 
 @AddPerformanceTracking()
 @AutoConfigurationValidation()
@@ -91,13 +125,14 @@ class Innondation(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
 @AddCircuitBreaker()
 class Securite(Urgence, AlarmMixin, SpeakerMixin, NotificationMixin):
     required_fields = ['nom']
+    consigne = "Suivez les consignes de sécurité"
 
     def __init__(self, nom="Securite"):
         self.nom = nom
 
     @message
     def evacuer(self):
-        print(f"Évacuation à cause de {self.nom}")
+        logger.info("Évacuation à cause de %s", self.nom)
         self.set_alarm()
         self.speaker()
-        self.send_notifications("Suivez les consignes de sécurité")
+        self.send_notifications(self.consigne)
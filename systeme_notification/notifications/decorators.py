@@ -1,77 +1,33 @@
+import functools
+import logging
 import time
-
-global_registry = {}
-
-# Décorateur méthode
-def message(func):
-    def wrapper(self, *args, **kwargs):
-        print(f"[Message] {func.__name__} appelé")
-        result = func(self, *args, **kwargs)
-        print(f"[Message] {func.__name__} retourné {result}")
-        return result
-    return wrapper
-
-# Décorateur classe - suivi des performances
-def add_performance_tracking(cls):
-    original_evacuer = cls.evacuer
-    def tracked_evacuer(self, *args, **kwargs):
-        start = time.time()
-        result = original_evacuer(self, *args, **kwargs)
-        end = time.time()
-        print(f"[Performance] {cls.__name__}.evacuer a pris {end-start:.3f}s")
-        return result
-    cls.evacuer = tracked_evacuer
-    global_registry[cls.__name__] = cls
-    return cls
-
-# Décorateur classe - validation configuration
-def auto_configuration_validation(cls):
-    original_init = cls.__init__
-
-    def new_init(self, *args, **kwargs):
-        original_init(self, *args, **kwargs)
-        if hasattr(cls, 'required_fields'):
-            for field in cls.required_fields:
-                if not hasattr(self, field):
-                    raise ValueError(f"{cls.__name__} instance manque le champ requis: {field}")
-
-    cls.__init__ = new_init
-    return cls
-
-
-
-# Décorateur classe - enregistrement global
-def register_in_global_registry(cls):
-    global_registry[cls.__name__] = cls
-    return cls
-
-# Décorateur classe - circuit breaker simplifié
-def add_circuit_breaker(cls):
-    original_evacuer = cls.evacuer
-    def safe_evacuer(self, *args, **kwargs):
-        try:
-            return original_evacuer(self, *args, **kwargs)
-        except Exception as e:
-            print(f"[Circuit Breaker] Erreur lors de l'évacuation: {e}")
-            return None
-    cls.evacuer = safe_evacuer
-    return cls
-
-
-
-
-import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from .circuit import CircuitBreaker
 from .descriptors import TimeWindowDescriptor
+from .metrics import registry as metrics
+
+# Journalisation opt-in : rien n'est écrit tant que ces loggers ne sont pas
+# configurés (niveau DEBUG) dans ``LOGGING``.
+message_logger = logging.getLogger('notifications.message')
+performance_logger = logging.getLogger('notifications.performance')
 
 
 
-# Décorateur de méthode simple
+# Décorateur de méthode simple : compte les appels et mesure leur durée
 def message(func):
+    name = func.__name__
+
+    @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
-        print(f"[Message] → Appel de {func.__name__}()")
-        result = func(self, *args, **kwargs)
-        print(f"[Message] ← Fin de {func.__name__}() → {result}")
+        start = time.perf_counter_ns()
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception:
+            metrics.record(type(self).__name__, name, time.perf_counter_ns() - start, error=True)
+            raise
+        metrics.record(type(self).__name__, name, time.perf_counter_ns() - start)
+        if message_logger.isEnabledFor(logging.DEBUG):
+            message_logger.debug("%s.%s() → %r", type(self).__name__, name, result)
         return result
     return wrapper
 
@@ -84,18 +40,21 @@ class AddPerformanceTracking:
             original = cls.evacuer
 
             def tracked(self, *args, **kwargs):
-                start = time.time()
                 start_time = datetime.now()
-
-                print(f"[Performance]  Début {cls.__name__}.evacuer à {start_time.strftime('%H:%M:%S')}")
-                result = original(self, *args, **kwargs)
-                end = time.time()
-                end_time = datetime.now()
+                start = time.perf_counter_ns()
+                try:
+                    result = original(self, *args, **kwargs)
+                except Exception:
+                    metrics.record(cls.__name__, 'evacuer.total', time.perf_counter_ns() - start, error=True)
+                    raise
+                elapsed = time.perf_counter_ns() - start
+                metrics.record(cls.__name__, 'evacuer.total', elapsed)
 
                 # Injection dynamique de la fenêtre temporelle dans l'instance
-                self.time_window = (start_time, end_time)
+                self.time_window = (start_time, start_time + timedelta(microseconds=elapsed // 1000))
 
-                print(f"[Performance]  Fin {cls.__name__}.evacuer ({end - start:.3f}s)")
+                if performance_logger.isEnabledFor(logging.DEBUG):
+                    performance_logger.debug("%s.evacuer (%.3fs)", cls.__name__, elapsed / 1e9)
                 return result
 
             cls.evacuer = tracked
@@ -121,12 +80,32 @@ class RegisterInGlobalRegistry:
 
     def __call__(self, cls):
         self.registry[cls.__name__] = cls
-        print(f"[Registry] Classe enregistrée : {cls.__name__}")
+        logging.getLogger('notifications.registry').debug("Classe enregistrée : %s", cls.__name__)
         return cls
 
 
 class AddCircuitBreaker:
+    """
+    Place chaque canal de l'urgence (``cls.channels``) derrière son propre
+    disjoncteur, nommé ``<Classe>.<canal>`` (voir ``circuit``) : un canal
+    défaillant ou trop lent est court-circuité (``CircuitOpenError``) au lieu
+    d'être relancé à chaque évacuation. ``evacuer`` intercepte toujours les
+    erreurs et retourne ``None``.
+
+    Les options (``failure_rate_threshold``, ``open_timeout``...) surchargent
+    le réglage ``NOTIFICATIONS_CIRCUIT_BREAKER``.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
     def __call__(self, cls):
+        cls.circuit_breakers = {}
+        for channel in getattr(cls, 'channels', ()):
+            breaker = CircuitBreaker(f'{cls.__name__}.{channel}', **self.options)
+            cls.circuit_breakers[channel] = breaker
+            setattr(cls, channel, self.protect(getattr(cls, channel), breaker))
+
         if hasattr(cls, "evacuer"):
             original = cls.evacuer
 
@@ -134,7 +113,16 @@ class AddCircuitBreaker:
                 try:
                     return original(self, *args, **kwargs)
                 except Exception as e:
-                    print(f"[CircuitBreaker] Erreur interceptée dans {cls.__name__} : {e}")
+                    logging.getLogger('notifications.circuit').warning(
+                        "Erreur interceptée dans %s : %s", cls.__name__, e
+                    )
                     return None
             cls.evacuer = safe
         return cls
+
+    @staticmethod
+    def protect(method, breaker):
+        @functools.wraps(method)
+        def protected(self, *args, **kwargs):
+            return breaker.call(method, self, *args, **kwargs)
+        return protected
@@ -0,0 +1,313 @@
+"""
+Moteur de diffusion multi-canal (SMS, Push, Email).
+
+Chaque canal est une classe créée via ``ChannelMeta`` et donc enregistrée
+dans ``ChannelRegistry`` sous son ``channel_name``. Un canal envoie ses
+destinataires par lots (``send_batch``) : une diffusion à N utilisateurs
+devient N / ``batch_size`` appels au fournisseur au lieu de N.
+
+Les connexions aux fournisseurs sont réutilisées d'un lot à l'autre
+(``ConnectionPool``) et les lots de tous les canaux sont envoyés en
+parallèle par un pool de threads (``DeliveryEngine``).
+
+Les fournisseurs sont configurés par ``NOTIFICATIONS_DELIVERY`` ; l'email
+passe par la configuration email de Django (``EMAIL_BACKEND``). Les
+passerelles factices ``FakeSMSGateway`` et ``FakePushGateway`` (et le
+backend email fichier de Django) permettent de tout tester hors ligne.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+from .metaclasses import ChannelMeta, ChannelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    'channels': ('email', 'sms', 'push'),
+    'workers': 4,
+    'batch_size': None,
+    'sms': {'BACKEND': 'notifications.delivery.FakeSMSGateway', 'OPTIONS': {}},
+    'push': {'BACKEND': 'notifications.delivery.FakePushGateway', 'OPTIONS': {}},
+}
+
+
+def get_settings() -> Dict:
+    """Réglages par défaut, surchargés par ``NOTIFICATIONS_DELIVERY``."""
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS_DELIVERY', {})}
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# ---------------------------
+# Passerelles factices
+# ---------------------------
+
+class FakeGateway:
+    """
+    Passerelle factice : chaque envoi groupé est conservé dans ``outbox``
+    (les 1000 derniers) et, si ``path`` est fourni, ajouté en JSON Lines à ce
+    fichier. ``latency`` simule le temps de réponse du fournisseur.
+    """
+    outbox: deque
+    _file_lock = threading.Lock()
+
+    def __init__(self, path=None, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.opened = False
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+    def send_bulk(self, addresses: List[str], payload: Dict) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        entry = {'to': addresses, **payload}
+        type(self).outbox.append(entry)
+        if self.path:
+            with self._file_lock, open(self.path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return len(addresses)
+
+
+class FakeSMSGateway(FakeGateway):
+    outbox = deque(maxlen=1000)
+
+
+class FakePushGateway(FakeGateway):
+    outbox = deque(maxlen=1000)
+
+
+# ---------------------------
+# Pool de connexions
+# ---------------------------
+
+class ConnectionPool:
+    """
+    Au plus ``size`` connexions ouvertes par ``factory`` et réutilisées.
+    Une connexion dont l'utilisation lève une exception est fermée et
+    écartée du pool.
+    """
+
+    def __init__(self, factory, size: int) -> None:
+        self.factory = factory
+        self.opened = 0
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.factory()
+                conn.open()
+                self.opened += 1
+            try:
+                yield conn
+            except Exception:
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# ---------------------------
+# Canaux
+# ---------------------------
+
+class Channel(metaclass=ChannelMeta):
+    """
+    Canal de diffusion. Les sous-classes indiquent le champ de ``User`` qui
+    porte l'adresse (``address_field``), la taille maximale d'un lot chez
+    le fournisseur (``batch_size``) et implémentent ``open_connection`` et
+    ``deliver``.
+    """
+    abstract = True
+    address_field = None
+    batch_size = 100
+
+    def __init__(self, pool_size: int = 4, batch_size: int | None = None, options: Dict | None = None) -> None:
+        self.options = options
+        if batch_size:
+            self.batch_size = batch_size
+        self.pool = ConnectionPool(self.open_connection, pool_size)
+
+    def open_connection(self):
+        raise NotImplementedError
+
+    def deliver(self, connection, recipients: List[str], payload: Dict) -> int:
+        raise NotImplementedError
+
+    def addresses(self, users):
+        """Adresses renseignées des utilisateurs ``users`` (queryset), sans les valeurs par défaut."""
+        from .models import CONTACT_PLACEHOLDERS
+        blank = ['', *filter(None, [CONTACT_PLACEHOLDERS.get(self.address_field)])]
+        return (
+            users.order_by().exclude(**{f'{self.address_field}__in': blank})
+            .values_list(self.address_field, flat=True)
+        )
+
+    def directory_addresses(self, directory, ids=None) -> List:
+        """Adresses lues dans l'annuaire en mémoire (``ids``, ou tous les actifs)."""
+        return directory.addresses(self.address_field, ids)
+
+    def send_batch(self, recipients: List[str], payload: Dict) -> int:
+        """Envoie ``payload`` à un lot de destinataires en un appel ; retourne le nombre d'envois."""
+        with self.pool.connection() as conn:
+            return self.deliver(conn, list(recipients), payload)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class GatewayChannel(Channel):
+    """Canal servi par une passerelle configurée dans ``NOTIFICATIONS_DELIVERY[channel_name]``."""
+    abstract = True
+
+    def open_connection(self):
+        config = get_settings()[self.channel_name]
+        options = config.get('OPTIONS', {}) if self.options is None else self.options
+        return import_string(config['BACKEND'])(**options)
+
+    def deliver(self, connection, recipients, payload):
+        return connection.send_bulk(recipients, payload)
+
+
+class SMS(GatewayChannel):
+    address_field = 'phone_db'
+    batch_size = 500
+
+    def deliver(self, connection, recipients, payload):
+        return connection.send_bulk(recipients, {'text': payload['message']})
+
+
+class Push(GatewayChannel):
+    address_field = 'pk'
+    batch_size = 1000
+
+    def addresses(self, users):
+        return users.order_by().values_list('pk', flat=True)
+
+
+class Email(Channel):
+    """Un seul message par lot, destinataires en copie cachée."""
+    address_field = 'email_perso_db'
+    batch_size = 100
+
+    def open_connection(self):
+        return get_connection(**(self.options or {}))
+
+    def deliver(self, connection, recipients, payload):
+        email = EmailMessage(
+            subject=payload.get('subject', ''),
+            body=payload['message'],
+            bcc=recipients,
+            connection=connection,
+        )
+        connection.send_messages([email])
+        return len(recipients)
+
+
+# ---------------------------
+# Moteur
+# ---------------------------
+
+class DeliveryEngine:
+    """Envoie un message sur plusieurs canaux, lot par lot, avec ``workers`` threads."""
+
+    def __init__(self, channels: Iterable[str] | None = None, workers: int | None = None,
+                 batch_size: int | None = None, options: Dict[str, Dict] | None = None) -> None:
+        config = get_settings()
+        self.workers = workers or config['workers']
+        options = options or {}
+        self.channels = {
+            name: ChannelRegistry.get(name)(
+                pool_size=self.workers,
+                batch_size=batch_size or config['batch_size'],
+                options=options.get(name),
+            )
+            for name in (channels or config['channels'])
+        }
+
+    def send(self, addresses: Dict[str, Iterable], payload: Dict) -> Dict[str, Dict]:
+        """
+        Envoie ``payload`` aux adresses de chaque canal (``{canal: adresses}``).
+        Retourne, par canal, ``sent``, ``batches`` et ``failed`` (destinataires
+        des lots en échec).
+        """
+        report = {name: {'sent': 0, 'batches': 0, 'failed': 0} for name in addresses}
+        jobs = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for name, channel_addresses in addresses.items():
+                channel = self.channels[name]
+                for batch in chunked(channel_addresses, channel.batch_size):
+                    jobs.append((name, len(batch), executor.submit(channel.send_batch, batch, payload)))
+        for name, size, future in jobs:
+            report[name]['batches'] += 1
+            try:
+                report[name]['sent'] += future.result()
+            except Exception:
+                logger.exception("Échec d'un lot de %d envois sur le canal %s", size, name)
+                report[name]['failed'] += size
+        return report
+
+    def deliver(self, users, payload: Dict) -> Dict[str, Dict]:
+        """
+        Envoie ``payload`` sur tous les canaux aux utilisateurs ``users`` :
+        un queryset (adresses lues en base), une liste d'identifiants ou
+        ``None`` pour tous les utilisateurs actifs (adresses lues dans
+        l'annuaire en mémoire, voir ``notifications.directory``).
+        """
+        # Les adresses sont lues ici : les threads n'accèdent jamais à la base
+        if users is None or isinstance(users, (list, tuple, set)):
+            from .directory import directory
+            addresses = {
+                name: channel.directory_addresses(directory, users) for name, channel in self.channels.items()
+            }
+        else:
+            addresses = {name: list(channel.addresses(users).iterator()) for name, channel in self.channels.items()}
+        return self.send(addresses, payload)
+
+    def close(self) -> None:
+        for channel in self.channels.values():
+            channel.close()
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> DeliveryEngine:
+    """Moteur partagé par le processus : ses connexions restent ouvertes entre deux diffusions."""
+    return DeliveryEngine()
+
+
+def deliver(users, payload: Dict) -> Dict[str, Dict]:
+    return get_engine().deliver(users, payload)
@@ -1,11 +1,16 @@
 import re
 
+# Formats acceptés, partagés avec la validation par lots de ``importing``
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_RE = re.compile(r'^\+\d{10,15}$')
+PRIORITY_VALUES = frozenset({'faible', 'moyenne', 'haute', 'urgente'})
+
 class EmailDescriptor:
     def __get__(self, instance, owner):
         return instance.__dict__.get('email')
 
     def __set__(self, instance, value):
-        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', value):
+        if not EMAIL_RE.match(value):
             raise ValueError(f"Email invalide: {value}")
         instance.__dict__['email'] = value
 
@@ -14,14 +19,11 @@ class PhoneDescriptor:
         return instance.__dict__.get('phone')
 
     def __set__(self, instance, value):
-        if not re.match(r'^\+\d{10,15}$', value):
+        if not PHONE_RE.match(value):
             raise ValueError(f"Numéro de téléphone invalide: {value}")
         instance.__dict__['phone'] = value
 
 class PriorityDescriptor:
-<<<<<<< Updated upstream
-    def __init__(self, default='LOW'):
-=======
     """
     Descripteur pour la priorité d'une notification ou d'un utilisateur.
 
@@ -33,22 +35,15 @@ class PriorityDescriptor:
     """
     def __init__(self, default: str = 'faible') -> None:
         # Valeur par défaut si aucune priorité n'est définie
->>>>>>> Stashed changes
         self.default = default
         # Jeu des valeurs acceptées (sensible aux minuscules)
-        self.allowed_values = {'faible', 'moyenne', 'haute', 'urgente'}
+        self.allowed_values = PRIORITY_VALUES
 
     def __get__(self, instance, owner):
         # Retourne la valeur stockée dans le dictionnaire de l'instance ou
         # la valeur par défaut si elle n'existe pas.
         return instance.__dict__.get('priority', self.default)
 
-<<<<<<< Updated upstream
-    def __set__(self, instance, value):
-        if value not in ['LOW', 'MEDIUM', 'HIGH', 'URGENT']:
-            raise ValueError(f"Priorité invalide: {value}")
-        instance.__dict__['priority'] = value
-=======
     def __set__(self, instance, value: str) -> None:
         # Normaliser la valeur en chaîne et en minuscules
         if isinstance(value, str):
@@ -60,7 +55,6 @@ class PriorityDescriptor:
                 f"Priorité invalide: {value}. Valeurs autorisées: {', '.join(self.allowed_values)}"
             )
         instance.__dict__['priority'] = normalized
->>>>>>> Stashed changes
 
 class TimeWindowDescriptor:
     def __get__(self, instance, owner):
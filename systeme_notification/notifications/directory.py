@@ -0,0 +1,209 @@
+"""
+Annuaire des destinataires en mémoire.
+
+Les canaux d'urgence (``notifications.delivery``) ont besoin, pour chaque
+utilisateur, de quelques colonnes seulement : identifiant, priorité,
+téléphone, email personnel, fenêtre de disponibilité et ``is_active``.
+``RecipientDirectory`` les garde en mémoire sous forme de colonnes
+(``array`` pour les nombres, listes pour les chaînes), partagées par les
+threads du processus : une évacuation résout ses destinataires sans
+requête SQL ni instance de ``User``.
+
+Fraîcheur :
+
+- un numéro de version partagé (compteur du cache, ``cache.incr``) est
+  incrémenté après la validation de chaque écriture de ``User`` : un
+  processus qui lit le numéro puis recharge ne peut donc pas étiqueter des
+  lignes d'avant le commit avec le numéro d'après ;
+- le processus qui écrit applique sa ligne à l'annuaire si celui-ci était
+  exactement à la version précédente ; sinon (changement d'un autre
+  processus intercalé), il le laisse se recharger ;
+- les autres processus (workers web, Celery) voient le numéro changer à
+  leur prochaine lecture et rechargent l'annuaire en une requête
+  (``values_list``, sans instancier de modèle) ;
+- ``invalidate()`` force ce rechargement partout, après une écriture qui
+  n'envoie pas de signaux (``bulk_create``, ``update``) ;
+- une sauvegarde dont ``update_fields`` ne touche aucune colonne de
+  l'annuaire (``last_login`` à chaque connexion) est ignorée.
+"""
+
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching
+from .models import CONTACT_PLACEHOLDERS, PRIORITIES, User
+
+
+COLUMNS = ('pk', 'priority_db', 'phone_db', 'email_perso_db', 'time_window_start', 'time_window_end', 'is_active')
+
+# Champs d'adresse servis par ``addresses``
+ADDRESS_FIELDS = ('pk', 'phone_db', 'email_perso_db')
+
+VERSION_KEY = f'{caching.KEY_PREFIX}:directory:version'
+
+_PRIORITY_CODES = {priority: code for code, priority in enumerate(PRIORITIES)}
+
+
+def _address(field: str, value) -> str:
+    # Valeur par défaut du modèle : pas d'adresse
+    return '' if not value or value == CONTACT_PLACEHOLDERS[field] else value
+
+
+def _timestamp(value) -> float:
+    return value.timestamp() if value is not None else 0.0
+
+
+class RecipientDirectory:
+    """Colonnes des destinataires, indexées par identifiant (voir le module)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.version = None
+        self._clear()
+
+    def _clear(self) -> None:
+        self._ids = array('q')
+        self._priority = array('b')
+        self._phone: List[str] = []
+        self._email: List[str] = []
+        self._window_start = array('d')
+        self._window_end = array('d')
+        self._active = array('b')
+        self._index: Dict[int, int] = {}
+
+    # ---------------------------
+    # Mise à jour
+    # ---------------------------
+
+    def _append(self, row) -> None:
+        pk, priority, phone, email, start, end, active = row
+        self._index[pk] = len(self._ids)
+        self._ids.append(pk)
+        self._priority.append(_PRIORITY_CODES.get(priority, -1))
+        self._phone.append(_address('phone_db', phone))
+        self._email.append(_address('email_perso_db', email))
+        self._window_start.append(_timestamp(start))
+        self._window_end.append(_timestamp(end))
+        self._active.append(1 if active else 0)
+
+    def _set(self, row) -> None:
+        position = self._index.get(row[0])
+        if position is None:
+            self._append(row)
+            return
+        _, priority, phone, email, start, end, active = row
+        self._priority[position] = _PRIORITY_CODES.get(priority, -1)
+        self._phone[position] = _address('phone_db', phone)
+        self._email[position] = _address('email_perso_db', email)
+        self._window_start[position] = _timestamp(start)
+        self._window_end[position] = _timestamp(end)
+        self._active[position] = 1 if active else 0
+
+    def _remove(self, pk: int) -> None:
+        position = self._index.pop(pk, None)
+        if position is not None:
+            # Ligne neutralisée ; l'emplacement est récupéré au prochain rechargement
+            self._ids[position] = 0
+            self._active[position] = 0
+
+    def load(self, version: int | None = None) -> None:
+        """Recharge tout l'annuaire depuis la base (une requête, par paquets)."""
+        rows = User.objects.order_by('pk').values_list(*COLUMNS).iterator(chunk_size=10_000)
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._append(row)
+            self.version = version
+
+    def apply(self, row, version: int) -> None:
+        """
+        Applique une ligne validée (``COLUMNS``) portant le numéro ``version`` ;
+        ignorée si l'annuaire n'était pas à ``version - 1`` (il sera rechargé).
+        """
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self._set(row)
+                self.version = version
+
+    def discard(self, pk: int, version: int) -> None:
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self._remove(pk)
+                self.version = version
+
+    @staticmethod
+    def invalidate() -> int:
+        """Incrémente le numéro de version : chaque processus rechargera l'annuaire."""
+        return caching.next_sequence(VERSION_KEY)
+
+    def ensure_current(self) -> None:
+        """Recharge l'annuaire si le numéro de version a changé depuis le dernier chargement."""
+        # Numéro lu avant les lignes : un rechargement ne peut pas être plus ancien que lui
+        version = caching.sequence(VERSION_KEY)
+        if version != self.version:
+            self.load(version)
+
+    # ---------------------------
+    # Lecture
+    # ---------------------------
+
+    def __len__(self) -> int:
+        self.ensure_current()
+        return len(self._index)
+
+    def ids(self, active_only: bool = True, priorities: Iterable[str] | None = None) -> List[int]:
+        """Identifiants connus, éventuellement restreints à des priorités."""
+        self.ensure_current()
+        codes = None if priorities is None else {_PRIORITY_CODES[p] for p in priorities}
+        with self._lock:
+            return [
+                pk for pk, active, priority in zip(self._ids, self._active, self._priority)
+                if pk and (active or not active_only) and (codes is None or priority in codes)
+            ]
+
+    def available_ids(self, moment) -> List[int]:
+        """Utilisateurs actifs dont la fenêtre de disponibilité contient ``moment``."""
+        self.ensure_current()
+        stamp = moment.timestamp()
+        with self._lock:
+            return [
+                pk for pk, active, start, end in zip(self._ids, self._active, self._window_start, self._window_end)
+                if pk and active and start <= stamp <= end
+            ]
+
+    def addresses(self, field: str, ids: Iterable[int] | None = None) -> List:
+        """
+        Adresses renseignées (``field`` parmi ``ADDRESS_FIELDS``) des
+        utilisateurs ``ids``, ou de tous les utilisateurs actifs.
+        """
+        if field not in ADDRESS_FIELDS:
+            raise ValueError(f"Champ d'adresse inconnu : {field}")
+        self.ensure_current()
+        with self._lock:
+            column = {'pk': self._ids, 'phone_db': self._phone, 'email_perso_db': self._email}[field]
+            if ids is None:
+                return [value for pk, value, active in zip(self._ids, column, self._active) if pk and active and value]
+            index = self._index
+            return [column[index[pk]] for pk in ids if pk in index and column[index[pk]]]
+
+
+directory = RecipientDirectory()
+
+
+@receiver(post_save, sender=User, dispatch_uid='directory_user_saved')
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(COLUMNS):
+        return
+    row = tuple(getattr(instance, column) for column in COLUMNS)
+    transaction.on_commit(lambda: directory.apply(row, RecipientDirectory.invalidate()))
+
+
+@receiver(post_delete, sender=User, dispatch_uid='directory_user_deleted')
+def user_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: directory.discard(pk, RecipientDirectory.invalidate()))
@@ -0,0 +1,195 @@
+"""
+File de distribution des notifications selon leur priorité et la fenêtre
+horaire de leur destinataire.
+
+Deux tas binaires (``heapq``) :
+
+- la file **prête**, ordonnée par (rang de priorité, ordre d'arrivée) :
+  ``urgente`` sort toujours en premier, puis ``haute``, ``moyenne`` et
+  ``faible`` ;
+- la file **d'attente**, ordonnée par ``time_window_start`` : une
+  notification non urgente dont la fenêtre n'est pas encore ouverte y
+  patiente, puis passe dans la file prête à l'ouverture de la fenêtre.
+
+Une notification non urgente dont la fenêtre est déjà refermée
+(``time_window_end`` dépassé) au moment de sortir n'est pas distribuée :
+elle est comptée dans ``stats()['expired']``. Une notification ``urgente``
+n'est jamais retenue ni écartée. Une fenêtre plus courte que
+``MIN_WINDOW`` ne contraint rien : c'est celle d'un utilisateur qui n'en a
+jamais choisi (``User.time_window_start`` et ``time_window_end`` valent
+tous deux ``timezone.now`` à la création).
+
+Les évacuations (``DeliveryEngine``, ``run_channel``) ne passent pas par
+cette file : elles sont urgentes par nature, donc jamais retenues, et
+l'ordre de priorité n'aurait rien à trier. Les autres notifications sont
+visibles dès leur écriture (fil, API, temps réel) : aucun envoi différé ne
+les attend encore. La file est l'ordonnanceur de ce futur envoi, mesuré par
+``bench_dispatcher``. Chaque planification et
+chaque sortie coûtent O(log n) ; un chargement en masse (``schedule_many``)
+reconstruit les tas en O(n). Les éléments sont des tuples d'entiers, ce
+qui permet de garder des millions de notifications en mémoire.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from math import inf
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from django.utils import timezone
+
+from .metrics import registry as metrics
+from .models import PRIORITIES
+
+
+# Rang de chaque priorité : plus il est petit, plus la notification passe tôt
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# En deçà, la fenêtre est celle par défaut (début et fin à la création)
+MIN_WINDOW = timedelta(seconds=1)
+
+
+class PriorityDispatcher:
+    """
+    File de distribution à priorités. ``schedule`` ajoute un élément,
+    ``pop`` retire le prochain à distribuer, ``drain`` distribue tout ce
+    qui est prêt et ``stats`` rapporte profondeur et débit.
+    """
+
+    def __init__(self) -> None:
+        self._ready: list = []
+        self._waiting: list = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._depth: Counter = Counter()
+        self.dispatched: Counter = Counter()
+        self.expired: Counter = Counter()
+        self._busy_ns = 0
+
+    def __len__(self) -> int:
+        return len(self._ready) + len(self._waiting)
+
+    @staticmethod
+    def _timestamp(value: Optional[datetime], default: float = 0.0) -> float:
+        return value.timestamp() if value is not None else default
+
+    def _entry(self, item, priority: str, not_before: Optional[datetime], not_after: Optional[datetime],
+               now: float) -> Tuple[bool, tuple]:
+        rank = PRIORITY_RANK.get(priority, len(PRIORITY_RANK))
+        release_at = self._timestamp(not_before)
+        # Une notification urgente n'expire jamais, ni hors d'une vraie fenêtre
+        if rank == 0 or (not_before is not None and not_after is not None and not_after - not_before < MIN_WINDOW):
+            not_after = None
+        expires_at = self._timestamp(not_after, inf)
+        if rank == 0 or release_at <= now:
+            return True, (rank, next(self._seq), item, priority, expires_at)
+        return False, (release_at, rank, next(self._seq), item, priority, expires_at)
+
+    def schedule(self, item, priority: str, not_before: Optional[datetime] = None,
+                 now: Optional[datetime] = None, not_after: Optional[datetime] = None) -> None:
+        """Planifie ``item`` ; s'il n'est pas urgent, pas avant ``not_before`` ni après ``not_after``."""
+        ready, entry = self._entry(item, priority, not_before, not_after, self._timestamp(now or timezone.now()))
+        with self._lock:
+            heapq.heappush(self._ready if ready else self._waiting, entry)
+            self._depth[priority] += 1
+
+    def schedule_many(self, items: Iterable[Tuple], now: Optional[datetime] = None) -> int:
+        """
+        Planifie en masse des tuples ``(item, priority, not_before)`` ou
+        ``(item, priority, not_before, not_after)`` ; les tas sont
+        reconstruits une seule fois. Retourne le nombre d'éléments.
+        """
+        timestamp = self._timestamp(now or timezone.now())
+        ready, waiting, depth = [], [], Counter()
+        for item, priority, not_before, *not_after in items:
+            is_ready, entry = self._entry(item, priority, not_before, not_after[0] if not_after else None, timestamp)
+            (ready if is_ready else waiting).append(entry)
+            depth[priority] += 1
+        with self._lock:
+            self._ready.extend(ready)
+            self._waiting.extend(waiting)
+            heapq.heapify(self._ready)
+            heapq.heapify(self._waiting)
+            self._depth.update(depth)
+        return len(ready) + len(waiting)
+
+    def _release(self, now: float) -> None:
+        # Passe dans la file prête les éléments dont la fenêtre est ouverte
+        while self._waiting and self._waiting[0][0] <= now:
+            _, rank, seq, item, priority, expires_at = heapq.heappop(self._waiting)
+            heapq.heappush(self._ready, (rank, seq, item, priority, expires_at))
+
+    def pop(self, now: Optional[datetime] = None):
+        """
+        Retire et retourne ``(item, priority)`` du prochain élément prêt, ou
+        ``None`` ; les éléments dont la fenêtre est refermée sont écartés.
+        """
+        with self._lock:
+            timestamp = self._timestamp(now or timezone.now())
+            self._release(timestamp)
+            while self._ready:
+                _, _, item, priority, expires_at = heapq.heappop(self._ready)
+                self._depth[priority] -= 1
+                if expires_at >= timestamp:
+                    return item, priority
+                self.expired[priority] += 1
+            return None
+
+    def next_release(self) -> Optional[datetime]:
+        """Date d'ouverture de la prochaine fenêtre en attente, ou ``None``."""
+        with self._lock:
+            if not self._waiting:
+                return None
+            return datetime.fromtimestamp(self._waiting[0][0], tz=dt_timezone.utc)
+
+    def drain(self, handler: Callable, now: Optional[datetime] = None, limit: Optional[int] = None) -> int:
+        """
+        Passe à ``handler(item, priority)`` les éléments prêts, par ordre de
+        priorité, dans la limite de ``limit``. Retourne le nombre distribué.
+        """
+        now = now or timezone.now()
+        count = 0
+        while limit is None or count < limit:
+            start = time.perf_counter_ns()
+            entry = self.pop(now)
+            if entry is None:
+                break
+            handler(*entry)
+            elapsed = time.perf_counter_ns() - start
+            metrics.record(type(self).__name__, f'dispatch.{entry[1]}', elapsed)
+            self._busy_ns += elapsed
+            self.dispatched[entry[1]] += 1
+            count += 1
+        return count
+
+    def stats(self) -> Dict:
+        """
+        Profondeur des files (``ready``, ``waiting``, ``by_priority``), nombre
+        d'éléments distribués, écartés car hors fenêtre (``expired``) et débit
+        de distribution (éléments par seconde passée dans ``drain``).
+        """
+        with self._lock:
+            dispatched = sum(self.dispatched.values())
+            return {
+                'ready': len(self._ready),
+                'waiting': len(self._waiting),
+                'by_priority': {priority: self._depth[priority] for priority in PRIORITIES},
+                'dispatched': dispatched,
+                'expired': sum(self.expired.values()),
+                'throughput': round(dispatched / (self._busy_ns / 1e9)) if self._busy_ns else None,
+            }
+
+
+def schedule_notifications(dispatcher: PriorityDispatcher, queryset, now: Optional[datetime] = None) -> int:
+    """
+    Charge les notifications de ``queryset`` dans ``dispatcher`` (leur
+    identifiant comme élément), retenues jusqu'à ``time_window_start`` et
+    écartées après ``time_window_end``.
+    """
+    rows = queryset.order_by().values_list(
+        'pk', 'priority', 'time_window_start', 'time_window_end'
+    ).iterator(chunk_size=10_000)
+    return dispatcher.schedule_many(rows, now=now)
@@ -0,0 +1,162 @@
+"""
+Moteur de diffusion (fan-out) des notifications.
+
+Une diffusion à tout le campus ne charge plus l'ensemble des utilisateurs
+en mémoire : les identifiants sont parcourus par pages successives sur la
+clé primaire (``id > dernier_id``) et les notifications sont écrites par
+lots de taille fixe, chaque lot dans sa propre transaction. La mémoire
+utilisée reste donc bornée par la taille d'un lot, et les autres
+écritures peuvent s'intercaler entre deux lots.
+
+Chaque lot est écrit par ``Notification.objects.broadcast`` restreint à
+l'intervalle d'identifiants du lot : sur SQLite et PostgreSQL, c'est un
+unique ``INSERT ... SELECT`` exécuté dans la base. La publication temps
+réel n'a lieu qu'une fois, à la fin de la diffusion.
+
+Une diffusion ciblée passe une expression de segments (``segment``, voir
+``notifications.audience``) : les destinataires sont résolus une fois, en
+mémoire, puis écrits par lots de ``batch_size`` identifiants.
+
+La taille des lots est configurable via le réglage
+``NOTIFICATIONS_BROADCAST_BATCH_SIZE``.
+"""
+
+from typing import Iterator, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .audience import audience
+from .models import Broadcast, Notification, User
+from .realtime import publish_broadcast
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_batch_size() -> int:
+    """Retourne la taille de lot configurée pour les diffusions."""
+    return int(getattr(settings, 'NOTIFICATIONS_BROADCAST_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+
+
+class BroadcastFanOut:
+    """
+    Diffuse un message à tous les utilisateurs, lot par lot.
+
+    Usage ::
+
+        broadcast = BroadcastFanOut().start("Exercice incendie à 14h", priority='haute')
+        broadcast.pk  # identifiant à interroger pour suivre l'avancement
+
+        # Diffusion ciblée ; ``ValueError`` si l'expression est invalide
+        BroadcastFanOut(segment="active & (group:A | group:B) & priority >= haute").start("Alerte")
+    """
+
+    def __init__(self, batch_size: int | None = None, user_filter: Q | None = None, segment: str = '') -> None:
+        self.batch_size = batch_size or get_batch_size()
+        if self.batch_size < 1:
+            raise ValueError("La taille de lot doit être strictement positive")
+        if segment and user_filter is not None:
+            raise ValueError("``segment`` et ``user_filter`` sont exclusifs")
+        if len(segment) > Broadcast._meta.get_field('segment').max_length:
+            raise ValueError("Expression de segment trop longue")
+        self.user_filter = user_filter if user_filter is not None else Q()
+        self.segment = segment
+        # Destinataires résolus par l'index d'audience, ou None
+        self.user_ids = audience.ids(segment) if segment else None
+
+    def recipients(self):
+        """Queryset des destinataires, restreint par ``user_filter``."""
+        return User.objects.filter(self.user_filter)
+
+    def iter_batches(self) -> Iterator[List[int]]:
+        """
+        Itère sur les identifiants des destinataires par lots de ``batch_size``.
+
+        La pagination par clé (``id > dernier_id``) garde chaque requête
+        courte et indexée, sans curseur ouvert pendant toute la diffusion.
+        Pour une diffusion ciblée, les lots sont découpés dans les
+        identifiants déjà résolus.
+        """
+        if self.user_ids is not None:
+            for start in range(0, len(self.user_ids), self.batch_size):
+                yield self.user_ids[start:start + self.batch_size]
+            return
+        last_id = 0
+        while True:
+            ids = list(
+                self.recipients()
+                .filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def create(self, message: str, priority: str = 'moyenne') -> Broadcast:
+        """Enregistre la diffusion (en attente) sans l'exécuter ; voir ``tasks.run_broadcast``."""
+        return Broadcast.objects.create(
+            message=message,
+            priority=priority,
+            batch_size=self.batch_size,
+            segment=self.segment,
+            total_recipients=len(self.user_ids) if self.user_ids is not None else self.recipients().count(),
+        )
+
+    def start(self, message: str, priority: str = 'moyenne') -> Broadcast:
+        """Crée la diffusion puis l'exécute ; retourne l'objet ``Broadcast``."""
+        broadcast = self.create(message, priority)
+        self.run(broadcast)
+        return broadcast
+
+    def write_batch(self, broadcast: Broadcast, user_ids: List[int]) -> int:
+        """
+        Écrit les notifications d'un lot et retourne le nombre de lignes créées.
+
+        Les identifiants d'un lot sont consécutifs parmi les destinataires :
+        l'intervalle ``[premier, dernier]`` combiné à ``user_filter`` désigne
+        donc exactement le lot, sans liste ``IN`` de paramètres. Ce n'est
+        plus vrai pour une diffusion ciblée, filtrée par ``pk__in`` (au plus
+        ``batch_size`` paramètres).
+        """
+        if self.user_ids is not None:
+            batch = Q(pk__in=user_ids)
+        else:
+            batch = self.user_filter & Q(pk__gte=user_ids[0], pk__lte=user_ids[-1])
+        return Notification.objects.broadcast(
+            broadcast.message,
+            user_filter=batch,
+            priority=broadcast.priority or None,
+            batch_size=self.batch_size,
+            notify=False,
+        )
+
+    def run(self, broadcast: Broadcast) -> Broadcast:
+        """Exécute la diffusion ; chaque lot est validé dans sa propre transaction."""
+        Broadcast.objects.filter(pk=broadcast.pk).update(status=Broadcast.STATUS_RUNNING)
+        try:
+            for user_ids in self.iter_batches():
+                with transaction.atomic():
+                    written = self.write_batch(broadcast, user_ids)
+                    Broadcast.objects.filter(pk=broadcast.pk).update(sent_count=F('sent_count') + written)
+        except Exception:
+            Broadcast.objects.filter(pk=broadcast.pk).update(
+                status=Broadcast.STATUS_FAILED, finished_at=timezone.now()
+            )
+            raise
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            status=Broadcast.STATUS_DONE, finished_at=timezone.now()
+        )
+        broadcast.refresh_from_db()
+        if self.user_ids is not None:
+            recipients = self.user_ids
+        else:
+            recipients = self.recipients() if self.user_filter else None
+        transaction.on_commit(lambda: publish_broadcast(
+            broadcast.message, broadcast.priority or None, broadcast.created_at, broadcast.sent_count, recipients
+        ), robust=True)
+        return broadcast
@@ -0,0 +1,257 @@
+"""
+Import en masse des utilisateurs (rentrée universitaire).
+
+``CustomUserManager.create_user`` coûte, par ligne, une instanciation
+validée par les descripteurs, un hachage de mot de passe et un ``INSERT``.
+``import_users`` traite au contraire un fichier CSV ou JSON Lines en flux,
+par lots de ``chunk_size`` lignes :
+
+1. validation du lot avec les formats des descripteurs (``EMAIL_RE``,
+   ``PHONE_RE``, ``PRIORITY_VALUES``) précompilés, sans instancier de modèle
+   ni lever d'exception ; les lignes invalides sont écartées et rapportées ;
+2. hachage des mots de passe dans un pool de processus (le hachage est
+   volontairement coûteux en CPU), ou mot de passe inutilisable pour les
+   comptes authentifiés par SSO ;
+3. écriture par un seul ``bulk_create`` ; avec ``update``, les comptes
+   existants (même ``username``) sont mis à jour par ``ON CONFLICT``, pour
+   les seules colonnes présentes dans le fichier.
+
+Le mot de passe d'un compte existant n'est haché que s'il doit être
+écrit (``update_passwords``).
+
+Colonnes reconnues : ``username`` (obligatoire), ``email``, ``first_name``,
+``last_name``, ``email_perso``, ``phone``, ``priority``, ``password``.
+Les signaux ``post_save`` ne sont pas envoyés : les statistiques en cache
+et l'annuaire des destinataires sont invalidés une fois, à la fin.
+"""
+
+import csv
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import caching
+from .audience import AudienceIndex
+from .descriptors import EMAIL_RE, PHONE_RE, PRIORITY_VALUES
+from .directory import RecipientDirectory
+from .models import User
+
+
+FIELDS = ('username', 'email', 'first_name', 'last_name', 'email_perso', 'phone', 'priority', 'password')
+
+# Colonne du fichier → champ du modèle
+COLUMNS = {
+    'username': 'username',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email_perso': 'email_perso_db',
+    'phone': 'phone_db',
+    'priority': 'priority_db',
+}
+
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+
+# En deçà, le coût de démarrage du pool dépasse celui du hachage
+POOL_MIN_PASSWORDS = 64
+
+
+def read_rows(source, format: str | None = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    Lit ``source`` (chemin ou fichier texte) ligne à ligne et produit
+    ``(numéro de ligne, dictionnaire)``. ``format`` vaut ``csv`` ou
+    ``jsonl`` ; par défaut, il est déduit de l'extension du fichier.
+    Une ligne JSON illisible est produite sous la forme ``{'_error': ...}``.
+    """
+    if isinstance(source, (str, Path)):
+        format = format or ('jsonl' if Path(source).suffix in ('.jsonl', '.json', '.ndjson') else 'csv')
+        with open(source, encoding='utf-8', newline='') as fh:
+            yield from read_rows(fh, format)
+        return
+    if format == 'jsonl':
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = {'_error': f"JSON invalide : {exc}"}
+            yield number, row if isinstance(row, dict) else {'_error': "Objet JSON attendu"}
+    else:
+        # Ligne 1 : en-têtes
+        for number, row in enumerate(csv.DictReader(source), start=2):
+            yield number, row
+
+
+def validate_batch(rows: List[Tuple[int, Dict]], seen: set) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Valide un lot ; retourne ``(valides, rejetées)``.
+
+    Les valides sont normalisées (chaînes nettoyées, priorité en minuscules) ;
+    chaque rejet indique la ligne, le ``username`` et la liste des erreurs.
+    ``seen`` contient les ``username`` déjà rencontrés dans le fichier : un
+    doublon est rejeté.
+    """
+    valid, rejected = [], []
+    email_match, phone_match = EMAIL_RE.match, PHONE_RE.match
+    for number, raw in rows:
+        if '_error' in raw:
+            rejected.append({'line': number, 'username': None, 'errors': [raw['_error']]})
+            continue
+        row = {field: str(raw.get(field) or '').strip() for field in FIELDS}
+        row['priority'] = row['priority'].lower()
+        errors = []
+        username = row['username']
+        if not username:
+            errors.append("username manquant")
+        elif len(username) > USERNAME_MAX_LENGTH:
+            errors.append("username trop long")
+        elif username in seen:
+            errors.append("username en double dans le fichier")
+        for field, match in (('email', email_match), ('email_perso', email_match), ('phone', phone_match)):
+            if row[field] and not match(row[field]):
+                errors.append(f"{field} invalide : {row[field]}")
+        if row['priority'] and row['priority'] not in PRIORITY_VALUES:
+            errors.append(f"priority invalide : {row['priority']}")
+        if errors:
+            rejected.append({'line': number, 'username': username or None, 'errors': errors})
+            continue
+        seen.add(username)
+        valid.append(row)
+    return valid, rejected
+
+
+def _hash_password(password: str) -> str:
+    return make_password(password)
+
+
+def hash_passwords(passwords: List[str | None], executor: ProcessPoolExecutor | None = None) -> List[str]:
+    """Hache ``passwords`` (``None`` : mot de passe inutilisable), dans ``executor`` si fourni."""
+    hashed = [make_password(None) if password is None else None for password in passwords]
+    todo = [index for index, password in enumerate(passwords) if password is not None]
+    if executor is not None and len(todo) >= POOL_MIN_PASSWORDS:
+        results = executor.map(_hash_password, [passwords[index] for index in todo], chunksize=16)
+    else:
+        results = map(_hash_password, [passwords[index] for index in todo])
+    for index, value in zip(todo, results):
+        hashed[index] = value
+    return hashed
+
+
+def _build(rows: List[Dict], hashed: List[str]) -> List[User]:
+    users = []
+    for row, password in zip(rows, hashed):
+        values = {model_field: row[column] for column, model_field in COLUMNS.items() if row[column]}
+        # Les valeurs, déjà validées, vont directement dans les champs ORM :
+        # ``User.__init__`` n'exécute aucun descripteur pour ces arguments.
+        users.append(User(password=password, **values))
+    return users
+
+
+def _existing(rows: List[Dict]) -> set:
+    """``username`` du lot déjà présents en base."""
+    return set(
+        User.objects.filter(username__in=[row['username'] for row in rows]).values_list('username', flat=True)
+    )
+
+
+def _update_fields(columns: set, update_passwords: bool) -> List[str]:
+    """Champs mis à jour sur conflit : ceux des colonnes présentes dans le fichier."""
+    update_fields = [field for column, field in COLUMNS.items() if column in columns and column != 'username']
+    if update_passwords and 'password' in columns:
+        update_fields.append('password')
+    return update_fields
+
+
+def _write(users: List[User], existing: set, update_fields: List[str] | None) -> Tuple[int, int, int]:
+    """
+    Écrit un lot ; retourne ``(créés, mis à jour, ignorés)``. Les comptes
+    ``existing`` sont mis à jour sur ``update_fields``, ignorés sinon.
+    """
+    if update_fields:
+        User.objects.bulk_create(
+            users, update_conflicts=True, unique_fields=['username'], update_fields=update_fields
+        )
+        return len(users) - len(existing), len(existing), 0
+    new = [user for user in users if user.username not in existing]
+    User.objects.bulk_create(new, ignore_conflicts=True)
+    return len(new), 0, len(users) - len(new)
+
+
+def import_users(rows: Iterable[Tuple[int, Dict]], chunk_size: int = 1000, workers: int = 0,
+                 unusable_passwords: bool = False, update: bool = False,
+                 update_passwords: bool = False, dry_run: bool = False) -> Dict:
+    """
+    Importe les lignes ``rows`` (voir ``read_rows``) par lots de ``chunk_size``.
+
+    ``workers`` processus hachent les mots de passe (0 : dans le processus
+    courant) ; avec ``unusable_passwords``, aucun mot de passe n'est haché
+    (comptes SSO), de même pour une ligne sans ``password``. Sans
+    ``update``, les ``username`` existants sont ignorés ; avec, ils sont mis
+    à jour (mot de passe compris si ``update_passwords``) sur les seules
+    colonnes présentes dans le fichier (en-tête CSV, clés JSON du lot), où
+    une valeur vide rétablit la valeur par défaut du champ. Chaque lot est
+    écrit dans sa propre transaction.
+
+    Retourne ``read``, ``created``, ``updated``, ``skipped``, ``rejected``
+    (liste des lignes rejetées), ``seconds`` et ``rows_per_second``.
+    """
+    report = {'read': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'rejected': []}
+    start = time.perf_counter()
+    seen = set()
+    rows = iter(rows)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and not unusable_passwords else None
+    try:
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            report['read'] += len(batch)
+            valid, rejected = validate_batch(batch, seen)
+            report['rejected'].extend(rejected)
+            if not valid or dry_run:
+                continue
+            existing = _existing(valid)
+            # Inutile de hacher un mot de passe qui ne sera pas écrit
+            keep = set() if update and update_passwords else existing
+            passwords = [
+                None if unusable_passwords or row['username'] in keep else (row['password'] or None)
+                for row in valid
+            ]
+            users = _build(valid, hash_passwords(passwords, executor))
+            columns = {column for _, raw in batch for column in raw}
+            with transaction.atomic():
+                created, updated, skipped = _write(
+                    users, existing, _update_fields(columns, update_passwords) if update else None
+                )
+            report['created'] += created
+            report['updated'] += updated
+            report['skipped'] += skipped
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if report['created'] or report['updated']:
+        # ``bulk_create`` n'envoie pas ``post_save`` : ``total_users`` a
+        # changé, l'annuaire des destinataires et les segments doivent être rechargés
+        caching.bump('stats')
+        RecipientDirectory.invalidate()
+        AudienceIndex.invalidate()
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    report['rows_per_second'] = round(report['read'] / report['seconds']) if report['seconds'] else report['read']
+    return report
+
+
+def write_rejects(rejected: List[Dict], fh: io.TextIOBase) -> None:
+    """Écrit les lignes rejetées en CSV (``line``, ``username``, ``errors``)."""
+    writer = csv.writer(fh)
+    writer.writerow(['line', 'username', 'errors'])
+    for reject in rejected:
+        writer.writerow([reject['line'], reject['username'] or '', ' ; '.join(reject['errors'])])
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.retention import archive_notifications, get_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive dans un fichier JSON Lines compressé, puis supprime par lots, les "
+        "notifications plus anciennes que la durée de rétention."
+    )
+
+    def add_arguments(self, parser):
+        config = get_settings()
+        parser.add_argument('--days', type=int, default=config['days'], help="Durée de rétention en jours")
+        parser.add_argument('--directory', default=config['directory'], help="Répertoire des archives")
+        parser.add_argument('--chunk-size', type=int, default=config['chunk_size'], help="Lignes par lot")
+        parser.add_argument('--dry-run', action='store_true', help="Compte les lignes concernées sans rien modifier")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("--days doit être positif ou nul et --chunk-size strictement positif")
+        result = archive_notifications(
+            days=options['days'],
+            directory=options['directory'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{result['archived']} notifications antérieures au {result['cutoff']:%d/%m/%Y}")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['archived']} notifications archivées, {result['deleted']} supprimées par lots"
+        ))
+        for name in result['dropped']:
+            self.stdout.write(f"  partition supprimée : {name}")
+        if result['path']:
+            self.stdout.write(f"  archive : {result['path']}")
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notifications.models import NotificationRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les agrégats horaires et journaliers (NotificationRollup) depuis "
+        "l'historique des notifications, par périodes successives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Date de début (AAAA-MM-JJ), tout l'historique par défaut")
+        parser.add_argument('--until', help="Date de fin (AAAA-MM-JJ), exclue")
+        parser.add_argument('--chunk-days', type=int, default=7, help="Nombre de jours traités par transaction")
+
+    def parse_date(self, value):
+        if value is None:
+            return None
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError(f"Date invalide : {value} (format AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days doit être positif")
+
+        def progress(start, stop, rows):
+            self.stdout.write(f"{start:%Y-%m-%d} → {stop:%Y-%m-%d} : {rows} agrégats")
+
+        written = NotificationRollup.rebuild(
+            start=self.parse_date(options['since']),
+            end=self.parse_date(options['until']),
+            chunk_days=options['chunk_days'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"{written} agrégats écrits"))
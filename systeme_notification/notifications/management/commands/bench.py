@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.benchmarks.suite import compare, run_suite, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les chemins critiques (diffusion, tableaux de bord, statistiques, API, "
+        "évacuation) : percentiles de latence, requêtes SQL et pic mémoire. À lancer "
+        "sur une base dédiée : --seed y insère des données."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help="Insère les données de test avant la mesure")
+        parser.add_argument('--users', type=int, default=5_000, help="Nombre d'utilisateurs à créer")
+        parser.add_argument('--notifications', type=int, default=500_000, help="Nombre de notifications à créer")
+        parser.add_argument('--repeat', type=int, default=20, help="Nombre d'exécutions par scénario")
+        parser.add_argument('--only', nargs='+', help="Scénarios à mesurer")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+        parser.add_argument('--baseline', help="Résultats JSON d'une mesure de référence")
+        parser.add_argument(
+            '--max-slowdown', type=float, default=1.2,
+            help="Facteur de ralentissement (latence médiane) au-delà duquel la mesure échoue",
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Création de {options['users']} utilisateurs et {options['notifications']} notifications…")
+            seed(options['users'], options['notifications'])
+        try:
+            results = run_suite(repeat=options['repeat'], only=options['only'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f"  p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['queries']} requêtes, pic {result['peak_kib']} Kio"
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2, ensure_ascii=False)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as fh:
+                baseline = json.load(fh)
+            regressions = compare(results, baseline, options['max_slowdown'])
+            if regressions:
+                raise CommandError("Ralentissements :\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"Aucun ralentissement au-delà de ×{options['max_slowdown']}"))
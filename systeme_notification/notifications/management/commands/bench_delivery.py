@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from notifications.benchmarks.delivery import compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit du moteur de diffusion (SMS et Push) sur les passerelles "
+        "factices : envoi unitaire séquentiel contre envoi par lots en parallèle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=2000, help="Nombre de destinataires par canal")
+        parser.add_argument('--workers', type=int, default=4, help="Nombre de threads d'envoi")
+        parser.add_argument('--latency', type=float, default=0.005, help="Temps de réponse simulé par appel (s)")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+
+    def handle(self, *args, **options):
+        results = compare(options['recipients'], workers=options['workers'], latency=options['latency'])
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  {result['batches']} appels en {result['seconds']} s")
+            self.stdout.write(f"  {result['sends_per_second']} envois/s")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2, ensure_ascii=False)
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from notifications.benchmarks.dispatcher import measure
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit de la file de distribution à priorités sur un arriéré "
+        "synthétique : chargement en masse, planification unitaire et distribution."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1_000_000, help="Taille de l'arriéré")
+        parser.add_argument('--hours', type=int, default=8, help="Étalement des fenêtres horaires")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+
+    def handle(self, *args, **options):
+        result = measure(options['items'], hours=options['hours'])
+        self.stdout.write(f"Arriéré : {result['items']} ({result['ready']} prêtes, {result['waiting']} en attente)")
+        self.stdout.write(f"  chargement en masse : {result['bulk_load_per_second']} éléments/s")
+        self.stdout.write(f"  planification unitaire : {result['schedule_per_second']} éléments/s")
+        self.stdout.write(f"  distribution : {result['dispatch_per_second']} éléments/s")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(result, fh, indent=2, ensure_ascii=False)
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.benchmarks.indexes import compare
+from notifications.benchmarks.seed import seed_notifications, seed_users
+from notifications.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare les plans et latences des requêtes fréquentes sur Notification "
+        "avec et sans index. À lancer sur une base dédiée : --seed y insère des "
+        "millions de lignes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help="Insère les données de test avant la mesure")
+        parser.add_argument('--users', type=int, default=10_000, help="Nombre d'utilisateurs à créer")
+        parser.add_argument('--notifications', type=int, default=2_000_000, help="Nombre de notifications à créer")
+        parser.add_argument('--repeat', type=int, default=5, help="Nombre d'exécutions par requête")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Création de {options['users']} utilisateurs…")
+            user_ids = seed_users(options['users'])
+            self.stdout.write(f"Création de {options['notifications']} notifications…")
+            seed_notifications(options['notifications'], user_ids)
+
+        user_id = User.objects.order_by('pk').values_list('pk', flat=True).first()
+        if user_id is None:
+            raise CommandError("Base vide : relancez avec --seed")
+
+        results = compare(user_id, repeat=options['repeat'])
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  sans index : {result['before_ms']} ms")
+            self.stdout.write(f"  avec index : {result['after_ms']} ms")
+            self.stdout.write(f"  plan avec index : {result['plan_after']}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2, ensure_ascii=False)
@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from notifications.benchmarks.serialization import compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit de sérialisation de la liste des notifications : "
+        "ModelSerializer contre chemin rapide (values_list), en JSON, orjson et MessagePack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Nombre de notifications sérialisées")
+        parser.add_argument('--repeat', type=int, default=3, help="Nombre d'exécutions (meilleur temps retenu)")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+
+    def handle(self, *args, **options):
+        results = compare(options['rows'], repeat=options['repeat'])
+        reference = results['model_serializer+json']['rows_per_second']
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            speedup = f" (×{result['rows_per_second'] / reference:.1f})" if reference and result['rows_per_second'] else ''
+            self.stdout.write(f"  {result['rows_per_second']} lignes/s{speedup}, {result['bytes']} octets")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2, ensure_ascii=False)
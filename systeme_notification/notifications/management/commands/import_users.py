@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.importing import import_users, read_rows, write_rejects
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des utilisateurs depuis un fichier CSV ou JSON Lines, par lots "
+        "(validation groupée, hachage parallèle, bulk_create)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer (.csv ou .jsonl)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Format du fichier (déduit de l'extension)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Lignes par lot")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Processus de hachage des mots de passe (0 : dans le processus courant)",
+        )
+        parser.add_argument('--sso', action='store_true', help="Mots de passe inutilisables (authentification SSO)")
+        parser.add_argument('--update', action='store_true', help="Met à jour les utilisateurs existants (même username)")
+        parser.add_argument('--update-passwords', action='store_true', help="Avec --update, remplace aussi les mots de passe")
+        parser.add_argument('--dry-run', action='store_true', help="Valide le fichier sans rien écrire")
+        parser.add_argument('--rejects', help="Fichier CSV où écrire les lignes rejetées")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size doit être strictement positif")
+        try:
+            report = import_users(
+                read_rows(options['path'], options['format']),
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+                unusable_passwords=options['sso'],
+                update=options['update'],
+                update_passwords=options['update_passwords'],
+                dry_run=options['dry_run'],
+            )
+        except FileNotFoundError:
+            raise CommandError(f"Fichier introuvable : {options['path']}")
+
+        rejected = report['rejected']
+        self.stdout.write(
+            f"{report['read']} lignes lues en {report['seconds']} s ({report['rows_per_second']} lignes/s) : "
+            f"{report['created']} créés, {report['updated']} mis à jour, {report['skipped']} ignorés, "
+            f"{len(rejected)} rejetés."
+        )
+        if options['rejects'] and rejected:
+            with open(options['rejects'], 'w', encoding='utf-8', newline='') as fh:
+                write_rejects(rejected, fh)
+            self.stdout.write(f"Lignes rejetées écrites dans {options['rejects']}")
+        else:
+            for reject in rejected[:20]:
+                self.stdout.write(self.style.WARNING(
+                    f"  ligne {reject['line']} ({reject['username'] or '?'}) : {' ; '.join(reject['errors'])}"
+                ))
+            if len(rejected) > 20:
+                self.stdout.write(self.style.WARNING(f"  … et {len(rejected) - 20} autres (voir --rejects)"))
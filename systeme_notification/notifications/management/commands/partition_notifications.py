@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from notifications.retention import ensure_partitions, is_partitioned, partition_table
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL : partitionne la table des notifications par mois sur created_at "
+        "(--convert, à lancer en maintenance) et crée les partitions des mois à venir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help="Convertit la table existante (copie des lignes)")
+        parser.add_argument('--months-ahead', type=int, help="Nombre de mois futurs à préparer")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Le partitionnement natif n'est disponible que sous PostgreSQL")
+        if options['convert']:
+            partition_table(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS("Table des notifications partitionnée par mois"))
+        elif not is_partitioned():
+            raise CommandError("La table n'est pas partitionnée : relancez avec --convert")
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"  partition : {name}")
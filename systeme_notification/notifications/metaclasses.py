@@ -80,11 +80,35 @@ class NotificationMeta(ABCMeta):
         NotificationRegistry.register(name, new_class)
         return new_class
 
+class ChannelRegistry:
+    """
+    Registre des canaux de diffusion créés via ``ChannelMeta``, indexés par
+    ``channel_name`` (voir ``notifications.delivery``).
+    """
+    _registry: Dict[str, Type] = {}
+
+    @classmethod
+    def register(cls, name: str, klass: Type) -> None:
+        cls._registry[name] = klass
+
+    @classmethod
+    def get(cls, name: str) -> Type | None:
+        return cls._registry.get(name)
+
+    @classmethod
+    def names(cls) -> list[str]:
+        return list(cls._registry)
+
+
 class ChannelMeta(type):
-    # Création automatique de canaux (SMS, Push, Email)
+    # Création automatique de canaux (SMS, Push, Email), enregistrés dans
+    # ``ChannelRegistry`` sauf s'ils se déclarent ``abstract``
     def __new__(cls, name, bases, attrs):
         attrs['channel_name'] = name.lower()
-        return super().__new__(cls, name, bases, attrs)
+        new_class = super().__new__(cls, name, bases, attrs)
+        if not attrs.get('abstract', False):
+            ChannelRegistry.register(attrs['channel_name'], new_class)
+        return new_class
 
 class TemplateMeta(type):
     # Génération automatique de templates
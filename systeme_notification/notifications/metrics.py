@@ -0,0 +1,168 @@
+"""
+Instrumentation à faible coût des urgences et de leurs canaux.
+
+Chaque appel instrumenté (décorateur ``message``, ``AddPerformanceTracking``)
+est compté et sa durée, mesurée avec ``time.perf_counter_ns``, rangée dans
+un histogramme par couple (classe, méthode).
+
+Le chemin critique ne prend aucun verrou : chaque thread écrit dans son
+propre tampon, qu'il reverse dans l'agrégat global au plus une fois par
+``flush_interval`` secondes. Une lecture (``snapshot``) additionne l'agrégat
+et les tampons encore non reversés, sans les modifier. Le tampon d'un thread
+terminé (pools de ``DeliveryEngine``) est reversé puis oublié au prochain
+enregistrement de thread ou à la prochaine lecture : leur nombre reste borné
+par celui des threads vivants.
+
+Les mesures sont disponibles via ``registry.snapshot()`` et, au format
+texte Prometheus, via la vue ``/metrics/``.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+
+# Bornes supérieures des compartiments de l'histogramme, en secondes
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_BUCKET_BOUNDS_NS = tuple(int(bound * 1e9) for bound in BUCKETS)
+
+Key = Tuple[str, str]
+
+
+def _new_series() -> List:
+    # [appels, erreurs, somme des durées (ns), compteurs par compartiment (+Inf inclus)]
+    return [0, 0, 0, [0] * (len(BUCKETS) + 1)]
+
+
+def _merge_into(target: Dict[Key, List], source: Dict[Key, List]) -> None:
+    for key, (calls, errors, total_ns, buckets) in source.items():
+        series = target.setdefault(key, _new_series())
+        series[0] += calls
+        series[1] += errors
+        series[2] += total_ns
+        series[3] = [a + b for a, b in zip(series[3], buckets)]
+
+
+class MetricsRegistry:
+    """Compteurs et histogrammes de latence par (classe, méthode)."""
+
+    def __init__(self, flush_interval: float = 1.0) -> None:
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals: Dict[Key, List] = {}
+        self._buffers: Dict[threading.Thread, Dict[Key, List]] = {}
+
+    def _buffer(self) -> Dict[Key, List]:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = {}
+            self._local.last_flush = time.perf_counter_ns()
+            with self._lock:
+                self._reap()
+                self._buffers[threading.current_thread()] = buffer
+        return buffer
+
+    def _reap(self) -> None:
+        # Sous verrou : un thread terminé n'écrit plus dans son tampon
+        for thread in [thread for thread in self._buffers if not thread.is_alive()]:
+            _merge_into(self._totals, self._buffers.pop(thread))
+
+    def record(self, cls_name: str, method: str, duration_ns: int, error: bool = False) -> None:
+        """Enregistre un appel de ``cls_name.method`` ayant duré ``duration_ns``."""
+        buffer = self._buffer()
+        series = buffer.get((cls_name, method))
+        if series is None:
+            series = buffer[(cls_name, method)] = _new_series()
+        series[0] += 1
+        if error:
+            series[1] += 1
+        series[2] += duration_ns
+        series[3][bisect_left(_BUCKET_BOUNDS_NS, duration_ns)] += 1
+        now = time.perf_counter_ns()
+        if now - self._local.last_flush >= self.flush_interval_ns:
+            self._local.last_flush = now
+            self.flush()
+
+    def flush(self) -> None:
+        """Reverse le tampon du thread courant dans l'agrégat global."""
+        buffer = self._buffer()
+        if not buffer:
+            return
+        with self._lock:
+            # Le tampon est remplacé sous verrou : ``snapshot`` ne le compte
+            # jamais deux fois.
+            _merge_into(self._totals, buffer)
+            self._local.buffer = self._buffers[threading.current_thread()] = {}
+
+    def snapshot(self) -> Dict[Key, Dict]:
+        """
+        Retourne les mesures courantes : ``calls``, ``errors``, ``sum_seconds``
+        et ``buckets`` (compteurs cumulés, alignés sur ``BUCKETS`` puis +Inf).
+        """
+        merged: Dict[Key, List] = {}
+        with self._lock:
+            self._reap()
+            _merge_into(merged, self._totals)
+            for buffer in self._buffers.values():
+                _merge_into(merged, dict(buffer))
+        result = {}
+        for key, (calls, errors, total_ns, buckets) in merged.items():
+            cumulative, running = [], 0
+            for count in buckets:
+                running += count
+                cumulative.append(running)
+            result[key] = {
+                'calls': calls,
+                'errors': errors,
+                'sum_seconds': total_ns / 1e9,
+                'buckets': cumulative,
+            }
+        return result
+
+    def reset(self) -> None:
+        """Remet toutes les mesures à zéro (tests, redémarrage de collecte)."""
+        with self._lock:
+            self._totals.clear()
+            for buffer in self._buffers.values():
+                buffer.clear()
+
+
+def _labels(cls_name: str, method: str, **extra) -> str:
+    labels = {'class': cls_name, 'method': method, **extra}
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_prometheus(snapshot: Dict[Key, Dict]) -> str:
+    """Sérialise ``snapshot`` au format texte d'exposition Prometheus."""
+    lines = [
+        "# HELP notifications_method_calls_total Nombre d'appels par classe et méthode.",
+        '# TYPE notifications_method_calls_total counter',
+    ]
+    for (cls_name, method), series in sorted(snapshot.items()):
+        lines.append(f'notifications_method_calls_total{{{_labels(cls_name, method)}}} {series["calls"]}')
+    lines += [
+        "# HELP notifications_method_errors_total Nombre d'appels terminés par une exception.",
+        '# TYPE notifications_method_errors_total counter',
+    ]
+    for (cls_name, method), series in sorted(snapshot.items()):
+        lines.append(f'notifications_method_errors_total{{{_labels(cls_name, method)}}} {series["errors"]}')
+    lines += [
+        '# HELP notifications_method_duration_seconds Durée des appels par classe et méthode.',
+        '# TYPE notifications_method_duration_seconds histogram',
+    ]
+    for (cls_name, method), series in sorted(snapshot.items()):
+        for bound, count in zip(BUCKETS + ('+Inf',), series['buckets']):
+            lines.append(
+                f'notifications_method_duration_seconds_bucket{{{_labels(cls_name, method, le=bound)}}} {count}'
+            )
+        lines.append(
+            f'notifications_method_duration_seconds_sum{{{_labels(cls_name, method)}}} {series["sum_seconds"]:.9f}'
+        )
+        lines.append(f'notifications_method_duration_seconds_count{{{_labels(cls_name, method)}}} {series["calls"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Registre partagé par tout le processus
+registry = MetricsRegistry()
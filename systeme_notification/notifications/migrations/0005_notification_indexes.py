@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+# Index BRIN : quelques pages seulement pour une table où ``created_at``
+# croît avec l'ordre d'insertion. Réservé à PostgreSQL.
+BRIN_INDEX = 'notif_created_brin'
+
+
+def create_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {BRIN_INDEX} ON notifications_notification USING brin (created_at)'
+    )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {BRIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_broadcast'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', '-created_at'], name='notif_dest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notif_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['priority', 'created_at'], name='notif_prio_created_idx'),
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
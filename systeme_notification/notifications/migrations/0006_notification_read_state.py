@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+PRIORITIES = ('urgente', 'haute', 'moyenne', 'faible')
+
+
+def build_counters(apps, schema_editor):
+    # Les notifications existantes sont toutes considérées comme non lues
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+    rows = (
+        Notification.objects.filter(destinataire__isnull=False)
+        .order_by()
+        .values('destinataire')
+        .annotate(
+            total=Count('id'),
+            **{level: Count('id', filter=Q(priority=level)) for level in PRIORITIES},
+        )
+    )
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=row.pop('destinataire'), unread=row['total'], **row) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('urgente', models.PositiveIntegerField(default=0)),
+                ('haute', models.PositiveIntegerField(default=0)),
+                ('moyenne', models.PositiveIntegerField(default=0)),
+                ('faible', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:04
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    # Même calcul que ``NotificationRollup.rebuild``, en une seule passe ;
+    # sur un gros historique, préférer ``manage.py backfill_rollups``.
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationRollup = apps.get_model('notifications', 'NotificationRollup')
+    hours = (
+        Notification.objects.annotate(bucket_start=TruncHour('created_at'))
+        .order_by()
+        .values('bucket_start', 'priority')
+        .annotate(count=Count('id'))
+    )
+    rollups, days = [], Counter()
+    for row in hours.iterator():
+        rollups.append(NotificationRollup(granularity='hour', **row))
+        day = timezone.localtime(row['bucket_start']).replace(hour=0, minute=0, second=0, microsecond=0)
+        days[(day, row['priority'])] += row['count']
+    rollups += [
+        NotificationRollup(granularity='day', bucket_start=day, priority=priority, count=count)
+        for (day, priority), count in days.items()
+    ]
+    NotificationRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_evacuation_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('granularity', models.CharField(choices=[('hour', 'Heure'), ('day', 'Jour')], max_length=4)),
+                ('priority', models.CharField(max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'priority'), name='unique_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
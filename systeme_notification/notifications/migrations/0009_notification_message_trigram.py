@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+# Index trigramme (GIN) sur ``UPPER(message)`` : c'est l'expression que
+# Django compare pour ``icontains`` (recherche de l'administration), qui
+# n'est alors plus un parcours complet de la table. Réservé à PostgreSQL ;
+# sous SQLite, la recherche reste un ``LIKE``.
+TRIGRAM_INDEX = 'notif_message_trgm'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON notifications_notification '
+        f'USING gin (UPPER(message) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_notification_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
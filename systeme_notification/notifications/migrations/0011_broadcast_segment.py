@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0010_notification_message_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='segment',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
@@ -1,7 +1,22 @@
-from django.db import models
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import TruncHour
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group, Permission
 from django.utils import timezone
 from .descriptors import EmailDescriptor, PhoneDescriptor, PriorityDescriptor, TimeWindowDescriptor
+from .signals import notifications_broadcast, notifications_read
+
+
+# Niveaux de priorité connus, du plus au moins urgent
+PRIORITIES = ('urgente', 'haute', 'moyenne', 'faible')
+
+# Coordonnées par défaut d'un utilisateur qui n'en a pas renseigné : ce ne
+# sont pas des adresses, les canaux d'envoi les ignorent
+CONTACT_PLACEHOLDERS = {'phone_db': '+0000000000', 'email_perso_db': 'perso@domaine.com'}
 
 
 # Custom User Manager
@@ -42,8 +57,8 @@ class User(AbstractUser):
     """
 
     # Champs ORM pour stockage réel
-    phone_db = models.CharField(max_length=20, default='+0000000000', blank=True)
-    email_perso_db = models.EmailField(default='perso@domaine.com', blank=True)
+    phone_db = models.CharField(max_length=20, default=CONTACT_PLACEHOLDERS['phone_db'], blank=True)
+    email_perso_db = models.EmailField(default=CONTACT_PLACEHOLDERS['email_perso_db'], blank=True)
     bio = models.TextField(blank=True, null=True)
     time_window_start = models.DateTimeField(default=timezone.now)
     time_window_end = models.DateTimeField(default=timezone.now)
@@ -120,17 +135,130 @@ class User(AbstractUser):
         verbose_name_plural = "Utilisateurs"
 
 
+# Manager des notifications
+class NotificationManager(models.Manager):
+
+    # Moteurs capables d'exécuter ``INSERT ... SELECT`` directement
+    INSERT_SELECT_VENDORS = {'sqlite', 'postgresql'}
+
+    def broadcast(self, message, user_filter=None, priority=None, batch_size=None, notify=True):
+        """
+        Crée une notification pour chaque utilisateur correspondant à ``user_filter``.
+
+        Sur SQLite et PostgreSQL, une seule requête ``INSERT ... SELECT``
+        est exécutée dans la base : aucune instance Python n'est créée.
+        Comme ``Notification.save``, la priorité et la fenêtre temporelle
+        sont recopiées depuis l'utilisateur, sauf si ``priority`` est
+        fourni explicitement. Sur les autres moteurs, on retombe sur des
+        ``bulk_create`` par lots de ``batch_size``.
+
+        Les compteurs ``NotificationCounter`` des destinataires et les
+        agrégats ``NotificationRollup`` sont mis à jour dans la même
+        transaction, par quelques ``UPDATE`` ensemblistes,
+        puis le signal ``notifications_broadcast`` est envoyé (voir
+        ``notifications.signals``) ; ``notify=False`` y désactive la
+        publication temps réel.
+
+        Retourne le nombre de notifications créées.
+        """
+        users = User.objects.using(self.db).all()
+        if user_filter is not None:
+            users = users.filter(user_filter)
+        created_at = timezone.now()
+        with transaction.atomic(using=self.db):
+            if connections[self.db].vendor in self.INSERT_SELECT_VENDORS:
+                created = self._broadcast_insert_select(users, message, priority, created_at)
+            else:
+                created = self._broadcast_bulk_create(users, message, priority, created_at, batch_size)
+            if created:
+                NotificationCounter.record_broadcast(users, priority, batch_size=batch_size)
+                NotificationRollup.record_broadcast(users, created_at, priority, count=created)
+                notifications_broadcast.send(
+                    sender=self.model, users=users, user_filter=user_filter, message=message,
+                    priority=priority, created_at=created_at, count=created, notify=notify,
+                )
+        return created
+
+    def mark_read(self, user, ids=None):
+        """
+        Marque comme lues les notifications non lues de ``user`` (toutes, ou
+        seulement celles de ``ids``) et met à jour son compteur dans la même
+        transaction. Retourne le nombre de notifications marquées.
+        """
+        unread = self.filter(destinataire=user, read_at__isnull=True)
+        if ids is not None:
+            unread = unread.filter(pk__in=ids)
+        with transaction.atomic(using=self.db):
+            marked = unread.update(read_at=timezone.now())
+            if marked:
+                NotificationCounter.objects.using(self.db).filter(user=user).update(unread=F('unread') - marked)
+                notifications_read.send(sender=self.model, user_id=getattr(user, 'pk', user), count=marked)
+        return marked
+
+    def _broadcast_insert_select(self, users, message, priority, created_at):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        notif_meta, user_meta = self.model._meta, User._meta
+
+        def column(meta, name):
+            return qn(meta.get_field(name).column)
+
+        sql = (
+            f"INSERT INTO {qn(notif_meta.db_table)} "
+            f"({column(notif_meta, 'message')}, {column(notif_meta, 'destinataire')}, "
+            f"{column(notif_meta, 'priority')}, {column(notif_meta, 'time_window_start')}, "
+            f"{column(notif_meta, 'time_window_end')}, {column(notif_meta, 'created_at')}) "
+            f"SELECT %s, u.{column(user_meta, 'id')}, COALESCE(%s, u.{column(user_meta, 'priority_db')}), "
+            f"u.{column(user_meta, 'time_window_start')}, u.{column(user_meta, 'time_window_end')}, %s "
+            f"FROM {qn(user_meta.db_table)} u"
+        )
+        params = [message, priority, connection.ops.adapt_datetimefield_value(created_at)]
+        if users.query.has_filters():
+            subquery, subparams = users.values('pk').query.sql_with_params()
+            sql += f" WHERE u.{column(user_meta, 'id')} IN ({subquery})"
+            params.extend(subparams)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def _broadcast_bulk_create(self, users, message, priority, created_at, batch_size):
+        if batch_size is None:
+            from .fanout import get_batch_size
+            batch_size = get_batch_size()
+        rows = users.values_list('pk', 'priority_db', 'time_window_start', 'time_window_end')
+        created, batch = 0, []
+        for user_id, user_priority, window_start, window_end in rows.iterator(chunk_size=batch_size):
+            batch.append(self.model(
+                message=message,
+                destinataire_id=user_id,
+                priority=priority or user_priority,
+                time_window_start=window_start,
+                time_window_end=window_end,
+                created_at=created_at,
+            ))
+            if len(batch) >= batch_size:
+                created += len(self.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(self.bulk_create(batch))
+        return created
+
+
 # Modèle Notification
 class Notification(models.Model):
     message = models.TextField()
     destinataire = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
     # Champs hérités automatiquement depuis l’utilisateur
-    priority = models.CharField(max_length=10, default='LOW')
+    priority = models.CharField(max_length=10, default='faible')
     time_window_start = models.DateTimeField(null=True, blank=True)
     time_window_end = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Date de lecture par le destinataire (``None`` tant que non lue)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    objects = NotificationManager()
 
     def save(self, *args, **kwargs):
         if self.destinataire:
@@ -138,7 +266,363 @@ class Notification(models.Model):
             self.priority = getattr(self.destinataire, 'priority', 'LOW')
             self.time_window_start = self.destinataire.time_window_start
             self.time_window_end = self.destinataire.time_window_end
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            # Une nouvelle notification incrémente le compteur du destinataire
+            # et les agrégats de sa tranche horaire
+            if adding:
+                NotificationRollup.record(self.created_at, self.priority)
+                if self.destinataire_id:
+                    NotificationCounter.record(self.destinataire_id, self.priority, unread=self.read_at is None)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            if self.destinataire_id:
+                NotificationCounter.record(
+                    self.destinataire_id, self.priority, unread=self.read_at is None, delta=-1
+                )
+            if self.created_at:
+                NotificationRollup.record(self.created_at, self.priority, delta=-1)
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"Notification to {self.destinataire} [{self.priority}] : {self.message[:30]}"
+
+    class Meta:
+        # Index des requêtes fréquentes : fil d'un utilisateur (le plus récent
+        # d'abord), fenêtres temporelles des tableaux de bord et répartition
+        # par priorité. Sur PostgreSQL, la migration 0005 ajoute en plus un
+        # index BRIN sur ``created_at``.
+        indexes = [
+            models.Index(fields=['destinataire', '-created_at'], name='notif_dest_created_idx'),
+            models.Index(fields=['created_at'], name='notif_created_idx'),
+            models.Index(fields=['priority', 'created_at'], name='notif_prio_created_idx'),
+        ]
+
+
+# Diffusion d'un message à tous les utilisateurs
+class Broadcast(models.Model):
+    """
+    Trace d'une diffusion (fan-out) d'un message à l'ensemble des utilisateurs.
+
+    Les notifications sont écrites par lots de taille fixe ; ``sent_count``
+    est incrémenté à la fin de chaque lot, ce qui permet à l'administrateur
+    de suivre l'avancement pendant que la diffusion est en cours.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminée'),
+        (STATUS_FAILED, 'Échouée'),
+    ]
+
+    message = models.TextField()
+    priority = models.CharField(max_length=10, default='moyenne')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    batch_size = models.PositiveIntegerField(default=1000)
+    total_recipients = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    # Expression d'audience d'une diffusion ciblée (vide : tout le campus)
+    segment = models.CharField(max_length=500, blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        """Pourcentage de destinataires déjà traités (0 à 100)."""
+        if not self.total_recipients:
+            return 100 if self.status == self.STATUS_DONE else 0
+        return min(100, round(100 * self.sent_count / self.total_recipients))
+
+    def __str__(self):
+        return f"Broadcast #{self.pk} [{self.status}] {self.sent_count}/{self.total_recipients}"
+
+
+# Compteurs dénormalisés par utilisateur
+class NotificationCounter(models.Model):
+    """
+    Compteurs de notifications d'un utilisateur : total, non lues et par priorité.
+
+    Ces compteurs sont maintenus dans la même transaction que les
+    insertions (``Notification.save``, ``Notification.objects.broadcast``)
+    et que les marquages comme lu (``Notification.objects.mark_read``), si
+    bien que le tableau de bord les lit en une seule requête sur clé
+    primaire, sans parcourir la table des notifications.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    total = models.PositiveIntegerField(default=0)
+    unread = models.PositiveIntegerField(default=0)
+    urgente = models.PositiveIntegerField(default=0)
+    haute = models.PositiveIntegerField(default=0)
+    moyenne = models.PositiveIntegerField(default=0)
+    faible = models.PositiveIntegerField(default=0)
+
+    # Compteurs créés par ``bulk_create`` lors d'une diffusion
+    BATCH_SIZE = 1000
+
+    @classmethod
+    def for_user(cls, user):
+        """Retourne le compteur de ``user`` (à zéro, non enregistré, s'il n'existe pas)."""
+        return cls.objects.filter(user=user).first() or cls(user=user)
+
+    @classmethod
+    def record(cls, user_id, priority, unread=True, delta=1):
+        """Ajoute ``delta`` notification(s) de priorité ``priority`` au compteur de ``user_id``."""
+        changes = {'total': F('total') + delta}
+        if unread:
+            changes['unread'] = F('unread') + delta
+        if priority in PRIORITIES:
+            changes[priority] = F(priority) + delta
+        if not cls.objects.filter(user_id=user_id).update(**changes):
+            # Première notification : la ligne est créée (sans risque en cas
+            # de création concurrente) puis incrémentée.
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+    @classmethod
+    def record_broadcast(cls, users, priority=None, batch_size=None):
+        """
+        Incrémente d'une notification le compteur de chaque utilisateur de ``users``.
+
+        Les compteurs manquants sont créés par lots de ``batch_size``
+        (``BATCH_SIZE`` par défaut), paginés sur la clé primaire : une
+        diffusion à tout le campus ne charge pas tous les identifiants.
+        Sans ``priority``, chaque utilisateur reçoit sa propre priorité
+        (``priority_db``) : un ``UPDATE`` par niveau de priorité.
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        missing = users.filter(notification_counter__isnull=True).order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        while True:
+            ids = list(missing.filter(pk__gt=last_id)[:batch_size])
+            if not ids:
+                break
+            cls.objects.bulk_create([cls(user_id=pk) for pk in ids], ignore_conflicts=True)
+            last_id = ids[-1]
+        targets = cls.objects.filter(user__in=users.values('pk'))
+        changes = {'total': F('total') + 1, 'unread': F('unread') + 1}
+        if priority:
+            if priority in PRIORITIES:
+                changes[priority] = F(priority) + 1
+            targets.update(**changes)
+            return
+        targets.update(**changes)
+        for level in PRIORITIES:
+            cls.objects.filter(user__in=users.filter(priority_db=level).values('pk')).update(
+                **{level: F(level) + 1}
+            )
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recalcule les compteurs depuis la table des notifications (tous, ou ceux de ``user_ids``)."""
+        notifications = Notification.objects.filter(destinataire__isnull=False)
+        counters = cls.objects.all()
+        if user_ids is not None:
+            notifications = notifications.filter(destinataire_id__in=user_ids)
+            counters = counters.filter(user_id__in=user_ids)
+        rows = (
+            notifications.order_by()
+            .values('destinataire')
+            .annotate(
+                total=Count('id'),
+                unread=Count('id', filter=Q(read_at__isnull=True)),
+                **{level: Count('id', filter=Q(priority=level)) for level in PRIORITIES},
+            )
+        )
+        with transaction.atomic():
+            counters.delete()
+            cls.objects.bulk_create(
+                [cls(user_id=row.pop('destinataire'), **row) for row in rows],
+                batch_size=1000,
+            )
+
+    def __str__(self):
+        return f"Compteur de {self.user_id} : {self.unread}/{self.total} non lues"
+
+
+# Agrégats horaires et journaliers des notifications
+class NotificationRollup(models.Model):
+    """
+    Nombre de notifications créées par tranche (heure ou jour) et par priorité.
+
+    Les tranches sont maintenues dans la même transaction que les
+    insertions (``Notification.save``, ``Notification.objects.broadcast``) ;
+    ``rebuild`` (commande ``backfill_rollups``) les recalcule depuis
+    l'historique, par périodes successives. Les statistiques des tableaux
+    de bord (``notifications.stats``) lisent ces quelques lignes au lieu de
+    parcourir la table des notifications.
+
+    Les tranches sont découpées dans le fuseau courant (``TIME_ZONE``) : un
+    changement de fuseau impose un ``rebuild``.
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [(HOUR, 'Heure'), (DAY, 'Jour')]
+
+    bucket_start = models.DateTimeField()
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    priority = models.CharField(max_length=10)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'priority'], name='unique_rollup_bucket'
+            ),
+        ]
+
+    @classmethod
+    def bucket(cls, moment, granularity):
+        """Début de la tranche ``granularity`` contenant ``moment``."""
+        local = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+        if granularity == cls.DAY:
+            local = local.replace(hour=0)
+        return local
+
+    @classmethod
+    def record(cls, created_at, priority, delta=1):
+        """Ajoute ``delta`` notification(s) de priorité ``priority`` aux tranches de ``created_at``."""
+        for granularity, _ in cls.GRANULARITY_CHOICES:
+            buckets = cls.objects.filter(
+                granularity=granularity, bucket_start=cls.bucket(created_at, granularity), priority=priority
+            )
+            if delta < 0:
+                buckets.filter(count__gte=-delta).update(count=F('count') + delta)
+            elif not buckets.update(count=F('count') + delta):
+                cls.objects.bulk_create(
+                    [cls(granularity=granularity, bucket_start=cls.bucket(created_at, granularity), priority=priority)],
+                    ignore_conflicts=True,
+                )
+                buckets.update(count=F('count') + delta)
+
+    @classmethod
+    def record_broadcast(cls, users, created_at, priority=None, count=None):
+        """
+        Ajoute une diffusion à ``users`` ; sans ``priority``, chaque
+        utilisateur compte pour sa propre priorité (une requête groupée).
+        """
+        if priority:
+            cls.record(created_at, priority, count if count is not None else users.count())
+            return
+        rows = users.order_by().values('priority_db').annotate(n=Count('pk')).values_list('priority_db', 'n')
+        for level, n in rows:
+            cls.record(created_at, level, n)
+
+    @classmethod
+    def rebuild(cls, start=None, end=None, chunk_days=7, progress=None):
+        """
+        Recalcule les tranches des notifications créées entre ``start`` et
+        ``end`` (tout l'historique par défaut), par périodes de
+        ``chunk_days`` jours, chacune dans sa propre transaction.
+        ``progress(début, fin, lignes)`` est appelé après chaque période.
+        Retourne le nombre de tranches écrites.
+        """
+        bounds = Notification.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        start = start or bounds['first']
+        end = end or (bounds['last'] and bounds['last'] + timedelta(microseconds=1))
+        if start is None or end is None:
+            return 0
+        written = 0
+        cursor = cls.bucket(start, cls.DAY)
+        while cursor < end:
+            stop = cursor + timedelta(days=chunk_days)
+            hours = (
+                Notification.objects.filter(created_at__gte=cursor, created_at__lt=stop)
+                .annotate(bucket_start=TruncHour('created_at'))
+                .order_by()
+                .values('bucket_start', 'priority')
+                .annotate(count=Count('id'))
+            )
+            rollups, days = [], Counter()
+            for row in hours:
+                rollups.append(cls(granularity=cls.HOUR, **row))
+                days[(cls.bucket(row['bucket_start'], cls.DAY), row['priority'])] += row['count']
+            rollups += [
+                cls(granularity=cls.DAY, bucket_start=day, priority=priority, count=count)
+                for (day, priority), count in days.items()
+            ]
+            with transaction.atomic():
+                cls.objects.filter(bucket_start__gte=cursor, bucket_start__lt=stop).delete()
+                cls.objects.bulk_create(rollups, batch_size=1000)
+            written += len(rollups)
+            if progress:
+                progress(cursor, stop, len(rollups))
+            cursor = stop
+        return written
+
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} [{self.priority}] : {self.count}"
+
+
+# Évacuation planifiée en tâches asynchrones
+class EvacuationDispatch(models.Model):
+    """
+    Déclenchement asynchrone d'une évacuation.
+
+    Chaque canal de l'urgence (alarme, haut-parleur, notifications) est
+    exécuté par sa propre tâche Celery ; son avancement est suivi par une
+    ligne ``ChannelDelivery``. ``finished_at`` est renseigné lorsque le
+    dernier canal se termine.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    urgence = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def status(self):
+        """Statut global déduit de celui des canaux."""
+        statuses = {delivery.status for delivery in self.channels.all()}
+        if statuses == {ChannelDelivery.STATUS_PENDING}:
+            return ChannelDelivery.STATUS_PENDING
+        if statuses & {ChannelDelivery.STATUS_PENDING, ChannelDelivery.STATUS_RUNNING}:
+            return ChannelDelivery.STATUS_RUNNING
+        if ChannelDelivery.STATUS_FAILED in statuses:
+            return ChannelDelivery.STATUS_FAILED
+        return ChannelDelivery.STATUS_DONE
+
+    def __str__(self):
+        return f"Évacuation {self.urgence} ({self.pk})"
+
+
+class ChannelDelivery(models.Model):
+    """Exécution d'un canal d'une évacuation par une tâche Celery."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échoué'),
+    ]
+
+    dispatch = models.ForeignKey(EvacuationDispatch, on_delete=models.CASCADE, related_name='channels')
+    channel = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dispatch', 'channel'], name='unique_dispatch_channel'),
+        ]
 
     def __str__(self):
-        return f"Notification to {self.destinataire} [{self.priority}] : {self.message[:30]}"
\ No newline at end of file
+        return f"{self.channel} [{self.status}]"
@@ -0,0 +1,159 @@
+"""
+Pagination par clé (keyset / curseur) pour l'API des notifications.
+
+Contrairement à une pagination par ``OFFSET``, dont le coût croît avec le
+numéro de page, chaque page est obtenue par une condition sur la clé
+``(created_at, id)`` de la dernière ligne renvoyée :
+
+    created_at < c OR (created_at = c AND id < i)
+
+La requête s'appuie sur les index ``created_at`` et
+``(destinataire, -created_at)`` : son coût est constant quelle que soit la
+profondeur de la page ou la taille de la table.
+
+``EstimatedCountPaginator`` sert l'administration : sous PostgreSQL, le
+nombre de lignes d'une liste non filtrée est lu dans les statistiques du
+planificateur (``pg_class.reltuples``) au lieu d'un ``COUNT(*)`` exact.
+"""
+
+import base64
+import binascii
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(created_at, pk) -> str:
+    """Encode la clé ``(created_at, id)`` d'une ligne en curseur opaque."""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Décode un curseur ; lève ``ValueError`` s'il est invalide."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Curseur invalide: {cursor}")
+    if created_at is None:
+        raise ValueError(f"Curseur invalide: {cursor}")
+    return created_at, pk
+
+
+def keyset_filter(queryset, cursor: str | None):
+    """Trie ``queryset`` du plus récent au plus ancien et le positionne après ``cursor``."""
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return queryset
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination DRF par curseur sur ``(created_at, id)``, du plus récent au plus ancien.
+
+    La page suivante est indiquée par le lien ``next`` ; ``page_size`` peut
+    être ajusté par le client dans la limite de ``max_page_size``.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    # Clé ``(created_at, id)`` d'une ligne de la page (instance par défaut)
+    row_key = attrgetter('created_at', 'pk')
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            queryset = keyset_filter(queryset, request.query_params.get(self.cursor_query_param))
+        except ValueError as exc:
+            raise NotFound(str(exc))
+        # Une ligne de plus que nécessaire indique s'il existe une page suivante
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = encode_cursor(*self.row_key(rows[-1])) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    ``Paginator`` dont le total est estimé pour les grandes tables PostgreSQL.
+
+    L'estimation n'est utilisée que sans filtre (``WHERE``) et au-delà de
+    ``exact_below`` lignes estimées : une recherche, un filtre ou une petite
+    table donnent toujours un compte exact. Le dernier numéro de page peut
+    donc être approximatif sur la liste complète.
+    """
+
+    exact_below = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimated_count(queryset)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimated_count(queryset) -> int | None:
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            # Somme sur les partitions éventuelles (``reltuples`` vaut -1
+            # pour une table jamais analysée)
+            cursor.execute(
+                "SELECT SUM(GREATEST(c.reltuples, 0))::bigint FROM pg_class c "
+                "WHERE c.oid = %s::regclass OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                [queryset.model._meta.db_table] * 2,
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] is not None else None
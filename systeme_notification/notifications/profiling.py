@@ -0,0 +1,167 @@
+"""
+Profilage des requêtes SQL, requête HTTP par requête HTTP.
+
+``profile_queries`` enregistre, le temps d'un bloc ``with``, chaque requête
+SQL exécutée (via ``connection.execute_wrapper``, sans ``DEBUG``) : nombre,
+temps total en base, requêtes les plus lentes et **empreintes** dupliquées.
+L'empreinte d'une requête est son SQL paramétré, listes ``IN`` repliées :
+la même empreinte exécutée de nombreuses fois signale un N+1 (par exemple
+``Notification.__str__`` qui charge ``destinataire`` ligne par ligne).
+
+``QueryProfilingMiddleware`` applique ce profil à un échantillon des
+requêtes (``sample_rate``), assez faible pour rester actif en production.
+Le résultat est journalisé en JSON sur le logger
+``notifications.profiling`` : niveau INFO, WARNING au-delà de
+``slow_query_ms`` ou de ``duplicate_threshold`` répétitions.
+
+L'en-tête ``Server-Timing`` (visible dans les outils de développement du
+navigateur) révèle le nombre de requêtes et les temps en base : par défaut
+(``header`` à ``None``), il n'est rendu qu'en ``DEBUG`` ou au personnel
+(``is_staff``). ``True`` ou ``False`` l'impose ou le supprime pour tous.
+
+Dans les tests ::
+
+    with profile_queries() as profile:
+        client.get(url)
+    assert not profile.duplicates()
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    'sample_rate': 0.01,
+    'slowest': 5,
+    'slow_query_ms': 100,
+    'duplicate_threshold': 5,
+    'header': None,
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def get_settings() -> Dict:
+    """Réglages par défaut, surchargés par ``NOTIFICATIONS_PROFILING``."""
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS_PROFILING', {})}
+
+
+def fingerprint(sql: str) -> str:
+    """SQL normalisé : espaces réduits, listes ``IN (%s, …)`` repliées."""
+    return _IN_LIST.sub('IN (…)', _SPACES.sub(' ', sql).strip())
+
+
+class QueryProfile:
+    """Requêtes SQL observées : ``(alias, sql, durée en ms)`` par exécution."""
+
+    def __init__(self) -> None:
+        self.statements: List[tuple] = []
+        self.started = time.perf_counter()
+        self.elapsed_ms = 0.0
+
+    def wrapper(self, alias: str):
+        def execute(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.statements.append((alias, sql, (time.perf_counter() - start) * 1000))
+        return execute
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def db_time_ms(self) -> float:
+        return sum(duration for _, _, duration in self.statements)
+
+    def slowest(self, limit: int = 5) -> List[Dict]:
+        ordered = sorted(self.statements, key=lambda statement: statement[2], reverse=True)[:limit]
+        return [{'alias': alias, 'sql': sql, 'ms': round(duration, 3)} for alias, sql, duration in ordered]
+
+    def duplicates(self, threshold: int = 2) -> Dict[str, int]:
+        """Empreintes exécutées au moins ``threshold`` fois, avec leur nombre."""
+        counts: Dict[str, int] = {}
+        for _, sql, _ in self.statements:
+            key = fingerprint(sql)
+            counts[key] = counts.get(key, 0) + 1
+        return {key: count for key, count in counts.items() if count >= threshold}
+
+    def report(self, slowest: int = 5) -> Dict:
+        return {
+            'queries': self.count,
+            'db_ms': round(self.db_time_ms, 3),
+            'total_ms': round(self.elapsed_ms, 3),
+            'slowest': self.slowest(slowest),
+            'duplicates': self.duplicates(),
+        }
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tête ``Server-Timing``."""
+        return (
+            f'db;dur={self.db_time_ms:.2f};desc="{self.count} requêtes SQL", '
+            f'dup;desc="{sum(count for count in self.duplicates().values())} répétées", '
+            f'total;dur={self.elapsed_ms:.2f}'
+        )
+
+
+@contextmanager
+def profile_queries(using: List[str] | None = None) -> Iterator[QueryProfile]:
+    """Profile les requêtes exécutées sur les bases ``using`` (toutes par défaut)."""
+    profile = QueryProfile()
+    with ExitStack() as stack:
+        for alias in using or list(connections):
+            stack.enter_context(connections[alias].execute_wrapper(profile.wrapper(alias)))
+        try:
+            yield profile
+        finally:
+            profile.elapsed_ms = (time.perf_counter() - profile.started) * 1000
+
+
+class QueryProfilingMiddleware:
+    """Profile un échantillon des requêtes HTTP (voir le module)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def show_header(header, request) -> bool:
+        if header is not None:
+            return bool(header)
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or bool(user is not None and user.is_staff)
+
+    def __call__(self, request):
+        config = get_settings()
+        if random.random() >= config['sample_rate']:
+            return self.get_response(request)
+
+        with profile_queries() as profile:
+            response = self.get_response(request)
+        report = profile.report(config['slowest'])
+        report.update(method=request.method, path=request.path, status=response.status_code)
+
+        if self.show_header(config['header'], request):
+            response['Server-Timing'] = profile.server_timing()
+        suspicious = (
+            any(statement['ms'] >= config['slow_query_ms'] for statement in report['slowest'])
+            or any(count >= config['duplicate_threshold'] for count in report['duplicates'].values())
+        )
+        logger.log(
+            logging.WARNING if suspicious else logging.INFO,
+            "%s", json.dumps(report, ensure_ascii=False),
+            extra={'profile': report},
+        )
+        return response
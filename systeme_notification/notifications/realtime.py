@@ -0,0 +1,133 @@
+"""
+Publication temps réel des notifications via Django Channels.
+
+Chaque client WebSocket connecté (voir ``consumers.NotificationConsumer``)
+rejoint deux groupes : le sien (``user_<id>``) et celui du campus. Une
+notification individuelle est publiée dans le groupe de son destinataire ;
+une diffusion à tout le campus est publiée une seule fois dans le groupe
+``campus``, quel que soit le nombre de destinataires.
+
+Les publications ont lieu après validation de la transaction, pour qu'un
+client ne reçoive jamais une notification annulée par un rollback. Une
+couche Channels indisponible (Redis arrêté) est journalisée sans faire
+échouer la requête : les notifications sont déjà écrites.
+
+Une diffusion ciblée est publiée dans le groupe de chaque destinataire par
+la tâche ``publish_broadcast_batch``, par lots de ``PUBLISH_BATCH_SIZE`` :
+chaque lot est envoyé dans une seule boucle d'évènements, hors de la requête.
+"""
+
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Notification
+from .signals import notifications_broadcast
+
+
+logger = logging.getLogger('notifications.realtime')
+
+CAMPUS_GROUP = 'campus'
+
+# Destinataires par tâche de publication d'une diffusion ciblée
+PUBLISH_BATCH_SIZE = 1000
+
+# Type des évènements, routé vers ``NotificationConsumer.notification_message``
+EVENT_TYPE = 'notification.message'
+
+
+def user_group(user_id) -> str:
+    """Nom du groupe Channels d'un utilisateur."""
+    return f'user_{user_id}'
+
+
+def publish(group: str, payload: dict) -> None:
+    """Envoie ``payload`` à tous les clients du groupe ``group``."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, {'type': EVENT_TYPE, 'payload': payload})
+    except Exception:
+        logger.exception("Publication temps réel impossible dans le groupe %s", group)
+
+
+def publish_to_users(user_ids, payload: dict) -> None:
+    """Envoie ``payload`` au groupe de chaque utilisateur de ``user_ids``, en une boucle d'évènements."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    event = {'type': EVENT_TYPE, 'payload': payload}
+
+    async def send_all():
+        await asyncio.gather(*(channel_layer.group_send(user_group(user_id), event) for user_id in user_ids))
+    try:
+        async_to_sync(send_all)()
+    except Exception:
+        logger.exception("Publication temps réel impossible pour %d utilisateurs", len(user_ids))
+
+
+def notification_payload(notification) -> dict:
+    return {
+        'kind': 'notification',
+        'id': notification.pk,
+        'message': notification.message,
+        'priority': notification.priority,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def publish_notification(notification) -> None:
+    """Publie une notification dans le groupe de son destinataire."""
+    if notification.destinataire_id is not None:
+        publish(user_group(notification.destinataire_id), notification_payload(notification))
+
+
+def publish_broadcast(message, priority, created_at, count, users=None) -> None:
+    """
+    Publie une diffusion : dans le groupe ``campus`` si ``users`` est
+    ``None`` (tout le campus), sinon dans le groupe de chaque destinataire
+    (``users`` : queryset d'utilisateurs ou liste d'identifiants), par des
+    tâches ``publish_broadcast_batch``.
+    """
+    from .tasks import publish_broadcast_batch
+
+    payload = {
+        'kind': 'broadcast',
+        'message': message,
+        'priority': priority,
+        'created_at': created_at.isoformat(),
+        'count': count,
+    }
+    if users is None:
+        publish(CAMPUS_GROUP, payload)
+        return
+    if hasattr(users, 'values_list'):
+        users = users.values_list('pk', flat=True).iterator()
+    batch = []
+    for user_id in users:
+        batch.append(user_id)
+        if len(batch) == PUBLISH_BATCH_SIZE:
+            publish_broadcast_batch.delay(batch, payload)
+            batch = []
+    if batch:
+        publish_broadcast_batch.delay(batch, payload)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='realtime_notification_created')
+def notification_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_notification(instance), robust=True)
+
+
+@receiver(notifications_broadcast, dispatch_uid='realtime_notifications_broadcast')
+def notifications_broadcasted(sender, users, user_filter, message, priority, created_at, count, notify, **kwargs):
+    if not notify:
+        return
+    recipients = None if user_filter is None else users
+    transaction.on_commit(lambda: publish_broadcast(message, priority, created_at, count, recipients), robust=True)
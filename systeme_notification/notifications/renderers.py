@@ -0,0 +1,59 @@
+"""
+Rendus compacts de l'API des notifications.
+
+- ``FastJSONRenderer`` : JSON produit par ``orjson`` s'il est installé
+  (dépendance optionnelle, plusieurs fois plus rapide que ``json``), par le
+  rendu JSON de DRF sinon ; la sortie est la même dans les deux cas.
+- ``MessagePackRenderer`` : ``application/msgpack``, choisi par l'en-tête
+  ``Accept`` ou par ``?format=msgpack``. Les dates y sont des chaînes
+  ISO 8601, comme en JSON.
+"""
+
+import datetime
+import decimal
+import uuid
+
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépend de l'installation
+    orjson = None
+
+
+def _default(value):
+    """Types non natifs rencontrés hors des sérialiseurs DRF (dates, UUID, décimaux)."""
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` accéléré par ``orjson`` quand il est disponible."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # ``orjson`` ne met pas en forme : la demande d'indentation
+        # (``Accept: application/json; indent=2``) passe par DRF.
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
@@ -0,0 +1,286 @@
+"""
+Rétention et archivage des notifications.
+
+``archive_notifications`` déplace les notifications plus anciennes que la
+durée de rétention vers une archive JSON Lines compressée (gzip), écrite
+par lots au fil de la lecture. Chaque lot est écrit et vidé sur disque
+*avant* d'être supprimé de la base, dans une courte transaction qui
+recalcule aussi les compteurs (``NotificationCounter``) des destinataires
+concernés : la table n'est jamais verrouillée longtemps et une
+interruption ne perd aucune ligne (au pire, un lot se retrouve deux fois
+dans les archives). Les agrégats ``NotificationRollup`` sont conservés :
+les statistiques et graphiques longue durée restent complets.
+
+Sous PostgreSQL, la table peut en outre être partitionnée par mois sur
+``created_at`` (``partition_table``, commande ``partition_notifications``) :
+les partitions entièrement antérieures à la date limite sont alors
+supprimées d'un bloc (``DROP TABLE``) après archivage, au lieu d'être
+vidées ligne à ligne.
+"""
+
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    'days': 365,
+    'directory': 'archives',
+    'chunk_size': 1000,
+    'months_ahead': 3,
+}
+
+ARCHIVED_FIELDS = [field.attname for field in Notification._meta.concrete_fields]
+
+# Index BRIN, trigramme et plein texte créés par les migrations 0005, 0009
+# et 0010 sous PostgreSQL
+BRIN_INDEX = 'notif_created_brin'
+TRIGRAM_INDEX = 'notif_message_trgm'
+FTS_INDEX = 'notif_message_fts'
+
+
+def get_settings() -> Dict:
+    """Réglages par défaut, surchargés par ``NOTIFICATIONS_RETENTION``."""
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS_RETENTION', {})}
+
+
+# ---------------------------
+# Partitionnement PostgreSQL
+# ---------------------------
+
+def _table() -> str:
+    return Notification._meta.db_table
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f'{_table()}_p{month:%Y_%m}'
+
+
+def is_partitioned() -> bool:
+    """Indique si la table des notifications est partitionnée (PostgreSQL uniquement)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s)",
+            [_table()],
+        )
+        return cursor.fetchone()[0]
+
+
+def partitions() -> Dict[datetime, str]:
+    """Partitions mensuelles existantes, indexées par leur premier jour (UTC)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [_table()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{_table()}_p'
+    result = {}
+    for name in names:
+        if name.startswith(prefix):
+            month = datetime.strptime(name[len(prefix):], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+            result[month] = name
+    return result
+
+
+def ensure_partitions(months_ahead: int | None = None, since: datetime | None = None) -> List[str]:
+    """
+    Crée les partitions mensuelles manquantes, de ``since`` (le mois courant
+    par défaut) à ``months_ahead`` mois dans le futur. Retourne leurs noms.
+    """
+    months_ahead = get_settings()['months_ahead'] if months_ahead is None else months_ahead
+    qn = connection.ops.quote_name
+    month = _month_start(since or timezone.now())
+    last = _month_start(timezone.now())
+    for _ in range(months_ahead):
+        last = _add_month(last)
+    created = []
+    with connection.cursor() as cursor:
+        while month <= last:
+            name = _partition_name(month)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(_table())} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [month, _add_month(month)],
+            )
+            created.append(name)
+            month = _add_month(month)
+    return created
+
+
+def partition_table(months_ahead: int | None = None) -> None:
+    """
+    Convertit la table des notifications en table partitionnée par mois
+    sur ``created_at`` (PostgreSQL). La clé primaire devient
+    ``(id, created_at)``, contrainte imposée par PostgreSQL ; les index de
+    ``Notification.Meta`` et les index BRIN, trigramme et plein texte sont
+    recréés sur la table mère.
+    À lancer pendant une fenêtre de maintenance : les lignes sont copiées.
+    ``ValueError`` sur une autre base que PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError("Le partitionnement natif n'est disponible que sous PostgreSQL")
+    if is_partitioned():
+        return
+    qn = connection.ops.quote_name
+    table, old = _table(), f'{_table()}_unpartitioned'
+    user_table = Notification._meta.get_field('destinataire').related_model._meta.db_table
+    with transaction.atomic():
+        first = Notification.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+            cursor.execute(
+                f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+                f"PARTITION BY RANGE (created_at)"
+            )
+            # Nom explicite : celui par défaut est encore pris par l'ancienne table.
+            # Clé étrangère identique à celle créée par Django : ``SET_NULL``
+            # est appliqué par l'ORM, pas par la base.
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_part_pkey')} PRIMARY KEY (id, created_at)")
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_destinataire_fk')} "
+                f"FOREIGN KEY (destinataire_id) REFERENCES {qn(user_table)} (id) "
+                f"DEFERRABLE INITIALLY DEFERRED"
+            )
+            cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+        ensure_partitions(months_ahead, since=first)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {qn(table)}), 1))",
+                [table],
+            )
+            cursor.execute(f"DROP TABLE {qn(old)}")
+        with connection.schema_editor() as editor:
+            for index in Notification._meta.indexes:
+                editor.add_index(Notification, index)
+            editor.execute(f'CREATE INDEX IF NOT EXISTS {BRIN_INDEX} ON {qn(table)} USING brin (created_at)')
+            editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {qn(table)} USING gin (UPPER(message) gin_trgm_ops)'
+            )
+            editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {FTS_INDEX} ON {qn(table)} USING gin (to_tsvector('french', message))"
+            )
+
+
+def drop_partitions_before(cutoff: datetime) -> List[str]:
+    """Supprime les partitions mensuelles entièrement antérieures à ``cutoff``."""
+    qn = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(partitions().items()):
+            if _add_month(month) <= cutoff:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+                dropped.append(name)
+    return dropped
+
+
+# ---------------------------
+# Archivage
+# ---------------------------
+
+def _delete(ids: List[int]) -> None:
+    # ``QuerySet.delete`` chargerait les instances pour les signaux
+    # ``post_delete`` : une requête directe suffit ici.
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(_table())} WHERE {qn('id')} IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+
+
+def archive_notifications(days: int | None = None, directory=None, chunk_size: int | None = None,
+                          dry_run: bool = False, now=None) -> Dict:
+    """
+    Archive puis supprime les notifications créées il y a plus de ``days`` jours.
+
+    Retourne ``archived`` (lignes écrites), ``deleted`` (lignes supprimées
+    par lots), ``dropped`` (partitions supprimées), ``path`` (archive) et
+    ``cutoff``. Avec ``dry_run``, compte seulement les lignes concernées.
+    """
+    config = get_settings()
+    days = config['days'] if days is None else days
+    chunk_size = chunk_size or config['chunk_size']
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=days)
+    old = Notification.objects.filter(created_at__lt=cutoff)
+    result = {'cutoff': cutoff, 'archived': 0, 'deleted': 0, 'dropped': [], 'path': None}
+    if dry_run:
+        result['archived'] = old.count()
+        return result
+
+    partitioned = is_partitioned()
+    # Sous partitionnement, les lignes des mois entièrement échus partent
+    # avec leur partition : seules les autres sont supprimées par lots.
+    droppable_before = _month_start(cutoff) if partitioned else None
+
+    directory = Path(directory or config['directory'])
+    if not directory.is_absolute():
+        directory = Path(settings.BASE_DIR) / directory
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'notifications-{cutoff:%Y%m%d}-{now:%Y%m%dT%H%M%S}.jsonl.gz'
+
+    affected_users = set()
+    last_pk = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        while True:
+            rows = list(old.filter(pk__gt=last_pk).order_by('pk').values(*ARCHIVED_FIELDS)[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1]['id']
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            # Le lot est sur disque avant d'être supprimé de la base
+            archive.flush()
+            result['archived'] += len(rows)
+
+            users = {row['destinataire_id'] for row in rows if row['destinataire_id'] is not None}
+            ids = [row['id'] for row in rows if droppable_before is None or row['created_at'] >= droppable_before]
+            if ids:
+                with transaction.atomic():
+                    _delete(ids)
+                    NotificationCounter.rebuild(user_ids=users)
+                result['deleted'] += len(ids)
+            if len(ids) < len(rows):
+                affected_users |= users
+
+    if partitioned:
+        with transaction.atomic():
+            result['dropped'] = drop_partitions_before(cutoff)
+            if affected_users:
+                NotificationCounter.rebuild(user_ids=affected_users)
+
+    if result['archived']:
+        # Les listes de notifications des utilisateurs ont changé
+        caching.bump('feed', 'notifications')
+        result['path'] = str(path)
+    else:
+        path.unlink()
+    logger.info("Archivage avant %s : %d notifications (%s)", cutoff, result['archived'], result['path'])
+    return result
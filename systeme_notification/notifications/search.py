@@ -0,0 +1,114 @@
+"""
+Recherche plein texte dans les messages des notifications.
+
+Sous PostgreSQL, la correspondance et le classement reposent sur
+``to_tsvector('french', message)`` : l'index GIN d'expression créé par la
+migration 0010 est tenu à jour par PostgreSQL à chaque écriture, sans
+colonne supplémentaire. La requête de l'utilisateur est interprétée par
+``websearch_to_tsquery`` (guillemets, ``-exclu``, ``or``) et les résultats
+classés par ``ts_rank``. Ce score, de type ``real``, est converti en
+``float8`` dans la requête : le curseur le relit tel qu'il a été comparé,
+sans quoi la ligne limite et ses ex æquo reviendraient à la page suivante.
+
+Sous SQLite (développement, tests), une table virtuelle FTS5 à contenu
+externe, alimentée par des déclencheurs, joue le même rôle ; le score est
+l'opposé de ``bm25`` (plus grand = plus pertinent, comme ``ts_rank``).
+
+Sur les autres bases, la recherche se replie sur ``message__icontains``,
+sans classement (score nul, ordre des id décroissants).
+
+Les résultats sont paginés par clé sur ``(score, id)`` décroissants : le
+curseur contient le score et l'id de la dernière ligne renvoyée.
+"""
+
+import base64
+import binascii
+import re
+from typing import List, Tuple
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Notification
+
+
+FTS_CONFIG = 'french'
+# Table FTS5 créée par la migration 0010 sous SQLite
+FTS_TABLE = 'notifications_notification_fts'
+
+_WORDS = re.compile(r'\w+')
+
+
+def _column(connection) -> str:
+    qn = connection.ops.quote_name
+    return f'{qn(Notification._meta.db_table)}.{qn("message")}'
+
+
+def has_terms(text: str) -> bool:
+    """Vrai si ``text`` contient au moins un mot à rechercher."""
+    return bool(_WORDS.search(text or ''))
+
+
+def fts5_query(text: str) -> str:
+    """Requête FTS5 : chaque mot entre guillemets, tous requis."""
+    return ' '.join(f'"{word}"' for word in _WORDS.findall(text))
+
+
+def _expressions(connection, text: str):
+    """Expressions ``(correspondance, score)`` propres au moteur."""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        document = f"to_tsvector('{FTS_CONFIG}', {_column(connection)})"
+        query = f"websearch_to_tsquery('{FTS_CONFIG}', %s)"
+        return (
+            RawSQL(f'{document} @@ {query}', [text], output_field=BooleanField()),
+            RawSQL(f'ts_rank({document}, {query})::float8', [text], output_field=FloatField()),
+        )
+    if vendor == 'sqlite':
+        query = fts5_query(text)
+        table = Notification._meta.db_table
+        return (
+            RawSQL(f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+                   [query], output_field=BooleanField()),
+            RawSQL(f'(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id)',
+                   [query], output_field=FloatField()),
+        )
+    return Q(message__icontains=text), Value(0.0, output_field=FloatField())
+
+
+def encode_cursor(score: float, pk: int) -> str:
+    return base64.urlsafe_b64encode(f'{score!r}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Décode un curseur ; lève ``ValueError`` s'il est invalide."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Curseur invalide: {cursor}")
+
+
+def search(queryset, text: str, cursor: str | None = None, limit: int = 50) -> Tuple[List[Notification], str | None]:
+    """
+    Notifications de ``queryset`` dont le message correspond à ``text``,
+    de la plus pertinente à la moins pertinente (attribut ``score``).
+
+    Retourne la page (au plus ``limit`` lignes) et le curseur de la page
+    suivante (``None`` s'il n'y en a pas). Lève ``ValueError`` pour une
+    requête vide ou un curseur invalide.
+    """
+    if not has_terms(text):
+        raise ValueError("Requête de recherche vide")
+    match, score = _expressions(connections[queryset.db], text)
+    queryset = queryset.filter(match).annotate(score=score).order_by('-score', '-id')
+    if cursor:
+        last_score, last_pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(score__lt=last_score) | Q(score=last_score, id__lt=last_pk))
+    # Une ligne de plus que nécessaire indique s'il existe une page suivante
+    rows = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1].score, rows[limit - 1].pk) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -1,3 +1,6 @@
+from operator import itemgetter
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Notification, User
 
@@ -11,3 +14,57 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
+
+
+def _datetime_converter():
+    """
+    Conversion d'une date au rendu de ``serializers.DateTimeField`` (ISO 8601,
+    fuseau courant, UTC noté « Z »). Le fuseau est lu une fois par appel de
+    ``to_representation`` ; une date déjà dans ce fuseau n'est pas convertie.
+    """
+    current = timezone.get_current_timezone()
+
+    def convert(value):
+        if value is None:
+            return None
+        if value.tzinfo is not current:
+            value = value.astimezone(current)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class NotificationValuesSerializer:
+    """
+    Sérialisation en lecture seule, sans ``ModelSerializer``.
+
+    Les lignes sont lues par ``values_list`` (tuples, sans instancier de
+    modèle) et converties en dictionnaires identiques à ceux de
+    ``NotificationSerializer`` : seules les dates sont converties, les
+    autres colonnes sont reprises telles quelles.
+    """
+
+    def __init__(self):
+        self.names, self.columns, self.datetimes = [], [], []
+        for index, (name, field) in enumerate(NotificationSerializer().fields.items()):
+            model_field = Notification._meta.get_field(field.source)
+            self.names.append(name)
+            self.columns.append(model_field.attname)
+            if isinstance(field, serializers.DateTimeField):
+                self.datetimes.append(index)
+        # Clé de pagination ``(created_at, id)`` d'un tuple
+        self.row_key = itemgetter(self.columns.index('created_at'), self.columns.index('id'))
+
+    def select(self, queryset):
+        """``queryset`` réduit aux colonnes sérialisées, en tuples."""
+        return queryset.values_list(*self.columns)
+
+    def to_representation(self, rows):
+        names, datetimes, convert = self.names, self.datetimes, _datetime_converter()
+        data = []
+        for row in rows:
+            values = list(row)
+            for index in datetimes:
+                values[index] = convert(values[index])
+            data.append(dict(zip(names, values)))
+        return data
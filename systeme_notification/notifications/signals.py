@@ -0,0 +1,27 @@
+"""
+Signaux propres à l'application notifications.
+
+``Notification.objects.broadcast`` crée ses lignes par ``INSERT ... SELECT``
+(ou ``bulk_create``) : aucun ``post_save`` n'est émis pour elles. Le signal
+``notifications_broadcast`` est envoyé à la place, une fois par appel, dans
+la transaction de l'insertion. Arguments transmis aux récepteurs :
+
+- ``sender`` : le modèle ``Notification`` ;
+- ``users`` : queryset des destinataires ;
+- ``user_filter`` : le filtre passé à ``broadcast`` (``None`` = tout le campus) ;
+- ``message``, ``priority`` (``None`` si recopiée de chaque utilisateur),
+  ``created_at`` et ``count`` (nombre de lignes créées) ;
+- ``notify`` : ``False`` si l'appelant se charge lui-même de la publication
+  temps réel (voir ``BroadcastFanOut``).
+
+``notifications_read`` est envoyé par ``Notification.objects.mark_read``
+(une mise à jour groupée, sans ``post_save``) lorsque des notifications
+ont été marquées comme lues. Arguments : ``sender`` (le modèle
+``Notification``), ``user_id`` et ``count``.
+"""
+
+from django.dispatch import Signal
+
+
+notifications_broadcast = Signal()
+notifications_read = Signal()
@@ -0,0 +1,150 @@
+"""
+Calcul des statistiques de notifications pour les tableaux de bord.
+
+Les valeurs affichées par ``admin_dashboard`` et ``stats_api`` sont lues
+dans les agrégats ``NotificationRollup`` (une ligne par heure ou par jour
+et par priorité), en un nombre fixe de petites requêtes, quel que soit le
+volume de notifications :
+
+- une requête groupée par priorité sur les agrégats : les tranches
+  journalières donnent le total, les tranches horaires les fenêtres
+  glissantes 24h / 7 jours / 30 jours à partir de l'heure pleine qui suit
+  leur début ;
+- une requête sur les notifications de l'heure entamée au début de chaque
+  fenêtre (quelques lignes, via l'index sur ``created_at``), pour des
+  fenêtres exactes à la seconde ;
+- une requête sur les tranches journalières pour la série quotidienne ;
+- un ``COUNT`` sur les utilisateurs.
+"""
+
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+from typing import Dict, List
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import PRIORITIES, Notification, NotificationRollup, User
+
+
+# Fenêtres glissantes exposées par les tableaux de bord
+WINDOWS = {
+    'notifs_24h': timedelta(hours=24),
+    'notifs_7d': timedelta(days=7),
+    'notifs_30d': timedelta(days=30),
+}
+
+
+def _next_hour(moment):
+    """Début de la première tranche horaire entièrement postérieure à ``moment``."""
+    bucket = NotificationRollup.bucket(moment, NotificationRollup.HOUR)
+    return bucket if bucket == moment else bucket + timedelta(hours=1)
+
+
+def notification_totals(now=None) -> Dict:
+    """
+    Retourne le total, les fenêtres glissantes et la répartition par priorité.
+
+    Deux requêtes : l'une sur les agrégats, l'autre sur l'heure entamée au
+    début de chaque fenêtre. Le résultat contient ``total_notifications``,
+    une clé par fenêtre de ``WINDOWS``, ``priority_counts`` (toujours
+    renseigné pour les priorités connues) et ``priority_stats`` (liste des
+    groupes réellement présents, au format attendu par le gabarit).
+    """
+    now = now or timezone.now()
+    starts = {key: now - delta for key, delta in WINDOWS.items()}
+    full_hours = {key: _next_hour(start) for key, start in starts.items()}
+
+    rollups = (
+        NotificationRollup.objects.filter(
+            Q(granularity=NotificationRollup.DAY)
+            | Q(granularity=NotificationRollup.HOUR, bucket_start__gte=min(full_hours.values()))
+        )
+        .order_by()
+        .values('priority')
+        .annotate(
+            total=Sum('count', filter=Q(granularity=NotificationRollup.DAY)),
+            **{
+                key: Sum('count', filter=Q(granularity=NotificationRollup.HOUR, bucket_start__gte=full_hours[key]))
+                for key in WINDOWS
+            },
+        )
+        .order_by('priority')
+    )
+    edges = {
+        row['priority']: row
+        for row in Notification.objects.filter(
+            reduce(or_, (Q(created_at__gte=starts[key], created_at__lt=full_hours[key]) for key in WINDOWS))
+        )
+        .order_by()
+        .values('priority')
+        .annotate(**{
+            key: Count('id', filter=Q(created_at__gte=starts[key], created_at__lt=full_hours[key]))
+            for key in WINDOWS
+        })
+    }
+
+    rows = []
+    for row in rollups:
+        edge = edges.get(row['priority'], {})
+        row['count'] = row.pop('total') or 0
+        for key in WINDOWS:
+            row[key] = (row[key] or 0) + edge.get(key, 0)
+        if row['count']:
+            rows.append(row)
+
+    totals = {'total_notifications': sum(row['count'] for row in rows)}
+    for key in WINDOWS:
+        totals[key] = sum(row[key] for row in rows)
+    priority_counts = dict.fromkeys(PRIORITIES, 0)
+    priority_counts.update({row['priority']: row['count'] for row in rows})
+    totals['priority_counts'] = priority_counts
+    totals['priority_stats'] = [{'priority': row['priority'], 'count': row['count']} for row in rows]
+    return totals
+
+
+def daily_series(days: int = 7, now=None) -> List[Dict]:
+    """
+    Retourne le nombre de notifications par jour sur les ``days`` derniers jours.
+
+    Une seule requête sur les tranches journalières de ``NotificationRollup``
+    (au plus quatre lignes par jour : la série sur un an coûte autant que
+    sur une semaine) ; les jours sans notification sont complétés à zéro.
+    La liste est triée du plus ancien au plus récent, au format
+    ``{'date': 'jj/mm', 'count': n}``.
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    first_day = today - timedelta(days=days - 1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    counts = {
+        timezone.localtime(bucket_start).date(): count
+        for bucket_start, count in NotificationRollup.objects.filter(
+            granularity=NotificationRollup.DAY, bucket_start__gte=start
+        )
+        .order_by()
+        .values('bucket_start')
+        .annotate(total=Sum('count'))
+        .values_list('bucket_start', 'total')
+    }
+    series = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        series.append({'date': day.strftime('%d/%m'), 'count': counts.get(day, 0)})
+    return series
+
+
+def global_stats(now=None) -> Dict:
+    """Statistiques de ``stats_api`` : trois requêtes au total."""
+    stats = {'total_users': User.objects.count()}
+    stats.update(notification_totals(now))
+    return stats
+
+
+def dashboard_stats(now=None, days: int = 7) -> Dict:
+    """Statistiques de ``admin_dashboard`` : quatre requêtes au total."""
+    now = now or timezone.now()
+    stats = global_stats(now)
+    stats['daily_stats'] = daily_series(days, now)
+    return stats
@@ -0,0 +1,139 @@
+"""
+Tâches Celery du système de notifications.
+
+Une évacuation n'est plus exécutée dans la requête HTTP : ``dispatch_evacuation``
+enregistre un ``EvacuationDispatch`` et planifie un groupe de tâches
+``run_channel``, une par canal de l'urgence, qui s'exécutent en parallèle
+sur les workers. La vue répond aussitôt ``202 Accepted``.
+
+Si le broker refuse les tâches (indisponible, connexion perdue), l'échec
+est journalisé, les canaux sont marqués échoués et ``PublishError`` est
+levée : les vues répondent alors ``503``.
+
+De même, une diffusion lancée depuis le tableau de bord administrateur est
+enregistrée par la vue puis exécutée par ``run_broadcast`` : la page de
+suivi montre son avancement pendant l'écriture des lots. Un échec d'envoi
+(``schedule_broadcast``) la marque échouée.
+"""
+
+import logging
+from typing import Callable
+
+from celery import group, shared_task
+from django.db import transaction
+from django.utils import timezone
+
+from . import core  # noqa: F401  (enregistre les urgences dans le registre)
+from .decorators import RegisterInGlobalRegistry
+from .fanout import BroadcastFanOut
+from .models import Broadcast, ChannelDelivery, EvacuationDispatch
+from .realtime import publish_to_users
+from .retention import archive_notifications, ensure_partitions, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    """Levée lorsque des tâches n'ont pas pu être envoyées au broker."""
+
+
+def enqueue(send: Callable[[], object], on_failure: Callable[[Exception], None]) -> None:
+    """
+    Appelle ``send`` (envoi de tâches au broker). En cas d'échec, journalise
+    l'erreur, appelle ``on_failure(exc)`` puis lève ``PublishError``.
+    """
+    try:
+        send()
+    except Exception as exc:
+        logger.exception("Envoi des tâches au broker impossible")
+        on_failure(exc)
+        raise PublishError(str(exc)) from exc
+
+
+def _fail_dispatch(dispatch_id, exc: Exception) -> None:
+    now = timezone.now()
+    ChannelDelivery.objects.filter(dispatch_id=dispatch_id, status=ChannelDelivery.STATUS_PENDING).update(
+        status=ChannelDelivery.STATUS_FAILED, error=f"Tâche non planifiée : {exc}", finished_at=now
+    )
+    EvacuationDispatch.objects.filter(pk=dispatch_id).update(finished_at=now)
+
+
+def _fail_broadcast(broadcast_id, exc: Exception) -> None:
+    Broadcast.objects.filter(pk=broadcast_id, status=Broadcast.STATUS_PENDING).update(
+        status=Broadcast.STATUS_FAILED, finished_at=timezone.now()
+    )
+
+
+def schedule_broadcast(broadcast: Broadcast) -> None:
+    """
+    Planifie ``run_broadcast`` après validation de la transaction en cours ;
+    un échec d'envoi marque la diffusion échouée et lève ``PublishError``.
+    """
+    transaction.on_commit(lambda: enqueue(
+        lambda: run_broadcast.delay(broadcast.pk), lambda exc: _fail_broadcast(broadcast.pk, exc)
+    ))
+
+
+def dispatch_evacuation(urgence) -> EvacuationDispatch:
+    """
+    Enregistre l'évacuation de ``urgence`` et planifie une tâche par canal.
+
+    Les tâches ne sont envoyées qu'après validation de la transaction en
+    cours, afin que les workers trouvent les lignes à mettre à jour. Hors
+    transaction, un échec d'envoi lève ``PublishError`` (voir ``enqueue``).
+    """
+    dispatch = EvacuationDispatch.objects.create(urgence=type(urgence).__name__)
+    ChannelDelivery.objects.bulk_create(
+        [ChannelDelivery(dispatch=dispatch, channel=channel) for channel in urgence.channels]
+    )
+    pipeline = group(run_channel.si(str(dispatch.pk), channel) for channel in urgence.channels)
+    transaction.on_commit(lambda: enqueue(pipeline.apply_async, lambda exc: _fail_dispatch(dispatch.pk, exc)))
+    return dispatch
+
+
+@shared_task
+def run_channel(dispatch_id, channel):
+    """Exécute un canal d'une évacuation et enregistre son résultat."""
+    deliveries = ChannelDelivery.objects.filter(dispatch_id=dispatch_id, channel=channel)
+    deliveries.update(status=ChannelDelivery.STATUS_RUNNING, started_at=timezone.now())
+    dispatch = EvacuationDispatch.objects.get(pk=dispatch_id)
+    try:
+        urgence = RegisterInGlobalRegistry.registry[dispatch.urgence]()
+        result = urgence.run_channel(channel)
+    except Exception as exc:
+        deliveries.update(status=ChannelDelivery.STATUS_FAILED, error=str(exc), finished_at=timezone.now())
+    else:
+        deliveries.update(
+            status=ChannelDelivery.STATUS_DONE,
+            result='' if result is None else str(result),
+            finished_at=timezone.now(),
+        )
+    # Le dernier canal terminé clôt l'évacuation
+    EvacuationDispatch.objects.filter(pk=dispatch_id, finished_at__isnull=True).exclude(
+        channels__status__in=[ChannelDelivery.STATUS_PENDING, ChannelDelivery.STATUS_RUNNING]
+    ).update(finished_at=timezone.now())
+
+
+@shared_task
+def run_broadcast(broadcast_id):
+    """Exécute une diffusion enregistrée par ``BroadcastFanOut.create``."""
+    broadcast = Broadcast.objects.get(pk=broadcast_id)
+    BroadcastFanOut(batch_size=broadcast.batch_size, segment=broadcast.segment).run(broadcast)
+
+
+@shared_task
+def publish_broadcast_batch(user_ids, payload):
+    """Publie une diffusion ciblée dans le groupe de chaque utilisateur d'un lot."""
+    publish_to_users(user_ids, payload)
+
+
+@shared_task
+def archive_old_notifications():
+    """
+    Tâche périodique (Celery beat) : prépare les partitions à venir si la
+    table est partitionnée, puis archive les notifications échues.
+    """
+    if is_partitioned():
+        ensure_partitions()
+    result = archive_notifications()
+    return {'archived': result['archived'], 'deleted': result['deleted'], 'dropped': result['dropped']}
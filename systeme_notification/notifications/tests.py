@@ -1,5 +1,67 @@
-from django.test import TestCase
+import gzip
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from . import caching, circuit, importing, profiling, tasks
+from .audience import VERSION_KEY as AUDIENCE_VERSION_KEY, AudienceIndex, audience, bitmap, members
+from .circuit import CircuitBreaker, CircuitOpenError
+from .benchmarks import suite
+from .benchmarks.delivery import measure_throughput
+from .benchmarks.serialization import compare as compare_serialization
+from .caching import get_or_compute
 from .core import Epidemie, Incendie, Innondation, Securite
+from .delivery import DeliveryEngine, FakePushGateway, FakeSMSGateway
+from .directory import VERSION_KEY, RecipientDirectory, directory
+from .dispatcher import PriorityDispatcher, schedule_notifications
+from .fanout import BroadcastFanOut
+from .metaclasses import ChannelRegistry
+from .metrics import MetricsRegistry, registry as metrics_registry, render_prometheus
+from .retention import archive_notifications, partition_table
+from .pagination import EstimatedCountPaginator
+from .realtime import CAMPUS_GROUP, user_group
+from .routing import websocket_urlpatterns
+from .models import (
+    Broadcast, ChannelDelivery, EvacuationDispatch, Notification, NotificationCounter, NotificationManager,
+    NotificationRollup, User,
+)
+from .serializers import NotificationSerializer, NotificationValuesSerializer
+from .views import FEED_PAGE_SIZE
+from .stats import daily_series, dashboard_stats, global_stats
+
+
+def create_user(username, **extra_fields):
+    extra_fields.setdefault('phone', '+33600000000')
+    extra_fields.setdefault('email_perso', f'{username}@perso.fr')
+    return User.objects.create_user(username, f'{username}@campus.fr', 'motdepasse', **extra_fields)
+
 
 class UrgenceTests(TestCase):
     def test_epidemie_evacuer(self):
@@ -17,3 +79,1406 @@ class UrgenceTests(TestCase):
     def test_securite_evacuer(self):
         s = Securite()
         s.evacuer()
+
+
+# Hachage rapide : les tests créent beaucoup d'utilisateurs
+fast_password_hashers = override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+
+
+@fast_password_hashers
+class BroadcastFanOutTests(TestCase):
+    def setUp(self):
+        self.users = [create_user(f'etudiant{i}') for i in range(7)]
+
+    def test_batches_cover_every_user_once(self):
+        batches = list(BroadcastFanOut(batch_size=3).iter_batches())
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(sorted(sum(batches, [])), sorted(u.pk for u in self.users))
+
+    def test_start_writes_one_notification_per_user(self):
+        broadcast = BroadcastFanOut(batch_size=3).start("Exercice incendie", priority='haute')
+        self.assertEqual(broadcast.status, Broadcast.STATUS_DONE)
+        self.assertEqual(broadcast.total_recipients, 7)
+        self.assertEqual(broadcast.sent_count, 7)
+        self.assertEqual(broadcast.progress, 100)
+        self.assertEqual(Notification.objects.filter(message="Exercice incendie", priority='haute').count(), 7)
+
+    def test_view_redirects_with_broadcast_id(self):
+        admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte', 'priority': 'haute'})
+        broadcast = Broadcast.objects.get()
+        self.assertRedirects(
+            response, f"{reverse('admin_dashboard')}?broadcast={broadcast.pk}", fetch_redirect_response=False
+        )
+        # Exécutée par une tâche Celery après la réponse
+        self.assertEqual(broadcast.status, Broadcast.STATUS_PENDING)
+        self.assertEqual(broadcast.total_recipients, 8)
+        for callback in callbacks:
+            callback()
+        status = self.client.get(reverse('broadcast_status', args=[broadcast.pk])).json()
+        self.assertEqual(status['status'], Broadcast.STATUS_DONE)
+        self.assertEqual(status['sent_count'], 8)
+
+    def test_view_rejects_unknown_priority(self):
+        admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte', 'priority': 'extreme'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Broadcast.objects.exists())
+
+    def test_dashboard_ignores_invalid_broadcast_id(self):
+        admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin_dashboard'), {'broadcast': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'id="broadcast-progress"')
+
+
+@fast_password_hashers
+class NotificationBroadcastTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now()
+        self.end = self.start + timedelta(hours=2)
+        self.alice = create_user('alice', priority='haute', time_window=(self.start, self.end))
+        self.bob = create_user('bob', is_active=False)
+
+    def test_copies_priority_and_time_window_from_user(self):
+        created = Notification.objects.broadcast("Coupure réseau")
+        self.assertEqual(created, 2)
+        notif = Notification.objects.get(destinataire=self.alice)
+        self.assertEqual(notif.priority, 'haute')
+        self.assertEqual((notif.time_window_start, notif.time_window_end), (self.start, self.end))
+        self.assertEqual(Notification.objects.get(destinataire=self.bob).priority, 'faible')
+
+    def test_user_filter_and_explicit_priority(self):
+        created = Notification.objects.broadcast("Alerte", user_filter=Q(is_active=True), priority='urgente')
+        self.assertEqual(created, 1)
+        notif = Notification.objects.get()
+        self.assertEqual((notif.destinataire, notif.priority), (self.alice, 'urgente'))
+        self.assertIsNotNone(notif.created_at)
+
+    def test_query_count_does_not_depend_on_recipients(self):
+        Notification.objects.broadcast("Premier message")
+        # savepoint, INSERT ... SELECT, compteurs manquants, total + 4 priorités,
+        # agrégats (répartition + heure et jour des 2 priorités présentes), release
+        with self.assertNumQueries(1 + 1 + 1 + 5 + 1 + 2 * 2 + 1):
+            Notification.objects.broadcast("Alerte")
+        for i in range(5):
+            create_user(f'invite{i}')
+        Notification.objects.broadcast("Troisième message")
+        with self.assertNumQueries(1 + 1 + 1 + 5 + 1 + 2 * 2 + 1):
+            Notification.objects.broadcast("Alerte")
+
+    def test_bulk_create_fallback(self):
+        with mock.patch.object(NotificationManager, 'INSERT_SELECT_VENDORS', set()):
+            created = Notification.objects.broadcast("Alerte", batch_size=1)
+        self.assertEqual(created, 2)
+        notif = Notification.objects.get(destinataire=self.alice)
+        self.assertEqual((notif.priority, notif.time_window_end), ('haute', self.end))
+
+
+@fast_password_hashers
+class StatsTests(TestCase):
+    def setUp(self):
+        self.alice = create_user('alice', priority='haute')
+        self.bob = create_user('bob')
+        Notification.objects.broadcast("Aujourd'hui")
+        old = Notification.objects.create(destinataire=self.alice, message="Il y a 3 jours")
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=3))
+        ancient = Notification.objects.create(destinataire=self.bob, message="Il y a 40 jours")
+        Notification.objects.filter(pk=ancient.pk).update(created_at=timezone.now() - timedelta(days=40))
+        # Les ``update`` ci-dessus contournent la mise à jour des agrégats
+        NotificationRollup.rebuild()
+
+    def test_global_stats(self):
+        with self.assertNumQueries(3):
+            stats = global_stats()
+        self.assertEqual(stats['total_users'], 2)
+        self.assertEqual(stats['total_notifications'], 4)
+        self.assertEqual((stats['notifs_24h'], stats['notifs_7d'], stats['notifs_30d']), (2, 3, 3))
+        self.assertEqual(stats['priority_counts'], {'urgente': 0, 'haute': 2, 'moyenne': 0, 'faible': 2})
+
+    def test_daily_series(self):
+        with self.assertNumQueries(1):
+            series = daily_series(days=7)
+        self.assertEqual(len(series), 7)
+        self.assertEqual([day['count'] for day in series], [0, 0, 0, 1, 0, 0, 2])
+
+    def test_dashboard_stats_query_count(self):
+        with self.assertNumQueries(4):
+            stats = dashboard_stats()
+        self.assertEqual(sum(day['count'] for day in stats['daily_stats']), 3)
+
+    def test_stats_api_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('stats_api'))
+        self.assertEqual(response.json()['priority_counts']['haute'], 2)
+
+    def test_admin_dashboard_query_count(self):
+        admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+        self.client.force_login(admin)
+        # session + utilisateur, statistiques (4), top utilisateurs, notifications récentes
+        with self.assertNumQueries(2 + 4 + 2):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_notifications'], 4)
+
+    def test_rollups_kept_current_by_writes(self):
+        Notification.objects.create(destinataire=self.bob, message="Maintenant")
+        Notification.objects.broadcast("Urgent", priority='urgente')
+        Notification.objects.filter(message="Maintenant").get().delete()
+        incremental = list(NotificationRollup.objects.order_by('granularity', 'bucket_start', 'priority')
+                           .values_list('granularity', 'bucket_start', 'priority', 'count'))
+        NotificationRollup.rebuild(chunk_days=1)
+        rebuilt = list(NotificationRollup.objects.order_by('granularity', 'bucket_start', 'priority')
+                       .values_list('granularity', 'bucket_start', 'priority', 'count'))
+        self.assertEqual([row for row in incremental if row[3]], rebuilt)
+        self.assertEqual(global_stats()['priority_counts']['urgente'], 2)
+
+    def test_exact_window_edges(self):
+        # Une notification juste avant et une juste après le début de la fenêtre 24h
+        now = timezone.now()
+        for offset in (timedelta(hours=24, seconds=1), timedelta(hours=23, minutes=59)):
+            notif = Notification.objects.create(destinataire=self.bob, message="Limite")
+            Notification.objects.filter(pk=notif.pk).update(created_at=now - offset)
+        NotificationRollup.rebuild()
+        self.assertEqual(global_stats(now)['notifs_24h'], 3)
+
+    def test_backfill_command(self):
+        NotificationRollup.objects.all().delete()
+        output = StringIO()
+        call_command('backfill_rollups', chunk_days=10, stdout=output)
+        self.assertIn('agrégats écrits', output.getvalue())
+        self.assertEqual(global_stats()['total_notifications'], 4)
+        self.assertEqual(len(daily_series(days=365)), 365)
+
+
+class IndexBenchmarkTests(TransactionTestCase):
+    # Le schema editor SQLite ne peut pas tourner dans la transaction de TestCase
+    def test_bench_indexes_command(self):
+        out = StringIO()
+        call_command('bench_indexes', seed=True, users=5, notifications=200, repeat=1, stdout=out)
+        self.assertEqual(Notification.objects.count(), 200)
+        self.assertIn('user_feed', out.getvalue())
+        index_names = {index.name for index in Notification._meta.indexes}
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Notification._meta.db_table)
+        self.assertTrue(index_names <= set(constraints))
+
+
+@fast_password_hashers
+class NotificationPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = create_user('alice', priority='haute')
+        self.bob = create_user('bob')
+        self.base = base = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            Notification.objects.broadcast(f"Message {i}")
+        # Deux lignes par horodatage : le départage se fait sur l'id
+        for i, pk in enumerate(Notification.objects.order_by('pk').values_list('pk', flat=True)):
+            Notification.objects.filter(pk=pk).update(created_at=base + timedelta(minutes=i // 2))
+        self.url = reverse('notification-list')
+
+    def collect(self, url):
+        ids, pages = [], 0
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            ids += [row['id'] for row in data['results']]
+            url, pages = data['next'], pages + 1
+        return ids, pages
+
+    def test_walks_every_row_once_newest_first(self):
+        ids, pages = self.collect(f'{self.url}?page_size=3')
+        expected = list(Notification.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_filters(self):
+        ids, _ = self.collect(f'{self.url}?destinataire={self.alice.pk}&priority=haute')
+        self.assertEqual(len(ids), 5)
+        since = (self.base + timedelta(minutes=1)).isoformat().replace('+', '%2B')
+        ids, _ = self.collect(f'{self.url}?since={since}')
+        self.assertEqual(len(ids), 8)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(f'{self.url}?cursor=nimportequoi').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.url}?since=hier').status_code, 400)
+
+
+@fast_password_hashers
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.alice = create_user('alice', priority='haute')
+        self.bob = create_user('bob')
+
+    def assertCounter(self, user, **expected):
+        counter = NotificationCounter.for_user(user)
+        self.assertEqual({field: getattr(counter, field) for field in expected}, expected)
+
+    def test_save_and_broadcast_update_counters(self):
+        Notification.objects.create(destinataire=self.alice, message="Bienvenue")
+        Notification.objects.broadcast("Coupure réseau")
+        Notification.objects.broadcast("Alerte", user_filter=Q(username='bob'), priority='urgente')
+        self.assertCounter(self.alice, total=2, unread=2, haute=2, faible=0)
+        self.assertCounter(self.bob, total=2, unread=2, faible=1, urgente=1)
+
+    def test_broadcast_creates_missing_counters_in_batches(self):
+        User.objects.bulk_create([User(username=f'nouveau{index}') for index in range(3)])
+        with CaptureQueriesContext(connection) as queries:
+            Notification.objects.broadcast("Coupure réseau", batch_size=2)
+        table = NotificationCounter._meta.db_table
+        # ``INSERT OR IGNORE`` sous SQLite (``ignore_conflicts``)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT') and f'INTO "{table}"' in query['sql']]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(NotificationCounter.objects.filter(total=1).count(), 5)
+
+    def test_mark_read_and_delete(self):
+        first = Notification.objects.create(destinataire=self.alice, message="Un")
+        Notification.objects.create(destinataire=self.alice, message="Deux")
+        self.assertEqual(Notification.objects.mark_read(self.alice, ids=[first.pk]), 1)
+        self.assertEqual(Notification.objects.mark_read(self.alice, ids=[first.pk]), 0)
+        self.assertCounter(self.alice, total=2, unread=1)
+        first.refresh_from_db()
+        first.delete()
+        self.assertCounter(self.alice, total=1, unread=1, haute=1)
+
+    def test_rebuild_matches_incremental_counters(self):
+        Notification.objects.broadcast("Un")
+        Notification.objects.broadcast("Deux", priority='moyenne')
+        Notification.objects.mark_read(self.bob)
+        expected = list(NotificationCounter.objects.order_by('pk').values())
+        NotificationCounter.rebuild()
+        self.assertEqual(list(NotificationCounter.objects.order_by('pk').values()), expected)
+
+    def test_unread_count_endpoint_and_dashboard(self):
+        Notification.objects.broadcast("Coupure réseau")
+        self.client.force_login(self.alice)
+        with self.assertNumQueries(3):  # session, utilisateur, compteur
+            data = self.client.get(reverse('unread_count_api')).json()
+        self.assertEqual((data['unread'], data['priority_counts']['haute']), (1, 1))
+        response = self.client.get(reverse('user_dashboard'))
+        self.assertEqual(response.context['unread_notifications'], 1)
+        self.client.post(reverse('mark_notifications_read'))
+        self.assertEqual(self.client.get(reverse('unread_count_api')).json()['unread'], 0)
+
+    def test_read_action(self):
+        notif = Notification.objects.create(destinataire=self.bob, message="Un")
+        url = reverse('notification-read', args=[notif.pk])
+        self.assertEqual(self.client.post(url).status_code, 401)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertCounter(self.bob, unread=1, total=1)
+        self.client.force_login(self.bob)
+        response = self.client.post(url)
+        self.assertIsNotNone(response.json()['read_at'])
+        self.assertCounter(self.bob, unread=0, total=1)
+
+
+class EvacuationDispatchTests(TestCase):
+    def test_post_returns_accepted_and_runs_each_channel(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/api/evacuation/incendie/')
+        self.assertEqual(response.status_code, 202)
+        data = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(data['urgence'], 'Incendie')
+        self.assertEqual(data['status'], ChannelDelivery.STATUS_DONE)
+        self.assertIsNotNone(data['finished_at'])
+        self.assertEqual(set(data['channels']), {'set_alarm', 'speaker', 'send_notifications'})
+        self.assertEqual(data['channels']['send_notifications']['result'], "Notification envoyée : Evacuez immédiatement")
+
+    def test_tasks_are_queued_after_commit(self):
+        dispatch = Epidemie().evacuer_async()
+        self.assertEqual(dispatch.status, ChannelDelivery.STATUS_PENDING)
+
+    def test_failing_channel_is_reported(self):
+        with mock.patch.object(Securite, 'speaker', side_effect=RuntimeError("haut-parleur hors service")):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch = Securite().evacuer_async()
+        self.assertEqual(dispatch.status, ChannelDelivery.STATUS_FAILED)
+        speaker = dispatch.channels.get(channel='speaker')
+        self.assertEqual(speaker.error, "haut-parleur hors service")
+        self.assertEqual(dispatch.channels.filter(status=ChannelDelivery.STATUS_DONE).count(), 2)
+
+    def test_worker_process_registers_urgences(self):
+        # Processus neuf, comme un worker Celery : le registre part vide et
+        # seul ``notifications.tasks`` est importé après ``django.setup()``
+        code = (
+            "import django; django.setup()\n"
+            "import notifications.tasks\n"
+            "from notifications.decorators import RegisterInGlobalRegistry\n"
+            "print(sorted(RegisterInGlobalRegistry.registry))\n"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'systeme_notification.settings'}
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        for urgence in ('Epidemie', 'Incendie', 'Innondation', 'Securite'):
+            self.assertIn(urgence, output)
+
+
+class EvacuationBrokerOutageTests(TransactionTestCase):
+    # Hors transaction (autocommit), les tâches partent dès l'enregistrement
+    def test_broker_outage_returns_503_and_fails_the_dispatch(self):
+        with mock.patch.object(tasks.group, 'apply_async', side_effect=OperationalError("broker injoignable")), \
+                self.assertLogs('notifications.tasks', level='ERROR'):
+            response = self.client.post('/api/api/evacuation/incendie/')
+        self.assertEqual(response.status_code, 503)
+        dispatch = EvacuationDispatch.objects.get()
+        self.assertEqual(dispatch.status, ChannelDelivery.STATUS_FAILED)
+        self.assertIsNotNone(dispatch.finished_at)
+        self.assertIn("broker injoignable", dispatch.channels.first().error)
+
+
+@fast_password_hashers
+class BroadcastBrokerOutageTests(TransactionTestCase):
+    def test_broker_outage_returns_503_and_fails_the_broadcast(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse'))
+        with mock.patch.object(tasks.run_broadcast, 'delay', side_effect=OperationalError("broker injoignable")), \
+                self.assertLogs('notifications.tasks', level='ERROR'):
+            response = self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte', 'priority': 'haute'})
+        self.assertEqual(response.status_code, 503)
+        broadcast = Broadcast.objects.get()
+        self.assertEqual(broadcast.status, Broadcast.STATUS_FAILED)
+        self.assertIsNotNone(broadcast.finished_at)
+
+
+@fast_password_hashers
+class RealtimeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = create_user('alice')
+        self.bob = create_user('bob')
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.flush)()
+
+    def listen(self, group):
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(group, channel)
+        return channel
+
+    def receive(self, channel):
+        return async_to_sync(self.layer.receive)(channel)['payload']
+
+    def pending(self, channel):
+        queue = self.layer.channels.get(channel)
+        return queue.qsize() if queue else 0
+
+    def test_single_notification_is_published_to_user_group(self):
+        channel = self.listen(user_group(self.alice.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            notif = Notification.objects.create(destinataire=self.alice, message="Bonjour")
+        payload = self.receive(channel)
+        self.assertEqual((payload['kind'], payload['id'], payload['message']), ('notification', notif.pk, "Bonjour"))
+
+    def test_campus_broadcast_is_published_once(self):
+        campus = self.listen(CAMPUS_GROUP)
+        alice = self.listen(user_group(self.alice.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            BroadcastFanOut(batch_size=1).start("Alerte campus", priority='urgente')
+        payload = self.receive(campus)
+        self.assertEqual((payload['kind'], payload['count']), ('broadcast', 2))
+        self.assertEqual(self.pending(alice), 0)
+        self.assertEqual(self.pending(campus), 0)
+
+    def test_filtered_broadcast_goes_to_each_recipient(self):
+        campus = self.listen(CAMPUS_GROUP)
+        bob = self.listen(user_group(self.bob.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.broadcast("Pour Bob", user_filter=Q(username='bob'))
+        self.assertEqual(self.receive(bob)['message'], "Pour Bob")
+        self.assertEqual(self.pending(campus), 0)
+
+    def test_segment_broadcast_is_published_in_batches(self):
+        alice, bob = self.listen(user_group(self.alice.pk)), self.listen(user_group(self.bob.pk))
+        with mock.patch('notifications.realtime.PUBLISH_BATCH_SIZE', 1), \
+                mock.patch('notifications.tasks.publish_broadcast_batch.delay',
+                           wraps=tasks.publish_broadcast_batch.delay) as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            BroadcastFanOut(segment='all').start("Alerte ciblée")
+        self.assertEqual(delay.call_count, 2)
+        self.assertEqual((self.receive(alice)['message'], self.receive(bob)['message']), ("Alerte ciblée",) * 2)
+
+    def test_channel_layer_outage_does_not_fail_writes(self):
+        with mock.patch.object(type(self.layer), 'group_send', side_effect=ConnectionError("redis arrêté")), \
+                self.assertLogs('notifications.realtime', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(destinataire=self.alice, message="Bonjour")
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.broadcast("Pour Bob", user_filter=Q(username='bob'))
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_consumer_joins_user_and_campus_groups(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/notifications/')
+            communicator.scope['user'] = self.alice
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await self.layer.group_send(user_group(self.alice.pk), {'type': 'notification.message', 'payload': {'id': 1}})
+            self.assertEqual(await communicator.receive_json_from(), {'id': 1})
+            await self.layer.group_send(CAMPUS_GROUP, {'type': 'notification.message', 'payload': {'id': 2}})
+            self.assertEqual(await communicator.receive_json_from(), {'id': 2})
+            await communicator.disconnect()
+
+            anonymous = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/notifications/')
+            anonymous.scope['user'] = AnonymousUser()
+            connected, _ = await anonymous.connect()
+            self.assertFalse(connected)
+        async_to_sync(scenario)()
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+
+    def test_registry_histogram_and_prometheus_text(self):
+        registry = MetricsRegistry(flush_interval=0)
+        registry.record('Epidemie', 'speaker', 200_000)
+        registry.record('Epidemie', 'speaker', 3_000_000_000, error=True)
+        series = registry.snapshot()[('Epidemie', 'speaker')]
+        self.assertEqual((series['calls'], series['errors']), (2, 1))
+        self.assertAlmostEqual(series['sum_seconds'], 3.0002)
+        self.assertEqual((series['buckets'][0], series['buckets'][-1]), (1, 2))
+        text = render_prometheus(registry.snapshot())
+        self.assertIn('notifications_method_calls_total{class="Epidemie",method="speaker"} 2', text)
+        self.assertIn('notifications_method_duration_seconds_bucket{class="Epidemie",method="speaker",le="+Inf"} 2', text)
+
+    def test_snapshot_includes_unflushed_buffers_of_other_threads(self):
+        registry = MetricsRegistry(flush_interval=3600)
+        workers = [
+            threading.Thread(target=lambda: [registry.record('Incendie', 'set_alarm', 1000) for _ in range(100)])
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(registry.snapshot()[('Incendie', 'set_alarm')]['calls'], 400)
+        # Tampons des threads terminés reversés puis oubliés
+        self.assertEqual(registry._buffers, {})
+        self.assertEqual(registry.snapshot()[('Incendie', 'set_alarm')]['calls'], 400)
+
+    def test_evacuation_is_measured_without_console_output(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            Innondation().evacuer()
+        self.assertEqual(output.getvalue(), '')
+        snapshot = metrics_registry.snapshot()
+        for method in ('evacuer', 'evacuer.total', 'set_alarm', 'speaker', 'send_notifications'):
+            self.assertEqual(snapshot[('Innondation', method)]['calls'], 1)
+
+    @fast_password_hashers
+    @override_settings(NOTIFICATIONS_METRICS_TOKEN='jeton-prometheus')
+    def test_metrics_endpoint(self):
+        Securite().evacuer()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer jeton-prometheus').status_code, 200
+        )
+        self.client.force_login(create_user('exploitant', is_staff=True))
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('method="send_notifications"', response.content.decode())
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Les transitions sont journalisées en WARNING : silence pendant les tests
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def failing(self):
+        raise RuntimeError("passerelle indisponible")
+
+    def trip(self, breaker, calls):
+        for _ in range(calls):
+            with self.assertRaises(RuntimeError):
+                breaker.call(self.failing)
+
+    def test_opens_on_failure_rate_and_fails_fast(self):
+        breaker = CircuitBreaker('Test.sms', minimum_calls=4, failure_rate_threshold=0.5)
+        breaker.call(lambda: 'ok')
+        self.trip(breaker, 2)
+        self.assertEqual(breaker.state, circuit.CLOSED)
+        self.trip(breaker, 1)
+        self.assertEqual(breaker.state, circuit.OPEN)
+        called = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(called)
+        called.assert_not_called()
+
+    def test_opens_on_slow_calls(self):
+        breaker = CircuitBreaker('Test.slow', minimum_calls=2, slow_call_duration=0)
+        breaker.call(lambda: 'ok')
+        breaker.call(lambda: 'ok')
+        self.assertEqual(breaker.state, circuit.OPEN)
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker('Test.probe', minimum_calls=1, open_timeout=30)
+        self.trip(breaker, 1)
+        with mock.patch('notifications.circuit.time.time', return_value=circuit.time.time() + 31):
+            self.assertTrue(breaker.allow_request())
+            self.assertEqual(breaker.state, circuit.HALF_OPEN)
+            # Un autre worker est refusé tant que l'essai est en cours
+            self.assertFalse(CircuitBreaker('Test.probe').allow_request())
+            breaker.record(False, 0.01)
+        self.assertEqual(breaker.state, circuit.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('Test.reopen', minimum_calls=1, open_timeout=30)
+        self.trip(breaker, 1)
+        with mock.patch('notifications.circuit.time.time', return_value=circuit.time.time() + 31):
+            self.trip(breaker, 1)
+        self.assertEqual(breaker.state, circuit.OPEN)
+
+    def test_concurrent_outcomes_are_all_counted(self):
+        breaker = CircuitBreaker('Test.concurrent', window_size=1000, minimum_calls=1000)
+        loaded = breaker._load
+
+        def slow_load():
+            # Élargit la fenêtre entre lecture et écriture de l'état
+            data = loaded()
+            time.sleep(0.0005)
+            return data
+        with mock.patch.object(breaker, '_load', slow_load):
+            workers = [
+                threading.Thread(target=lambda: [breaker.record(True, 0.01) for _ in range(20)])
+                for _ in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(breaker._load()['outcomes']), 80)
+
+    def test_transition_listener(self):
+        transitions = []
+        listener = lambda *args: transitions.append(args)
+        circuit.add_transition_listener(listener)
+        self.addCleanup(circuit.remove_transition_listener, listener)
+        self.trip(CircuitBreaker('Test.hook', minimum_calls=1), 1)
+        self.assertEqual(transitions, [('Test.hook', circuit.CLOSED, circuit.OPEN)])
+        self.assertIn('notifications_circuit_state{circuit="Test.hook"} 2', circuit.render_prometheus())
+
+    def test_channel_breakers_are_per_class_and_channel(self):
+        self.assertEqual(set(Incendie.circuit_breakers), set(Incendie.channels))
+        self.assertEqual(Incendie.circuit_breakers['speaker'].name, 'Incendie.speaker')
+        Incendie.circuit_breakers['speaker'].reset()
+        cache.set('circuit:Incendie.speaker', {'state': circuit.OPEN, 'opened_at': circuit.time.time(), 'outcomes': []})
+        with self.assertRaises(CircuitOpenError):
+            Incendie().run_channel('speaker')
+        self.assertEqual(Incendie().run_channel('set_alarm'), "Alarme activée")
+        self.assertEqual(Epidemie().run_channel('speaker'), "Haut-parleur activé")
+        self.assertIsNone(Incendie().evacuer())
+
+
+@fast_password_hashers
+class DeliveryEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FakeSMSGateway.outbox.clear()
+        FakePushGateway.outbox.clear()
+        self.users = [create_user(f'etu{i}', phone=f'+3360000{i:04d}', email_perso=f'etu{i}@campus.fr') for i in range(25)]
+
+    def test_channels_are_registered_through_channel_meta(self):
+        for name in ('sms', 'push', 'email'):
+            self.assertEqual(ChannelRegistry.get(name).channel_name, name)
+        self.assertIsNone(ChannelRegistry.get('channel'))
+
+    def test_recipients_are_sent_in_batches(self):
+        engine = DeliveryEngine(workers=2, batch_size=10)
+        report = engine.deliver(User.objects.all(), {'subject': 'Alerte', 'message': 'Evacuez'})
+        engine.close()
+        for name in ('sms', 'push', 'email'):
+            self.assertEqual(report[name], {'sent': 25, 'batches': 3, 'failed': 0})
+        self.assertEqual(len(FakeSMSGateway.outbox), 3)
+        self.assertEqual(sorted(n for entry in FakeSMSGateway.outbox for n in entry['to']),
+                         sorted(u.phone_db for u in self.users))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(sum(len(m.bcc) for m in mail.outbox), 25)
+        # Les connexions sont réutilisées d'un lot à l'autre
+        self.assertLessEqual(engine.channels['sms'].pool.opened, 2)
+
+    def test_placeholder_contacts_are_not_addresses(self):
+        # Comme l'import en masse : coordonnées par défaut du modèle
+        User.objects.bulk_create([User(username='sans_coordonnees')])
+        engine = DeliveryEngine(channels=['sms', 'email'], workers=1, batch_size=100)
+        for users in (User.objects.all(), None):
+            FakeSMSGateway.outbox.clear()
+            mail.outbox.clear()
+            report = engine.deliver(users, {'message': 'Evacuez'})
+            self.assertEqual((report['sms']['sent'], report['email']['sent']), (25, 25))
+            self.assertNotIn('+0000000000', FakeSMSGateway.outbox[0]['to'])
+        engine.close()
+
+    def test_failed_batch_is_reported(self):
+        engine = DeliveryEngine(channels=['sms'], workers=1, batch_size=10)
+        with mock.patch.object(FakeSMSGateway, 'send_bulk', side_effect=[10, ConnectionError, 5]), \
+                self.assertLogs('notifications.delivery', 'ERROR'):
+            report = engine.deliver(User.objects.all(), {'message': 'Evacuez'})
+        self.assertEqual(report['sms'], {'sent': 15, 'batches': 3, 'failed': 10})
+
+    def test_send_notifications_uses_delivery_engine(self):
+        result = Incendie().send_notifications("Evacuez immédiatement")
+        self.assertEqual(result, "Notification envoyée : Evacuez immédiatement")
+        self.assertEqual(sum(len(entry['to']) for entry in FakePushGateway.outbox), 25)
+        self.assertEqual(mail.outbox[0].subject, 'Incendie')
+
+    def test_throughput_benchmark(self):
+        result = measure_throughput(100, latency=0, batch_size=50)
+        self.assertEqual(result['batches'], 4)
+
+
+class PriorityDispatcherTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_urgente_first_and_fifo_within_priority(self):
+        dispatcher = PriorityDispatcher()
+        for item, priority in [(1, 'faible'), (2, 'haute'), (3, 'urgente'), (4, 'haute'), (5, 'moyenne')]:
+            dispatcher.schedule(item, priority, now=self.now)
+        delivered = []
+        self.assertEqual(dispatcher.drain(lambda item, priority: delivered.append(item), now=self.now), 5)
+        self.assertEqual(delivered, [3, 2, 4, 5, 1])
+
+    def test_non_urgent_held_until_window_opens(self):
+        dispatcher = PriorityDispatcher()
+        opens = self.now + timedelta(hours=1)
+        dispatcher.schedule('rappel', 'haute', not_before=opens, now=self.now)
+        dispatcher.schedule('alerte', 'urgente', not_before=opens, now=self.now)
+        self.assertEqual(dispatcher.pop(self.now), ('alerte', 'urgente'))
+        self.assertIsNone(dispatcher.pop(self.now))
+        self.assertEqual(dispatcher.next_release(), opens)
+        self.assertEqual(dispatcher.stats()['waiting'], 1)
+        self.assertEqual(dispatcher.pop(opens), ('rappel', 'haute'))
+
+    def test_closed_window_is_not_dispatched(self):
+        dispatcher = PriorityDispatcher()
+        closes = self.now + timedelta(hours=1)
+        dispatcher.schedule('rappel', 'moyenne', not_after=closes, now=self.now)
+        dispatcher.schedule('alerte', 'urgente', not_after=closes, now=self.now)
+        dispatcher.schedule_many([('bilan', 'faible', self.now, closes)], now=self.now)
+        later = closes + timedelta(minutes=1)
+        self.assertEqual(dispatcher.pop(later), ('alerte', 'urgente'))
+        self.assertIsNone(dispatcher.pop(later))
+        stats = dispatcher.stats()
+        self.assertEqual((stats['expired'], stats['by_priority']['moyenne'], len(dispatcher)), (2, 0, 0))
+
+    def test_schedule_many_and_stats(self):
+        dispatcher = PriorityDispatcher()
+        later = self.now + timedelta(hours=2)
+        dispatcher.schedule_many([(i, 'faible', later) for i in range(10)] + [(10, 'urgente', later)], now=self.now)
+        stats = dispatcher.stats()
+        self.assertEqual((stats['ready'], stats['waiting']), (1, 10))
+        self.assertEqual(stats['by_priority']['faible'], 10)
+        dispatcher.drain(lambda item, priority: None, now=later, limit=4)
+        stats = dispatcher.stats()
+        self.assertEqual((stats['dispatched'], len(dispatcher)), (4, 7))
+        self.assertIsNotNone(stats['throughput'])
+
+    @fast_password_hashers
+    def test_schedule_notifications_from_queryset(self):
+        user = create_user('etu')
+        Notification.objects.create(message='a', destinataire=user)
+        dispatcher = PriorityDispatcher()
+        self.assertEqual(schedule_notifications(dispatcher, Notification.objects.all()), 1)
+
+    @fast_password_hashers
+    def test_default_window_never_expires(self):
+        # Fenêtre par défaut : début et fin à la création, dans le passé
+        create_user('sans_fenetre')
+        Notification.objects.broadcast("Rappel", priority='faible')
+        dispatcher = PriorityDispatcher()
+        self.assertEqual(schedule_notifications(dispatcher, Notification.objects.all()), 1)
+        delivered = []
+        dispatcher.drain(lambda item, priority: delivered.append(item), now=timezone.now() + timedelta(days=1))
+        self.assertEqual((len(delivered), dispatcher.stats()['expired']), (1, 0))
+
+
+@fast_password_hashers
+class StatsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = create_user('alice')
+        self.admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+
+    def test_stats_api_is_cached_until_a_notification_is_written(self):
+        self.assertEqual(self.client.get(reverse('stats_api')).json()['total_notifications'], 0)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('stats_api'))
+        Notification.objects.create(destinataire=self.alice, message="Un")
+        self.assertEqual(self.client.get(reverse('stats_api')).json()['total_notifications'], 1)
+        Notification.objects.broadcast("Deux")
+        self.assertEqual(self.client.get(reverse('stats_api')).json()['total_notifications'], 3)
+
+    def test_admin_dashboard_computed_once_per_change(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('admin_dashboard'))
+        with self.assertNumQueries(2):  # session + utilisateur
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_notifications'], 0)
+        Notification.objects.broadcast("Alerte")
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).context['total_notifications'], 2)
+
+    def test_user_dashboard_invalidated_by_reads(self):
+        Notification.objects.create(destinataire=self.alice, message="Un")
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('user_dashboard')).context['unread_notifications'], 1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('user_dashboard'))
+        self.client.post(reverse('mark_notifications_read'))
+        self.assertEqual(self.client.get(reverse('user_dashboard')).context['unread_notifications'], 0)
+
+    def test_single_flight_serves_stale_value_while_recomputing(self):
+        compute = mock.Mock(return_value='v1')
+        self.assertEqual(get_or_compute('test:stats@1', compute), 'v1')
+        # Un autre processus recalcule la version 2 : la valeur précédente est servie
+        cache.add('test:stats@2:lock', 1)
+        self.assertEqual(get_or_compute('test:stats@2', mock.Mock(return_value='v2')), 'v1')
+        self.assertEqual(compute.call_count, 1)
+
+    @override_settings(NOTIFICATIONS_CACHE={'wait': 0.1})
+    def test_single_flight_waits_then_computes_without_stale_value(self):
+        cache.add('test:other@1:lock', 1)
+        self.assertEqual(get_or_compute('test:other@1', lambda: 'calculée'), 'calculée')
+
+    @override_settings(NOTIFICATIONS_CACHE={'timeout': 100, 'jitter': 0.2})
+    def test_timeout_jitter(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            get_or_compute('test:jitter@1', lambda: 1)
+        self.assertTrue(100 <= cache_set.call_args_list[0].kwargs['timeout'] <= 120)
+
+
+@fast_password_hashers
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.alice = create_user('alice')
+        self.bob = create_user('bob')
+        Notification.objects.broadcast("Récente")
+        for age in (400, 500):
+            Notification.objects.broadcast(f"Il y a {age} jours")
+            Notification.objects.filter(message=f"Il y a {age} jours").update(
+                created_at=timezone.now() - timedelta(days=age)
+            )
+
+    def read_archive(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_archives_then_deletes_in_chunks(self):
+        result = archive_notifications(days=365, directory=self.directory.name, chunk_size=3)
+        self.assertEqual((result['archived'], result['deleted']), (4, 4))
+        rows = self.read_archive(result['path'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(set(rows[0]), {'id', 'message', 'destinataire_id', 'priority', 'time_window_start',
+                                        'time_window_end', 'created_at', 'read_at'})
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ["Récente"] * 2)
+        # Les compteurs suivent les suppressions
+        self.assertEqual(NotificationCounter.for_user(self.alice).total, 1)
+
+    def test_dry_run_and_nothing_to_archive(self):
+        result = archive_notifications(days=365, directory=self.directory.name, dry_run=True)
+        self.assertEqual(result['archived'], 4)
+        self.assertEqual(Notification.objects.count(), 6)
+        result = archive_notifications(days=1000, directory=self.directory.name)
+        self.assertIsNone(result['path'])
+
+    def test_command(self):
+        output = StringIO()
+        call_command('archive_notifications', days=450, directory=self.directory.name, stdout=output)
+        self.assertIn('2 notifications archivées', output.getvalue())
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_partitioning_requires_postgresql(self):
+        with self.assertRaisesMessage(ValueError, 'PostgreSQL'):
+            partition_table()
+        with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+            call_command('partition_notifications', convert=True, stdout=StringIO())
+
+
+@fast_password_hashers
+class BenchSuiteTests(TestCase):
+    def setUp(self):
+        suite.seed(users=5, notifications=40)
+
+    def test_run_suite_measures_every_scenario(self):
+        cache.set('partage', 1)
+        users = User.objects.count()
+        results = suite.run_suite(repeat=2)
+        self.assertEqual(set(results), {
+            'broadcast_fanout', 'user_dashboard', 'admin_dashboard', 'stats_api',
+            'notification_list', 'evacuation_dispatch',
+        })
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['max_ms'])
+            self.assertGreater(result['queries'], 0)
+        # Rien n'est conservé : ni diffusion, ni administrateur de mesure, ni cache vidé
+        self.assertFalse(Notification.objects.filter(message="Mesure de diffusion").exists())
+        self.assertEqual(User.objects.count(), users)
+        self.assertEqual(cache.get('partage'), 1)
+
+    def test_slowdown_fails_the_run(self):
+        baseline = {'stats_api': {'p50_ms': 0.001}, 'inconnu': {'p50_ms': 1}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fh:
+            json.dump(baseline, fh)
+        self.addCleanup(os.unlink, fh.name)
+        with self.assertRaisesMessage(CommandError, 'stats_api'):
+            call_command('bench', only=['stats_api'], repeat=2, baseline=fh.name, max_slowdown=1.5, stdout=StringIO())
+        self.assertEqual(suite.compare({'stats_api': {'p50_ms': 10}}, {'stats_api': {'p50_ms': 9}}, 1.2), [])
+
+
+@fast_password_hashers
+class QueryProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('profil')
+        for index in range(3):
+            Notification.objects.create(destinataire=self.user, message=f"Message {index}")
+
+    def test_profile_detects_repeated_statements(self):
+        with profiling.profile_queries() as profile:
+            [str(notif) for notif in Notification.objects.all()]
+        # Une requête pour la liste, puis une par ``destinataire`` (N+1)
+        self.assertEqual(profile.count, 4)
+        self.assertEqual(list(profile.duplicates().values()), [3])
+        self.assertEqual(len(profile.slowest(2)), 2)
+
+        with profiling.profile_queries() as profile:
+            [str(notif) for notif in Notification.objects.select_related('destinataire')]
+        self.assertEqual(profile.count, 1)
+        self.assertEqual(profile.duplicates(), {})
+
+    def test_fingerprint_folds_in_lists(self):
+        self.assertEqual(
+            profiling.fingerprint('SELECT *  FROM t\nWHERE id IN (%s, %s, %s)'),
+            profiling.fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    @override_settings(NOTIFICATIONS_PROFILING={'sample_rate': 1.0, 'duplicate_threshold': 2, 'header': True})
+    def test_middleware_sets_header_and_logs(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('notifications.profiling', level='INFO') as logs:
+            response = self.client.get(reverse('notification-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        report = logs.records[0].profile
+        self.assertEqual(report['path'], reverse('notification-list'))
+        self.assertGreater(report['queries'], 0)
+
+    @override_settings(NOTIFICATIONS_PROFILING={'sample_rate': 1.0})
+    def test_header_is_reserved_to_staff_outside_debug(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('notifications.profiling', level='INFO'):
+            response = self.client.get(reverse('notification-list'))
+        self.assertNotIn('Server-Timing', response)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        with self.assertLogs('notifications.profiling', level='INFO'):
+            response = self.client.get(reverse('notification-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    @override_settings(NOTIFICATIONS_PROFILING={'sample_rate': 0.0})
+    def test_middleware_skips_unsampled_requests(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('notification-list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@fast_password_hashers
+class NotificationAdminTests(TestCase):
+    def setUp(self):
+        self.admin = create_user('admin_liste', is_staff=True, is_superuser=True)
+        self.url = reverse('admin:notifications_notification_changelist')
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for index in range(3):
+            Notification.objects.create(destinataire=create_user(f'liste{index}'), message=f"Alerte {index}")
+        _, few = self.changelist_queries()
+        for index in range(3, 10):
+            Notification.objects.create(destinataire=create_user(f'liste{index}'), message=f"Alerte {index}")
+        _, many = self.changelist_queries()
+        self.assertEqual(few, many)
+
+    def test_search_by_message_and_username(self):
+        Notification.objects.create(destinataire=create_user('alice'), message="Fuite de gaz bâtiment B")
+        Notification.objects.create(destinataire=create_user('bob'), message="Exercice incendie")
+        response, _ = self.changelist_queries(q='gaz')
+        self.assertEqual([n.message for n in response.context['cl'].result_list], ["Fuite de gaz bâtiment B"])
+        # Le nom d'utilisateur est cherché n'importe où, pas seulement en préfixe
+        response, _ = self.changelist_queries(q='ob')
+        self.assertEqual([n.message for n in response.context['cl'].result_list], ["Exercice incendie"])
+
+    def test_paginator_counts_exactly_outside_postgresql(self):
+        Notification.objects.create(destinataire=self.admin, message="Test")
+        self.assertIsNone(EstimatedCountPaginator.estimated_count(Notification.objects.all()))
+        self.assertEqual(EstimatedCountPaginator(Notification.objects.order_by('pk'), 10).count, 1)
+
+
+@fast_password_hashers
+class NotificationSearchTests(TestCase):
+    def setUp(self):
+        self.user = create_user('recherche')
+        self.other = create_user('autre')
+        self.url = reverse('notification-search')
+        Notification.objects.create(destinataire=self.user, message="Fuite de gaz au bâtiment B, évacuez")
+        Notification.objects.create(destinataire=self.other, message="Bâtiment B : bâtiment fermé, bâtiment B inaccessible")
+        Notification.objects.create(destinataire=self.user, message="Exercice incendie au bâtiment A")
+        Notification.objects.bulk_create([Notification(destinataire=self.other, message="Coupure réseau")])
+
+    def test_search_is_ranked_and_accent_insensitive(self):
+        response = self.client.get(self.url, {'q': 'batiment b'})
+        self.assertEqual(response.status_code, 200)
+        messages = [row['message'] for row in response.json()['results']]
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith("Bâtiment B : bâtiment fermé"))
+        scores = [row['score'] for row in response.json()['results']]
+        self.assertGreater(scores[0], scores[1])
+
+    def test_search_applies_list_filters_and_sees_bulk_rows(self):
+        response = self.client.get(self.url, {'q': 'bâtiment', 'destinataire': self.user.pk})
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get(self.url, {'q': 'réseau'})
+        self.assertEqual([row['message'] for row in response.json()['results']], ["Coupure réseau"])
+
+    def test_keyset_pages_cover_all_matches(self):
+        seen, url, params = [], self.url, {'q': 'bâtiment', 'page_size': 1}
+        while url:
+            data = self.client.get(url, params).json()
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(len(set(seen)), 3)
+
+    def test_search_index_follows_updates_and_deletes(self):
+        notif = Notification.objects.get(message="Coupure réseau")
+        notif.message = "Coupure électrique"
+        notif.save()
+        self.assertEqual(self.client.get(self.url, {'q': 'réseau'}).json()['results'], [])
+        notif.delete()
+        self.assertEqual(self.client.get(self.url, {'q': 'électrique'}).json()['results'], [])
+
+    def test_keyset_pages_through_equal_scores(self):
+        Notification.objects.bulk_create([Notification(message="Alerte tempête") for _ in range(5)])
+        seen, url, params = [], self.url, {'q': 'tempête', 'page_size': 2}
+        while url:
+            data = self.client.get(url, params).json()
+            seen.extend(row['id'] for row in data['results'])
+            self.assertEqual(len({row['score'] for row in data['results']}), 1)
+            url, params = data['next'], None
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_other_databases_fall_back_to_icontains(self):
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            response = self.client.get(self.url, {'q': 'bâtiment B', 'page_size': 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['score'], 0.0)
+            response = self.client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'q': '  '}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': '?!, …'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': 'gaz', 'cursor': 'invalide'}).status_code, 404)
+
+
+@fast_password_hashers
+class UserImportTests(TestCase):
+    CSV = (
+        "username,email,phone,priority,password\n"
+        "etu1,etu1@campus.fr,+33612345678,Haute,secret1\n"
+        "etu2,pas-un-email,+33612345678,faible,secret2\n"
+        "etu3,etu3@campus.fr,,,\n"
+        "etu1,autre@campus.fr,,,\n"
+        ",sans@nom.fr,,urgente,\n"
+    )
+
+    def import_csv(self, content=None, **options):
+        return importing.import_users(importing.read_rows(StringIO(content or self.CSV), 'csv'), **options)
+
+    def test_valid_rows_are_created_and_invalid_rows_reported(self):
+        report = self.import_csv(chunk_size=2)
+        self.assertEqual((report['read'], report['created']), (5, 2))
+        self.assertEqual([reject['line'] for reject in report['rejected']], [3, 5, 6])
+        self.assertIn("username en double dans le fichier", report['rejected'][1]['errors'])
+        etu1 = User.objects.get(username='etu1')
+        self.assertEqual((etu1.priority_db, etu1.phone_db), ('haute', '+33612345678'))
+        self.assertTrue(etu1.check_password('secret1'))
+        # Sans mot de passe dans le fichier : compte inutilisable (SSO)
+        self.assertFalse(User.objects.get(username='etu3').has_usable_password())
+
+    def test_existing_users_are_skipped_or_updated(self):
+        create_user('etu1')
+        User.objects.filter(username='etu1').update(email='ancien@campus.fr')
+        report = self.import_csv()
+        self.assertEqual((report['created'], report['skipped']), (1, 1))
+        self.assertEqual(User.objects.get(username='etu1').email, 'ancien@campus.fr')
+
+        report = self.import_csv(update=True)
+        self.assertEqual((report['created'], report['updated']), (0, 2))
+        etu1 = User.objects.get(username='etu1')
+        self.assertEqual(etu1.email, 'etu1@campus.fr')
+        self.assertTrue(etu1.check_password('motdepasse'))
+
+    def test_update_touches_only_file_columns_and_keeps_passwords(self):
+        create_user('etu1', first_name='Ada', priority='haute')
+        content = "username,email,password\netu1,etu1@campus.fr,nouveau\netu4,etu4@campus.fr,secret4\n"
+        with mock.patch.object(importing, '_hash_password', wraps=importing._hash_password) as hashed:
+            report = self.import_csv(content, update=True)
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        # Seul le compte créé voit son mot de passe haché
+        hashed.assert_called_once_with('secret4')
+        etu1 = User.objects.get(username='etu1')
+        self.assertEqual((etu1.email, etu1.first_name, etu1.priority_db), ('etu1@campus.fr', 'Ada', 'haute'))
+        self.assertTrue(etu1.check_password('motdepasse'))
+
+        self.import_csv(content, update=True, update_passwords=True)
+        self.assertTrue(User.objects.get(username='etu1').check_password('nouveau'))
+
+    def test_sso_and_dry_run(self):
+        report = self.import_csv(dry_run=True)
+        self.assertEqual((report['created'], len(report['rejected'])), (0, 3))
+        self.assertFalse(User.objects.exists())
+        self.import_csv(unusable_passwords=True)
+        self.assertFalse(User.objects.get(username='etu1').has_usable_password())
+
+    def test_command_reads_jsonl_and_writes_rejects(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, rejects = f'{directory}/etudiants.jsonl', f'{directory}/rejets.csv'
+            with open(source, 'w', encoding='utf-8') as fh:
+                fh.write('{"username": "j1", "email": "j1@campus.fr"}\n{"username": "j2", "priority": "max"}\nnon json\n')
+            out = StringIO()
+            call_command('import_users', source, workers=0, rejects=rejects, stdout=out)
+            self.assertIn("1 créés", out.getvalue())
+            with open(rejects, encoding='utf-8') as fh:
+                self.assertEqual(len(fh.read().strip().splitlines()), 3)
+        self.assertTrue(User.objects.filter(username='j1').exists())
+
+
+@fast_password_hashers
+class UserFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('fil')
+        self.client.force_login(self.user)
+
+    def add(self, count):
+        Notification.objects.bulk_create([
+            Notification(destinataire=self.user, message=f"Message {index}") for index in range(count)
+        ])
+        # ``bulk_create`` n'envoie pas ``post_save`` : invalidation explicite
+        caching.bump(f'user:{self.user.pk}')
+
+    def test_dashboard_renders_only_first_page(self):
+        self.add(FEED_PAGE_SIZE + 5)
+        response = self.client.get(reverse('user_dashboard'))
+        self.assertEqual(response.content.decode().count('class="notification-item'), FEED_PAGE_SIZE)
+        self.assertTrue(response.context['next_url'].startswith(reverse('user_feed')))
+
+    def test_feed_pages_cover_history_once(self):
+        self.add(2 * FEED_PAGE_SIZE + 3)
+        ids, url = [], reverse('user_feed')
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(re.findall(r'Message (\d+)', data['html']))
+            url = data['next']
+        self.assertEqual(len(ids), 2 * FEED_PAGE_SIZE + 3)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_first_page_cached_until_new_notification(self):
+        self.add(1)
+        self.client.get(reverse('user_feed'))
+        with self.assertNumQueries(2):  # session + utilisateur
+            self.client.get(reverse('user_feed'))
+        Notification.objects.create(destinataire=self.user, message="Nouvelle alerte")
+        self.assertIn("Nouvelle alerte", self.client.get(reverse('user_feed')).json()['html'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('user_feed'), {'cursor': 'invalide'}).status_code, 400)
+
+
+@fast_password_hashers
+class FastSerializationTests(TestCase):
+    def setUp(self):
+        self.user = create_user('rapide')
+        Notification.objects.create(destinataire=self.user, message="Alerte gaz", priority='haute')
+        Notification.objects.create(destinataire=None, message="Sans destinataire")
+        Notification.objects.mark_read(self.user)
+
+    def test_values_serializer_matches_model_serializer(self):
+        queryset = Notification.objects.order_by('pk')
+        fast = NotificationValuesSerializer()
+        self.assertEqual(
+            fast.to_representation(fast.select(queryset)),
+            [dict(row) for row in NotificationSerializer(queryset, many=True).data],
+        )
+
+    def test_list_renders_json_and_msgpack(self):
+        url = reverse('notification-list')
+        as_json = self.client.get(url, {'page_size': 1})
+        self.assertEqual(as_json['Content-Type'], 'application/json')
+        as_msgpack = self.client.get(url, {'page_size': 1}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(as_msgpack['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(as_msgpack.content), as_json.json())
+        # Le curseur est calculé sur les tuples du chemin rapide
+        self.assertEqual(len(self.client.get(as_json.json()['next']).json()['results']), 1)
+
+    def test_serialization_benchmark(self):
+        results = compare_serialization(rows=10, repeat=1)
+        self.assertEqual(results['values+msgpack']['rows'], 2)
+        self.assertIn('model_serializer+json', results)
+
+
+@fast_password_hashers
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('conditionnel')
+        self.client.force_login(self.user)
+
+    def assertRevalidates(self, url, queries):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(queries):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+        return response['ETag']
+
+    def test_stats_api_not_modified_without_queries(self):
+        self.client.logout()
+        etag = self.assertRevalidates(reverse('stats_api'), queries=0)
+        Notification.objects.create(destinataire=self.user, message="Alerte")
+        self.assertEqual(self.client.get(reverse('stats_api'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_stats_api_expires_with_time_windows(self):
+        # Sans écriture, les compteurs 24 h / 7 j changent quand même avec l'heure
+        response = self.client.get(reverse('stats_api'))
+        later = time.time() + caching.get_settings()['timeout']
+        with mock.patch('notifications.conditional.time.time', return_value=later):
+            self.assertEqual(
+                self.client.get(reverse('stats_api'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200
+            )
+            self.assertEqual(
+                self.client.get(reverse('stats_api'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200
+            )
+
+    def test_list_changes_when_a_notification_is_read(self):
+        Notification.objects.create(destinataire=self.user, message="Alerte")
+        url = reverse('notification-list')
+        etag = self.assertRevalidates(url, queries=2)  # session + utilisateur
+        # Un autre format ou une autre page est une autre ressource
+        self.assertEqual(self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        Notification.objects.mark_read(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_dashboard_and_feed_follow_user_notifications(self):
+        for url in (reverse('user_dashboard'), reverse('user_feed')):
+            etag = self.assertRevalidates(url, queries=2)
+            Notification.objects.create(destinataire=self.user, message="Nouvelle")
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Un autre utilisateur n'obtient jamais la réponse du premier
+        other = create_user('autre_conditionnel')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('user_feed'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@fast_password_hashers
+class RecipientDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = create_user('annuaire_a', phone='+33611111111', email_perso='a@perso.fr', priority='haute')
+        self.bob = create_user('annuaire_b', phone='+33622222222', email_perso='b@perso.fr')
+        self.directory = RecipientDirectory()
+
+    def test_addresses_served_from_memory(self):
+        self.assertEqual(len(self.directory), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.directory.addresses('phone_db'), ['+33611111111', '+33622222222'])
+            self.assertEqual(self.directory.addresses('email_perso_db', [self.bob.pk]), ['b@perso.fr'])
+            self.assertEqual(self.directory.ids(priorities=['haute']), [self.alice.pk])
+        with self.assertRaises(ValueError):
+            self.directory.addresses('password')
+
+    def test_signals_update_directory_incrementally(self):
+        directory.ensure_current()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.is_active = False
+            self.bob.save()
+            carol = create_user('annuaire_c', phone='+33633333333')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.delete()
+        with self.assertNumQueries(0):
+            # Signaux appliqués à l'annuaire du processus : pas de rechargement
+            self.assertEqual(directory.ids(), [carol.pk])
+            self.assertEqual(directory.ids(active_only=False), [self.bob.pk, carol.pk])
+
+    def test_other_processes_reload_on_version_change(self):
+        self.directory.ensure_current()
+        User.objects.bulk_create([User(username='annuaire_bulk', phone_db='+33644444444')])
+        self.assertEqual(len(self.directory), 2)
+        RecipientDirectory.invalidate()
+        self.assertEqual(len(self.directory), 3)
+
+    def test_version_changes_only_after_commit(self):
+        version = caching.sequence(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.is_active = False
+            self.bob.save()
+            # Avant le commit, un autre processus ne doit pas voir de nouvelle version
+            self.assertEqual(caching.sequence(VERSION_KEY), version)
+        self.assertEqual(caching.sequence(VERSION_KEY), version + 1)
+
+    def test_interleaved_change_forces_reload(self):
+        directory.ensure_current()
+        # Écriture d'un autre processus, pas encore vue par cet annuaire
+        User.objects.bulk_create([User(username='annuaire_bulk', phone_db='+33644444444')])
+        RecipientDirectory.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.phone = '+33655555555'
+            self.bob.save()
+        self.assertEqual(sorted(directory.addresses('phone_db')), ['+33611111111', '+33644444444', '+33655555555'])
+
+    def test_login_does_not_invalidate(self):
+        version = caching.sequence(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.bob)
+        self.assertEqual(caching.sequence(VERSION_KEY), version)
+
+    def test_available_ids_follow_time_windows(self):
+        now = timezone.now()
+        User.objects.filter(pk=self.alice.pk).update(
+            time_window_start=now - timedelta(hours=1), time_window_end=now + timedelta(hours=1)
+        )
+        RecipientDirectory.invalidate()
+        self.assertEqual(self.directory.available_ids(now), [self.alice.pk])
+
+    def test_send_notifications_resolves_recipients_without_queries(self):
+        FakeSMSGateway.outbox.clear()
+        directory.ensure_current()
+        with self.assertNumQueries(0):
+            Incendie().send_notifications("Evacuez")
+        self.assertEqual(sorted(n for entry in FakeSMSGateway.outbox for n in entry['to']),
+                         ['+33611111111', '+33622222222'])
+
+
+@fast_password_hashers
+class AudienceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group_a = Group.objects.create(name='Bâtiment A')
+        self.group_b = Group.objects.create(name='B')
+        self.alice = create_user('segment_a', priority='haute')
+        self.bob = create_user('segment_b', priority='urgente')
+        self.carol = create_user('segment_c', priority='faible')
+        self.dave = create_user('segment_d', priority='urgente', is_active=False)
+        self.alice.groups.add(self.group_a)
+        self.bob.groups.add(self.group_b)
+        self.carol.groups.add(self.group_b)
+        self.index = AudienceIndex()
+
+    def test_bitmap_round_trip(self):
+        ids = [1, 7, 8, 64, 200_000]
+        self.assertEqual(members(bitmap(ids)), ids)
+        self.assertEqual(members(0), [])
+
+    def test_expressions_resolved_in_memory(self):
+        self.index.ensure_current()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.index.ids('active & (group:"Bâtiment A" | group:B) & priority >= haute'),
+                [self.alice.pk, self.bob.pk],
+            )
+            self.assertEqual(self.index.ids('not active'), [self.dave.pk])
+            self.assertEqual(self.index.ids('priority < moyenne'), [self.carol.pk])
+            self.assertEqual(self.index.ids('priority:urgente & !group:B'), [self.dave.pk])
+            self.assertEqual(self.index.count('all'), 4)
+
+    def test_invalid_expressions_rejected(self):
+        for expression in ('', 'group:Z', 'active &', '(active', 'active)', 'inconnu', 'priority >= maximale', 'active ; all'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                self.index.ids(expression)
+
+    def test_signals_update_bitmaps_incrementally(self):
+        audience.ensure_current()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dave.groups.add(self.group_a)
+            self.group_b.custom_user_groups.remove(self.carol)
+            self.bob.priority = 'faible'
+            self.bob.save()
+            erin = create_user('segment_e', priority='haute')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.delete()
+        with self.assertNumQueries(0):
+            # Signaux appliqués aux bitmaps du processus : pas de rechargement
+            self.assertEqual(audience.ids('group:"Bâtiment A"'), [self.dave.pk])
+            self.assertEqual(audience.ids('group:B'), [self.bob.pk])
+            self.assertEqual(audience.ids('active & priority >= haute'), [erin.pk])
+
+    def test_interleaved_change_forces_reload(self):
+        audience.ensure_current()
+        # Écriture d'un autre processus, pas encore vue par cet index
+        User.objects.filter(pk=self.carol.pk).update(is_active=False)
+        AudienceIndex.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.priority = 'faible'
+            self.bob.save()
+        self.assertEqual(audience.ids('active & priority:faible'), [self.bob.pk])
+
+    def test_login_does_not_invalidate(self):
+        version = caching.sequence(AUDIENCE_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.bob)
+        self.assertEqual(caching.sequence(AUDIENCE_VERSION_KEY), version)
+
+    def test_group_changes_reload_other_processes(self):
+        self.index.ensure_current()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group_b.name = 'Bâtiment B'
+            self.group_b.save()
+        self.assertEqual(self.index.ids('group:"Bâtiment B"'), [self.bob.pk, self.carol.pk])
+        with self.assertRaises(ValueError):
+            self.index.ids('group:B')
+
+    def test_window_segment(self):
+        now = timezone.now()
+        User.objects.filter(pk__in=[self.alice.pk, self.dave.pk]).update(
+            time_window_start=now - timedelta(hours=1), time_window_end=now + timedelta(hours=1)
+        )
+        RecipientDirectory.invalidate()
+        self.assertEqual(self.index.ids('window', now), [self.alice.pk])
+
+    def test_broadcast_view_targets_segment(self):
+        admin = User.objects.create_superuser('admin', 'admin@campus.fr', 'motdepasse')
+        self.client.force_login(admin)
+        segment = 'active & group:B & priority >= haute'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte B', 'priority': 'haute', 'segment': segment})
+        broadcast = Broadcast.objects.get()
+        self.assertEqual((broadcast.segment, broadcast.total_recipients, broadcast.sent_count), (segment, 1, 1))
+        self.assertEqual(list(Notification.objects.filter(message='Alerte B').values_list('destinataire', flat=True)),
+                         [self.bob.pk])
+        response = self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte', 'segment': 'group:Z'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('broadcast_notifications'), {'message': 'Alerte', 'segment': 'active | ' * 100 + 'all'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Broadcast.objects.count(), 1)
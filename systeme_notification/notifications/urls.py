@@ -2,36 +2,30 @@ from django.urls import path, include
 from django.shortcuts import redirect
 from django.contrib.auth import views as auth_views
 from rest_framework.routers import DefaultRouter
-<<<<<<< Updated upstream
-from .api import NotificationViewSet, EpidemieAPIView, IncendieAPIView, InnondationAPIView, SecuriteAPIView
-=======
 from .api import (
     NotificationViewSet,
     EpidemieAPIView,
     IncendieAPIView,
     InnondationAPIView,
     SecuriteAPIView,
+    EvacuationDispatchAPIView,
 )
 from .views import (
     user_dashboard,
+    user_feed,
     admin_dashboard,
     stats_api,
     CustomLoginView,
     broadcast_notifications,
+    broadcast_status,
+    mark_notifications_read,
+    unread_count_api,
 )
->>>>>>> Stashed changes
 
 router = DefaultRouter()
 router.register(r'notifications', NotificationViewSet)
 
 urlpatterns = [
-<<<<<<< Updated upstream
-    path('', include(router.urls)),
-    path('evacuation/epidemie/', EpidemieAPIView.as_view()),
-    path('evacuation/incendie/', IncendieAPIView.as_view()),
-    path('evacuation/innondation/', InnondationAPIView.as_view()),
-    path('evacuation/securite/', SecuriteAPIView.as_view()),
-=======
     # Page d'accueil : redirige vers le tableau de bord utilisateur
     path('', lambda request: redirect('dashboard/'), name='home'),
     # Authentification
@@ -42,18 +36,22 @@ urlpatterns = [
 
     # Dashboards
     path('dashboard/', user_dashboard, name='user_dashboard'),
+    path('dashboard/feed/', user_feed, name='user_feed'),
+    path('dashboard/read/', mark_notifications_read, name='mark_notifications_read'),
     path('dashboard/admin/', admin_dashboard, name='admin_dashboard'),
 
     # Envoi de notifications à tous les utilisateurs (admin uniquement)
     path('dashboard/admin/broadcast/', broadcast_notifications, name='broadcast_notifications'),
+    path('dashboard/admin/broadcast/<int:pk>/', broadcast_status, name='broadcast_status'),
     
     # API
     path('api/', include(router.urls)),
     path('api/stats/', stats_api, name='stats_api'),
+    path('api/unread-count/', unread_count_api, name='unread_count_api'),
     path('api/evacuation/epidemie/', EpidemieAPIView.as_view()),
     path('api/evacuation/incendie/', IncendieAPIView.as_view()),
     path('api/evacuation/innondation/', InnondationAPIView.as_view()),
     path('api/evacuation/securite/', SecuriteAPIView.as_view()),
->>>>>>> Stashed changes
+    path('api/evacuation/dispatch/<uuid:pk>/', EvacuationDispatchAPIView.as_view(), name='evacuation_dispatch_status'),
 ]
 
@@ -1,18 +1,31 @@
-<<<<<<< Updated upstream
-=======
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
-from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.shortcuts import redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.views import LoginView
 from django.db.models import Count, Q
 from django.utils import timezone
-from datetime import timedelta
+import hmac
 import json
->>>>>>> Stashed changes
 from rest_framework import viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from .api import evacuate
+from .caching import cached, get_settings as get_cache_settings
+from .conditional import conditional, session_vary, user_scopes
 from .core import Epidemie, Incendie, Innondation, Securite
+from .fanout import BroadcastFanOut
+from . import circuit
+from .metrics import registry as metrics_registry, render_prometheus
+from .models import PRIORITIES, Broadcast, User, Notification, NotificationCounter
+from .pagination import encode_cursor, keyset_filter
+from .stats import dashboard_stats, global_stats
+from .tasks import PublishError, schedule_broadcast
+
+
 class CustomLoginView(LoginView):
     """
     Vue de connexion personnalisée.
@@ -39,30 +52,94 @@ def broadcast_notifications(request):
     """
     Vue permettant à l'administrateur d'envoyer une notification à tous les utilisateurs.
 
-    Cette vue prend un message via POST, crée une notification pour chaque
-    utilisateur et redirige ensuite vers le tableau de bord admin. Seuls
-    les super‑utilisateurs peuvent accéder à cette fonctionnalité.
+    Cette vue prend un message via POST, enregistre la diffusion et confie
+    son exécution à la tâche Celery ``run_broadcast`` (moteur
+    ``BroadcastFanOut``, écriture par lots). L'administrateur est aussitôt
+    redirigé vers son tableau de bord avec l'identifiant de la diffusion,
+    interrogeable via ``broadcast_status`` pendant son exécution. Seuls les
+    super‑utilisateurs peuvent accéder à cette fonctionnalité.
+
+    Le champ facultatif ``segment`` restreint la diffusion à une audience
+    (voir ``notifications.audience``), par exemple
+    ``active & (group:A | group:B) & priority >= haute`` ; une expression
+    invalide, comme une priorité inconnue, est refusée (400). Si la tâche
+    ne peut être envoyée au broker, la diffusion est marquée échouée (503).
     """
     if request.method == 'POST':
         message = request.POST.get('message', '').strip()
         priority = request.POST.get('priority', 'moyenne')  # par défaut moyenne
+        segment = request.POST.get('segment', '').strip()
+        if priority not in PRIORITIES:
+            return HttpResponseBadRequest(f"Priorité inconnue : {priority}")
         if message:
-            users = User.objects.all()
-            notifications = []
-            for user in users:
-                notif = Notification(destinataire=user, message=message, priority=priority)
-                notifications.append(notif)
-            # Utilise bulk_create pour améliorer la performance
-            Notification.objects.bulk_create(notifications)
+            try:
+                fanout = BroadcastFanOut(segment=segment)
+            except ValueError as exc:
+                return HttpResponseBadRequest(str(exc))
+            broadcast = fanout.create(message, priority=priority)
+            try:
+                schedule_broadcast(broadcast)
+            except PublishError:
+                return HttpResponse("Diffusion non planifiée : service de tâches indisponible", status=503)
+            return redirect(f"{reverse('admin_dashboard')}?broadcast={broadcast.pk}")
         return redirect('admin_dashboard')
     else:
         return redirect('admin_dashboard')
 
-<<<<<<< Updated upstream
-=======
+
+@api_view(['GET'])
+def broadcast_status(request, pk):
+    """API pour suivre l'avancement d'une diffusion"""
+    if not request.user.is_superuser:
+        return Response({'detail': 'Accès réservé aux administrateurs'}, status=403)
+    broadcast = get_object_or_404(Broadcast, pk=pk)
+    return Response({
+        'id': broadcast.pk,
+        'status': broadcast.status,
+        'segment': broadcast.segment,
+        'total_recipients': broadcast.total_recipients,
+        'sent_count': broadcast.sent_count,
+        'progress': broadcast.progress,
+        'created_at': broadcast.created_at,
+        'finished_at': broadcast.finished_at,
+    })
+
+
+# Notifications par page du fil de ``user_dashboard``
+FEED_PAGE_SIZE = 20
+
+
+def feed_page(user, cursor=None):
+    """
+    Une page du fil de ``user`` : notifications (dictionnaires), fragment
+    HTML rendu et curseur de la page suivante (``None`` en fin de fil).
+
+    Pagination par clé : le coût d'une page ne dépend pas de la longueur
+    de l'historique. Lève ``ValueError`` pour un curseur invalide.
+    """
+    rows = list(
+        keyset_filter(Notification.objects.filter(destinataire=user), cursor)
+        .values('id', 'message', 'priority', 'created_at')[:FEED_PAGE_SIZE + 1]
+    )
+    page = rows[:FEED_PAGE_SIZE]
+    return {
+        'notifications': page,
+        'html': render_to_string('notifications/_notification_items.html', {'notifications': page}),
+        'next_cursor': encode_cursor(page[-1]['created_at'], page[-1]['id']) if len(rows) > FEED_PAGE_SIZE else None,
+    }
+
+
+def first_feed_page(user):
+    """Première page du fil, en cache jusqu'à la prochaine notification de ``user``."""
+    return cached(f'user_feed:{user.pk}', lambda: feed_page(user), 'feed', f'user:{user.pk}')
+
+
+def feed_url(cursor):
+    return f"{reverse('user_feed')}?cursor={cursor}" if cursor else None
 
 
 @login_required
+@conditional(user_scopes, session_vary)
 def user_dashboard(request):
     """
     Tableau de bord de l'utilisateur.
@@ -72,98 +149,146 @@ def user_dashboard(request):
     bord. Sans authentification, Django redirige automatiquement vers
     ``settings.LOGIN_URL`` tout en conservant le paramètre ``next`` pour que
     l'utilisateur soit renvoyé vers le tableau de bord après la connexion.
+
+    Seule la première page du fil (``FEED_PAGE_SIZE`` notifications) est
+    rendue ; les suivantes sont chargées à la demande par ``user_feed``.
     """
     user = request.user
-    # Récupère les notifications destinées à l'utilisateur connecté.
-    notifications = Notification.objects.filter(destinataire=user).order_by('-created_at')
-
-    context = {
-        'user': user,
-        'notifications': notifications,
-        'total_notifications': notifications.count(),
-        'unread_notifications': notifications.filter(
-            created_at__gte=timezone.now() - timedelta(days=1)
-        ).count(),
-        'high_priority': notifications.filter(priority='haute').count(),
-    }
-    return render(request, 'notifications/user_dashboard.html', context)
+
+    def compute():
+        # Les compteurs sont lus sur une seule ligne dénormalisée, sans COUNT.
+        counter = NotificationCounter.for_user(user)
+        page = first_feed_page(user)
+        return {
+            'feed_html': page['html'],
+            'next_url': feed_url(page['next_cursor']),
+            'total_notifications': counter.total,
+            'unread_notifications': counter.unread,
+            'high_priority': counter.haute,
+        }
+
+    # Contexte mis en cache jusqu'à la prochaine notification ou lecture
+    context = cached(f'user_dashboard:{user.pk}', compute, 'feed', f'user:{user.pk}')
+    return render(request, 'notifications/user_dashboard.html', {'user': user, **context})
+
+
+@login_required
+@conditional(user_scopes, session_vary)
+def user_feed(request):
+    """
+    Page du fil de l'utilisateur au format JSON (défilement infini) :
+    ``html`` (fragment à ajouter à la liste) et ``next`` (URL de la page
+    suivante ou ``null``). Sans ``cursor``, la première page, en cache.
+    """
+    cursor = request.GET.get('cursor')
+    try:
+        page = feed_page(request.user, cursor) if cursor else first_feed_page(request.user)
+    except ValueError as exc:
+        return JsonResponse({'detail': str(exc)}, status=400)
+    return JsonResponse({'html': page['html'], 'next': feed_url(page['next_cursor'])})
+
+
+@login_required
+def mark_notifications_read(request):
+    """Marque toutes les notifications de l'utilisateur comme lues (POST)."""
+    if request.method == 'POST':
+        Notification.objects.mark_read(request.user)
+    return redirect('user_dashboard')
+
+
+@api_view(['GET'])
+def unread_count_api(request):
+    """API pour obtenir les compteurs de l'utilisateur connecté"""
+    if not request.user.is_authenticated:
+        return Response({'detail': 'Authentification requise'}, status=401)
+    counter = NotificationCounter.for_user(request.user)
+    return Response({
+        'unread': counter.unread,
+        'total': counter.total,
+        'priority_counts': {level: getattr(counter, level) for level in PRIORITIES},
+    })
 
 
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
 def admin_dashboard(request):
     """Dashboard pour les administrateurs"""
-    # Statistiques générales
-    total_users = User.objects.count()
-    total_notifications = Notification.objects.count()
-    
-    # Notifications par priorité
-    priority_stats = list(Notification.objects.values('priority').annotate(count=Count('id')))
-    
-    # Notifications récentes (dernières 24h, 7 jours, 30 jours)
-    now = timezone.now()
-    notifs_24h = Notification.objects.filter(created_at__gte=now - timedelta(hours=24)).count()
-    notifs_7d = Notification.objects.filter(created_at__gte=now - timedelta(days=7)).count()
-    notifs_30d = Notification.objects.filter(created_at__gte=now - timedelta(days=30)).count()
-    
-    # Top 5 utilisateurs avec le plus de notifications
-    top_users = User.objects.annotate(
-        notif_count=Count('notification')
-    ).order_by('-notif_count')[:5]
-    
-    # Notifications récentes
-    recent_notifications = Notification.objects.all().order_by('-created_at')[:10]
-    
-    # Distribution par jour (derniers 7 jours)
-    daily_stats = []
-    for i in range(7):
-        day = now - timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        count = Notification.objects.filter(
-            created_at__gte=day_start,
-            created_at__lt=day_end
-        ).count()
-        daily_stats.append({
-            'date': day_start.strftime('%d/%m'),
-            'count': count
-        })
-    daily_stats.reverse()
-    
-    context = {
-        'total_users': total_users,
-        'total_notifications': total_notifications,
-        'priority_stats': priority_stats,
-        'notifs_24h': notifs_24h,
-        'notifs_7d': notifs_7d,
-        'notifs_30d': notifs_30d,
-        'top_users': top_users,
-        'recent_notifications': recent_notifications,
-        'daily_stats': json.dumps(daily_stats),
-    }
-    return render(request, 'notifications/admin_dashboard.html', context)
+    def compute():
+        # Statistiques générales, fenêtres récentes, priorités et série
+        # quotidienne : nombre fixe de requêtes (voir ``notifications.stats``)
+        stats = dashboard_stats()
+
+        # Top 5 utilisateurs avec le plus de notifications
+        top_users = User.objects.annotate(
+            notif_count=Count('notification')
+        ).order_by('-notif_count')[:5]
+
+        # Notifications récentes
+        recent_notifications = Notification.objects.all().order_by('-created_at')[:10]
+
+        return {
+            'total_users': stats['total_users'],
+            'total_notifications': stats['total_notifications'],
+            'priority_stats': stats['priority_stats'],
+            'notifs_24h': stats['notifs_24h'],
+            'notifs_7d': stats['notifs_7d'],
+            'notifs_30d': stats['notifs_30d'],
+            'top_users': list(top_users),
+            'recent_notifications': list(recent_notifications),
+            'daily_stats': json.dumps(stats['daily_stats']),
+        }
+
+    # Un seul calcul par changement, quel que soit le nombre d'administrateurs
+    context = cached('admin_dashboard', compute, 'stats')
+    try:
+        broadcast_id = int(request.GET['broadcast'])
+    except (KeyError, ValueError):
+        broadcast_id = None
+    return render(request, 'notifications/admin_dashboard.html', {
+        **context,
+        'broadcast_id': broadcast_id,
+    })
 
 
 @api_view(['GET'])
+@conditional(lambda request: ('stats',), period=lambda: get_cache_settings()['timeout'])
 def stats_api(request):
-    """API pour obtenir les statistiques en temps réel"""
-    now = timezone.now()
-    
-    stats = {
-        'total_users': User.objects.count(),
-        'total_notifications': Notification.objects.count(),
-        'notifs_24h': Notification.objects.filter(created_at__gte=now - timedelta(hours=24)).count(),
-        'notifs_7d': Notification.objects.filter(created_at__gte=now - timedelta(days=7)).count(),
-        'priority_counts': {
-            'haute': Notification.objects.filter(priority='haute').count(),
-            'moyenne': Notification.objects.filter(priority='moyenne').count(),
-            'faible': Notification.objects.filter(priority='faible').count(),
-        }
-    }
-    return Response(stats)
+    """
+    API pour obtenir les statistiques en temps réel
+
+    Les compteurs sur 24 heures et 7 jours glissent avec le temps : les
+    validateurs changent aussi à chaque durée de vie du cache. Le
+    décorateur ``conditional`` est placé sous ``api_view`` pour que
+    l'authentification et les permissions de DRF s'appliquent aussi aux
+    réponses ``304``.
+    """
+    stats = cached('stats_api', global_stats, 'stats')
+    return Response({
+        'total_users': stats['total_users'],
+        'total_notifications': stats['total_notifications'],
+        'notifs_24h': stats['notifs_24h'],
+        'notifs_7d': stats['notifs_7d'],
+        'priority_counts': stats['priority_counts'],
+    })
+
+
+def metrics_view(request):
+    """
+    Mesures des urgences, de leurs canaux et de leurs disjoncteurs au format texte Prometheus.
+
+    Réservé au personnel (``is_staff``) ou au collecteur qui présente le
+    jeton ``NOTIFICATIONS_METRICS_TOKEN`` (``Authorization: Bearer ...``).
+    """
+    token = getattr(settings, 'NOTIFICATIONS_METRICS_TOKEN', '')
+    bearer = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not request.user.is_staff and not (token and hmac.compare_digest(bearer, token)):
+        return HttpResponseForbidden('Accès réservé au personnel')
+    return HttpResponse(
+        render_prometheus(metrics_registry.snapshot()) + circuit.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
 
 
->>>>>>> Stashed changes
 class EvacuationViewSet(viewsets.ViewSet):
     # GET /api/evacuation/epidemie/
     @action(detail=False, methods=["get"])
@@ -174,8 +299,7 @@ class EvacuationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["post"])
     def epidemie(self, request):
         e = Epidemie()
-        e.evacuer()
-        return Response({"status": "Évacuation Épidémie déclenchée"})
+        return evacuate(request, e, "Épidémie")
 
     # GET /api/evacuation/incendie/
     @action(detail=False, methods=["get"])
@@ -186,8 +310,7 @@ class EvacuationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["post"])
     def incendie(self, request):
         i = Incendie()
-        i.evacuer()
-        return Response({"status": "Évacuation Incendie déclenchée"})
+        return evacuate(request, i, "Incendie")
 
     # GET /api/evacuation/innondation/
     @action(detail=False, methods=["get"])
@@ -198,8 +321,7 @@ class EvacuationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["post"])
     def innondation(self, request):
         n = Innondation()
-        n.evacuer()
-        return Response({"status": "Évacuation Inondation déclenchée"})
+        return evacuate(request, n, "Inondation")
 
     # GET /api/evacuation/securite/
     @action(detail=False, methods=["get"])
@@ -210,5 +332,4 @@ class EvacuationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["post"])
     def securite(self, request):
         s = Securite()
-        s.evacuer()
-        return Response({"status": "Évacuation Sécurité déclenchée"})
+        return evacuate(request, s, "Sécurité")
@@ -0,0 +1,19 @@
+"""
+Configuration Celery du projet systeme_notification.
+
+Les réglages sont lus depuis ``settings.py`` (préfixe ``CELERY_``) et les
+tâches sont découvertes dans les modules ``tasks.py`` des applications.
+Lancer un worker avec ::
+
+    celery -A systeme_notification worker -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'systeme_notification.settings')
+
+app = Celery('systeme_notification')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
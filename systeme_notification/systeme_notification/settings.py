@@ -1,6 +1,8 @@
 import os 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -33,6 +35,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'notifications.profiling.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -136,3 +139,143 @@ AUTH_USER_MODEL = 'notifications.User'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
+
+# ---------------------------
+# Diffusion des notifications
+# ---------------------------
+# Nombre de notifications écrites par transaction lors d'une diffusion à
+# tous les utilisateurs (voir ``notifications.fanout``).
+NOTIFICATIONS_BROADCAST_BATCH_SIZE = 1000
+
+# Canaux de diffusion (voir ``notifications.delivery``). Par défaut, SMS et
+# Push passent par des passerelles factices et les emails sont écrits dans
+# ``sent_emails/`` : remplacer ``BACKEND`` par les fournisseurs réels en
+# production.
+NOTIFICATIONS_DELIVERY = {
+    'channels': ('email', 'sms', 'push'),
+    'workers': 4,
+    'sms': {'BACKEND': 'notifications.delivery.FakeSMSGateway', 'OPTIONS': {}},
+    'push': {'BACKEND': 'notifications.delivery.FakePushGateway', 'OPTIONS': {}},
+}
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'notifications@campus.local'
+
+# ---------------------------
+# Celery (tâches asynchrones)
+# ---------------------------
+# En production, ``REDIS_URL`` désigne le broker. Sans Redis
+# (développement, tests), le broker est en mémoire et les tâches
+# s'exécutent immédiatement dans le processus appelant.
+REDIS_URL = os.environ.get('REDIS_URL')
+CELERY_BROKER_URL = REDIS_URL or 'memory://'
+CELERY_TASK_ALWAYS_EAGER = not REDIS_URL
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Archivage quotidien des notifications échues (voir ci-dessous)
+    'archive-old-notifications': {
+        'task': 'notifications.tasks.archive_old_notifications',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
+# Rétention des notifications (voir ``notifications.retention``) : au-delà
+# de ``days`` jours, les notifications sont archivées en JSON Lines
+# compressé dans ``directory`` puis supprimées par lots de ``chunk_size``.
+NOTIFICATIONS_RETENTION = {
+    'days': int(os.environ.get('NOTIFICATIONS_RETENTION_DAYS', 365)),
+    'directory': BASE_DIR / 'archives',
+    'chunk_size': 1000,
+}
+
+# ---------------------------
+# Django Channels (WebSockets)
+# ---------------------------
+ASGI_APPLICATION = 'systeme_notification.asgi.application'
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# ---------------------------
+# Cache
+# ---------------------------
+# Le cache porte notamment l'état des disjoncteurs des canaux d'urgence
+# (voir ``notifications.circuit``) : il doit être partagé (Redis) pour que
+# tous les workers voient le même état. Sans Redis, cache local au processus.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+
+# Statistiques et tableaux de bord en cache (voir ``notifications.caching``) :
+# invalidés à chaque écriture, recalculés au plus une fois à la fois, durée
+# de vie ``timeout`` majorée d'un aléa de ``jitter`` (10 %).
+NOTIFICATIONS_CACHE = {
+    'timeout': 60,
+    'jitter': 0.1,
+}
+
+# Disjoncteurs des canaux d'urgence : un canal s'ouvre quand, sur ses
+# ``window_size`` derniers appels (au moins ``minimum_calls``), la part
+# d'échecs ou d'appels de plus de ``slow_call_duration`` secondes atteint
+# son seuil ; il reste ouvert ``open_timeout`` secondes avant un appel d'essai.
+NOTIFICATIONS_CIRCUIT_BREAKER = {
+    'failure_rate_threshold': 0.5,
+    'slow_call_rate_threshold': 0.5,
+    'slow_call_duration': 2.0,
+    'window_size': 20,
+    'minimum_calls': 5,
+    'open_timeout': 30.0,
+}
+
+# Jeton du collecteur Prometheus pour ``/metrics/`` (``Authorization:
+# Bearer <jeton>``) ; sans jeton, seul le personnel y accède.
+NOTIFICATIONS_METRICS_TOKEN = os.environ.get('NOTIFICATIONS_METRICS_TOKEN', '')
+
+# Profilage SQL d'un échantillon des requêtes HTTP (voir
+# ``notifications.profiling``) : en-tête ``Server-Timing`` et journal JSON
+# sur ``notifications.profiling``, en WARNING au-delà de ``slow_query_ms``
+# ou de ``duplicate_threshold`` requêtes identiques (N+1).
+NOTIFICATIONS_PROFILING = {
+    'sample_rate': float(os.environ.get('NOTIFICATIONS_PROFILING_SAMPLE_RATE', 0.01)),
+    'slow_query_ms': 100,
+    'duplicate_threshold': 5,
+}
+
+# ---------------------------
+# Journalisation
+# ---------------------------
+# Les urgences ne sont plus tracées par ``print`` : les loggers
+# ``notifications.*`` n'écrivent sur la console qu'à partir du niveau
+# ``NOTIFICATIONS_LOG_LEVEL`` (WARNING par défaut). Passer ce niveau à
+# DEBUG réactive la trace détaillée des appels.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'notifications': {
+            'handlers': ['console'],
+            'level': os.environ.get('NOTIFICATIONS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
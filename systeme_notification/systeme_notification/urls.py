@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include 
+from notifications.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('notifications.urls')),  
+    path('metrics/', metrics_view, name='metrics'),
 ]